@@ -2,6 +2,8 @@
 #
 # Licensed under the terms of the GNU GPL License version 2
 
+#Resolved before any cd, since $0 may be a relative path
+guestdir=$(cd "$(dirname "$0")" && pwd)
 FedoraRelease=Fedora20
 currentkernel=kernel-`uname -r`
 if [ ! -f /data/latest/$FedoraRelease ]; then
@@ -11,14 +13,39 @@ latestkernel=`cat /data/latest/$FedoraRelease`
 kojidir=/home/kerneltest/koji/
 kerneltestdir=/home/kerneltest/kernel-tests/
 trinitydir=/home/kerneltest/trinity/
+#The harness's RPM cache; a directory on the /data mount or an HTTP URL
+rpmcache=/data/rpms/builds
 
 #Make sure we are on the latest kernel, install if not
 if [ "$currentkernel" != "$latestkernel.x86_64" ]
 then
     cd $kojidir
-    rm *.rpm
-    koji download-build --arch=x86_64 $latestkernel
-    rm *debug*.rpm
+    rm -f *.rpm SHA256SUMS
+    cached=$rpmcache/$latestkernel/x86_64
+    case $rpmcache in
+    http://*|https://*)
+        if curl -sf -O $cached/SHA256SUMS
+        then
+            for rpm in `awk '{print $2}' SHA256SUMS`
+            do
+                curl -sf -O $cached/$rpm
+            done
+            sha256sum -c --quiet SHA256SUMS || rm -f *.rpm
+        fi
+        ;;
+    *)
+        if [ -f $cached/SHA256SUMS ]
+        then
+            cp $cached/*.rpm .
+        fi
+        ;;
+    esac
+    #Fall back to Koji if the build isn't cached
+    if ! ls *.rpm > /dev/null 2>&1
+    then
+        koji download-build --arch=x86_64 $latestkernel
+        rm *debug*.rpm
+    fi
     yum -y update *.rpm
     reboot
 fi
@@ -26,8 +53,17 @@ fi
 #We are on the latest kernel, run some tests
 cd $kerneltestdir
 
-#Regression Test as root
-./runtests.sh
+#Pass the harness job's correlation id and start time on to the upload so
+#the time each stage took can be tracked
+if [ -f /data/latest/$FedoraRelease.correlation_id ]; then
+    export KERNELTEST_CORRELATION_ID=`cat /data/latest/$FedoraRelease.correlation_id`
+fi
+export KERNELTEST_TESTS_STARTED=`date -u +%Y-%m-%dT%H:%M:%SZ`
+
+#Regression Test as root, running independent tests in parallel and
+#uploading the results
+$guestdir/runtests.py --tests-dir $kerneltestdir
+result=$?
 if [ "$result" != "0" ]
 then
     echo "Regression Test Suite fail for kernel $currentkernel" >> /data/logs/$FedoraRelease
@@ -0,0 +1,272 @@
+#!/usr/bin/python3
+#
+# Licensed under the terms of the GNU GPL License version 2
+"""
+Run the kernel regression tests on a guest in parallel and upload the results.
+
+Tests are discovered in the kernel-tests checkout as ``<suite>/<test>/runtest.sh``
+and run in their own directory, in their own process group and with their own
+temporary directory. Tests in the independent suites run in parallel, one per
+CPU by default; tests in the serial suites, which include the destructive ones,
+run afterwards one at a time with nothing else running.
+
+A test's exit status follows the kernel-tests convention: 0 is a pass, 3 means
+the test was skipped and 4 is a warning. Skips and warnings count as passes
+but are reported as waived so they stand out. The results are printed and uploaded in the format the
+``/api/v1/results/`` API expects, with each test's duration and the end of its
+output in its details.
+
+This script only needs the standard library so it can run on any guest.
+"""
+import argparse
+import concurrent.futures
+import datetime
+import gzip
+import json
+import os
+import platform
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+
+#: The exit status kernel-tests use for skipped tests.
+SKIP = 3
+#: The exit status kernel-tests use for tests that pass with a warning.
+WARN = 4
+#: The most output, in characters, kept from the end of each test's output.
+MAX_DETAILS = 16 * 1024
+
+
+def discover(tests_dir, suites):
+    """
+    Find the tests in the given suites.
+
+    Args:
+        tests_dir (str): The kernel-tests checkout.
+        suites (list): The names of the suites to look in.
+
+    Returns:
+        list: The tests' names, "<suite>/<test>", sorted within each suite.
+    """
+    tests = []
+    for suite in suites:
+        suite_dir = os.path.join(tests_dir, suite)
+        if not os.path.isdir(suite_dir):
+            continue
+        for test in sorted(os.listdir(suite_dir)):
+            if os.path.isfile(os.path.join(suite_dir, test, "runtest.sh")):
+                tests.append("{}/{}".format(suite, test))
+    return tests
+
+
+def run_test(tests_dir, name, timeout):
+    """
+    Run a single test in isolation.
+
+    Args:
+        tests_dir (str): The kernel-tests checkout.
+        name (str): The test's name, "<suite>/<test>".
+        timeout (float): The number of seconds after which the test is killed.
+
+    Returns:
+        tuple: The state printed for the test, one of "PASS", "SKIP", "WARN"
+            or "FAIL", and its result in the format the results API expects.
+    """
+    tmpdir = tempfile.mkdtemp(prefix="kerneltest-")
+    env = dict(os.environ, TMPDIR=tmpdir)
+    start = time.monotonic()
+    proc = subprocess.Popen(
+        ["/bin/bash", "./runtest.sh"],
+        cwd=os.path.join(tests_dir, name),
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        start_new_session=True,
+    )
+    try:
+        output, __ = proc.communicate(timeout=timeout)
+        status = proc.returncode
+    except subprocess.TimeoutExpired:
+        os.killpg(proc.pid, signal.SIGKILL)
+        output, __ = proc.communicate()
+        status = None
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    duration = time.monotonic() - start
+
+    output = output.decode("utf-8", errors="replace")[-MAX_DETAILS:]
+    if status is None:
+        summary = "Timed out after {:.1f}s".format(duration)
+    else:
+        summary = "Exited with {} after {:.1f}s".format(status, duration)
+    state = {0: "PASS", SKIP: "SKIP", WARN: "WARN"}.get(status, "FAIL")
+    return (
+        state,
+        {
+            "name": name,
+            "passed": state != "FAIL",
+            "waived": state in ("SKIP", "WARN"),
+            "details": "{}\n\n{}".format(summary, output),
+            "duration": round(duration, 3),
+        },
+    )
+
+
+def run_tests(tests_dir, parallel, serial, jobs, timeout):
+    """
+    Run the parallel tests across ``jobs`` workers, then the serial ones.
+
+    Args:
+        tests_dir (str): The kernel-tests checkout.
+        parallel (list): The names of tests that can run concurrently.
+        serial (list): The names of tests that must run alone.
+        jobs (int): The number of tests to run at once.
+        timeout (float): The number of seconds after which a test is killed.
+
+    Returns:
+        list: The results, in the order the tests were given.
+    """
+    results = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(run_test, tests_dir, t, timeout) for t in parallel]
+        for future in futures:
+            results.append(_report(*future.result()))
+    for test in serial:
+        results.append(_report(*run_test(tests_dir, test, timeout)))
+    return results
+
+
+def _report(state, result):
+    print("{:<4} {} ({:.1f}s)".format(state, result["name"], result["duration"]))
+    return result
+
+
+def _utcnow():
+    return datetime.datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
+
+
+def build_test_run(results, started, finished):
+    """
+    Build the results API payload for the running kernel.
+
+    Args:
+        results (list): The results of each test.
+        started (str): When the tests started, in ISO 8601 format.
+        finished (str): When the tests finished, in ISO 8601 format.
+
+    Returns:
+        dict: The test run.
+    """
+    # For example, "5.1.0-300.fc30.x86_64"
+    kernel, arch = platform.release().rsplit(".", 1)
+    kernel_version, build_release = kernel.split("-", 1)
+    fedora_version = int(build_release.rsplit(".fc", 1)[-1])
+    run = {
+        "kernel_version": kernel_version,
+        "build_release": build_release,
+        "arch": arch,
+        "fedora_version": fedora_version,
+        "tests_started": started,
+        "tests_finished": finished,
+        "tests": results,
+    }
+    if os.environ.get("KERNELTEST_CORRELATION_ID"):
+        run["correlation_id"] = os.environ["KERNELTEST_CORRELATION_ID"]
+    return run
+
+
+def upload(url, run, token=None):
+    """
+    Upload a test run to the results API, compressed with gzip.
+
+    Args:
+        url (str): The URL of the results API.
+        run (dict): The test run.
+        token (str): An OpenID Connect access token, if the upload should not
+            be anonymous.
+    """
+    headers = {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+    if token:
+        headers["Authorization"] = "Bearer " + token
+    body = gzip.compress(json.dumps(run).encode("utf-8"))
+    request = urllib.request.Request(url, data=body, headers=headers, method="POST")
+    with urllib.request.urlopen(request, timeout=60):
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--tests-dir",
+        default="/home/kerneltest/kernel-tests/",
+        help="The kernel-tests checkout (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--suite",
+        action="append",
+        dest="suites",
+        help="A suite whose tests can run in parallel (default: default)",
+    )
+    parser.add_argument(
+        "--serial-suite",
+        action="append",
+        dest="serial_suites",
+        help="A suite whose tests must run one at a time (default: destructive)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="The number of tests to run at once (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=60 * 60,
+        help="The seconds after which a test is killed (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--url",
+        default="https://kerneltest.fedoraproject.org/api/v1/results/",
+        help="The results API to upload to (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--token-file", help="A file with an access token for authenticated uploads"
+    )
+    parser.add_argument("--output", help="Also write the results to this file as JSON")
+    parser.add_argument(
+        "--no-upload", action="store_true", help="Don't upload the results"
+    )
+    args = parser.parse_args(argv)
+
+    parallel = discover(args.tests_dir, args.suites or ["default"])
+    serial = discover(args.tests_dir, args.serial_suites or ["destructive"])
+    started = os.environ.get("KERNELTEST_TESTS_STARTED") or _utcnow()
+    results = run_tests(args.tests_dir, parallel, serial, args.jobs, args.timeout)
+    run = build_test_run(results, started, _utcnow())
+
+    if args.output:
+        with open(args.output, "w") as fd:
+            json.dump(run, fd, indent=2)
+    if not args.no_upload:
+        token = None
+        if args.token_file:
+            with open(args.token_file) as fd:
+                token = fd.read().strip()
+        try:
+            upload(args.url, run, token)
+        except (OSError, urllib.error.URLError) as e:
+            print("Failed to upload the results: {}".format(e), file=sys.stderr)
+            return 2
+    return 0 if all(r["passed"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
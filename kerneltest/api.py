@@ -1,12 +1,26 @@
+import collections
 import datetime
 import logging
+import operator
+import re
 
 from flask_restful import reqparse, Resource, inputs
-from fedora_messaging import api as fm_api
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm.exc import NoResultFound
 import flask
 
-from . import db
+from . import (
+    archive,
+    artifacts,
+    db,
+    feed,
+    history,
+    ingest,
+    jobs,
+    results,
+    search,
+)
 from .authentication import oidc
 
 _log = logging.getLogger(__name__)
@@ -15,8 +29,9 @@ _TEST_HELP = (
     'A list of test objects; each object should have a "name" key whose string '
     'value identifies the test, a "passed" key whose boolean value indicates if'
     ' the test passed or not, a "waived" key whose boolean value indicates '
-    'whether the test is waived, and a "details" key whose string value contains'
-    " details about the test result (logs, links to builds, whatever)"
+    'whether the test is waived, and optionally a "details" key whose string '
+    "value contains details about the test result (logs, links to builds, "
+    "whatever)"
 )
 _PAGE_HELP = "The page number of results to retrieve; must be a positive integer"
 _ITEMS_PER_PAGE_HELP = (
@@ -24,6 +39,30 @@ _ITEMS_PER_PAGE_HELP = (
     "{}".format(db.MAX_PAGE_SIZE, db.DEFAULT_PAGE_SIZE)
 )
 
+_WORKER_HELP = "A name that identifies the test worker, for example its hostname."
+_CORRELATION_ID_HELP = (
+    "The correlation ID of the test harness job the results belong to; guests "
+    "read it from the latest build's .correlation_id file."
+)
+
+#: The fields of each test run in the results API, and their columns.
+_RUN_FIELDS = (
+    "id",
+    "created",
+    "arch",
+    "kernel_version",
+    "build_release",
+    "fedora_version",
+    "state",
+)
+_RUN_COLUMNS = tuple(getattr(db.TestRun, field) for field in _RUN_FIELDS)
+_run_values = operator.attrgetter(*_RUN_FIELDS)
+
+#: The fields of each test in the results API, and their columns.
+_TEST_FIELDS = ("id", "name", "passed", "waived", "details")
+_TEST_COLUMNS = tuple(getattr(db.Test, field) for field in _TEST_FIELDS)
+_test_values = operator.attrgetter(*_TEST_FIELDS)
+
 _SCOPES = [
     "openid",
     "https://github.com/jmflinuxtx/kerneltest-harness/oidc/upload_test_run",
@@ -35,29 +74,711 @@ class Results(Resource):
         """
         Get a paginated set of test results.
         """
+        args = results_parser().parse_args()
+        return (
+            results_body(db.Session(), args, flask.current_app.config["ARCHIVE_DIR"]),
+            200,
+        )
+
+    @oidc.accept_token(require_token=False, scopes_required=_SCOPES)
+    def post(self):
+        args = _UPLOAD_PARSER.parse_args(strict=True)
+        tests, error = results.validate_tests(args.tests)
+        if error:
+            return error, 400
+        session = db.Session()
+        fields, error = _run_fields(args)
+        if error:
+            return error
+        fields["content_hash"] = results.content_hash(fields["user"], args, tests)
+        if flask.current_app.config["RESULTS_INGEST"] == "async":
+            duplicate = results.find_duplicate(
+                session, fields["idempotency_key"], fields["content_hash"]
+            )
+            if duplicate is not None:
+                return _duplicate(duplicate)
+            item = ingest.enqueue(session, fields, tests)
+            session.commit()
+            status = flask.url_for("ingeststatus", ingest_id=item.id)
+            return (
+                {"id": item.id, "state": item.state, "status": status},
+                202,
+                {"Location": status},
+            )
+
+        try:
+            run, new = results.store(session, fields, tests)
+        except IntegrityError as e:
+            return _not_stored(e)
+        if not new:
+            return _duplicate(run)
+        results.commit(session, [run])
+
+        return {"id": run.id}, 201
+
+
+def results_parser():
+    """Make the parser for the arguments of :meth:`Results.get`."""
+    parser = reqparse.RequestParser(trim=True, bundle_errors=True)
+    parser.add_argument(
+        "kernel_version",
+        type=str,
+        help="The kernel version tested. For example: '5.1.3'.",
+        location="args",
+    )
+    parser.add_argument(
+        "build_release",
+        type=str,
+        help="The release of the build tested. For example: '300.fc30'.",
+        location="args",
+    )
+    parser.add_argument(
+        "arch",
+        type=str,
+        help="The architecture the tests were run on. For example: 'aarch64'.",
+        location="args",
+    )
+    parser.add_argument(
+        "fedora_version",
+        type=int,
+        help="The Fedora release the tests were run on. For example: 30.",
+        location="args",
+    )
+    parser.add_argument(
+        "test",
+        type=str,
+        action="append",
+        help="Only include runs with a test of this name; repeat it to "
+        "filter on several tests.",
+        location="args",
+    )
+    parser.add_argument(
+        "test_result",
+        choices=("passed", "failed"),
+        help="Only include runs where the tests named by 'test', or any test "
+        "if none are named, had this result: 'passed' or 'failed'.",
+        location="args",
+    )
+    parser.add_argument(
+        "test_waived",
+        type=inputs.boolean,
+        help="Only include runs where the tests named by 'test', or any test "
+        "if none are named, were (true) or weren't (false) waived.",
+        location="args",
+    )
+    parser.add_argument(
+        "test_match",
+        choices=("all", "any"),
+        help="Whether runs must match the filters for 'all' the tests named "
+        "by 'test', the default, or for 'any' of them.",
+        location="args",
+    )
+    parser.add_argument("page", type=inputs.positive, help=_PAGE_HELP, location="args")
+    parser.add_argument(
+        "items_per_page",
+        type=inputs.int_range(1, db.MAX_PAGE_SIZE),
+        help=_ITEMS_PER_PAGE_HELP,
+        location="args",
+    )
+    return parser
+
+
+def results_body(session, args, archive_dir):
+    """
+    Get a page of test results for :meth:`Results.get` and the asynchronous
+    read API.
+
+    Args:
+        session (sqlalchemy.orm.Session): The session to query with.
+        args (flask_restful.reqparse.Namespace): The arguments parsed by
+            :func:`results_parser`.
+        archive_dir (str): The directory retired releases are archived in.
+
+    Returns:
+        dict: The response body.
+    """
+    test_filters = dict(
+        names=args.test,
+        passed=None if args.test_result is None else args.test_result == "passed",
+        waived=args.test_waived,
+        match=args.test_match or "all",
+    )
+    run_filters = {
+        field: args[field]
+        for field in ("arch", "kernel_version", "build_release", "fedora_version")
+        if args[field]
+    }
+    # Only the columns in the response are loaded, as plain tuples
+    query = session.query(*_RUN_COLUMNS).filter_by(**run_filters)
+    for runs in results.runs_with_tests(session, **test_filters):
+        query = query.filter(db.TestRun.id.in_(runs))
+    page_number = args.page or 1
+    items_per_page = args.items_per_page or db.DEFAULT_PAGE_SIZE
+    store = archive.Archive(archive_dir)
+    if args.fedora_version in store.versions():
+        # Retired releases are read from their archive file, and any runs
+        # uploaded since it was archived from the database
+        runs = [
+            run
+            for run in store.runs(args.fedora_version)
+            if all(getattr(run, k) == v for k, v in run_filters.items())
+            and results.has_tests(run, **test_filters)
+        ]
+        runs += query.order_by(db.TestRun.id).all()
+        page = archive.paginate(runs, page_number, items_per_page)
+    else:
+        page = query.paginate(page=page_number, items_per_page=items_per_page)
+
+    run_ids = [row[0] for row in page.items if not isinstance(row, db.TestRun)]
+    tests = collections.defaultdict(list)
+    if run_ids:
+        rows = (
+            session.query(db.Test.run_id, *_TEST_COLUMNS)
+            .filter(db.Test.run_id.in_(run_ids))
+            .order_by(db.Test.id)
+        )
+        for row in rows:
+            tests[row[0]].append(dict(zip(_TEST_FIELDS, row[1:])))
+    items = []
+    for row in page.items:
+        if isinstance(row, db.TestRun):
+            # Archived runs are read into transient objects
+            run_tests = [dict(zip(_TEST_FIELDS, _test_values(t))) for t in row.tests]
+            row = _run_values(row)
+        else:
+            run_tests = tests[row[0]]
+        items.append(dict(zip(_RUN_FIELDS, row), tests=run_tests))
+    return {
+        "page": page.page,
+        "items_per_page": page.items_per_page,
+        "total_items": page.total_items,
+        "items": items,
+    }
+
+
+class IngestStatus(Resource):
+    def get(self, ingest_id):
+        """
+        Get the state of an upload queued by the asynchronous ingest mode.
+
+        Uploads are "queued" until the ingest writer gets to them, then either
+        "stored" as a new test run, found to be a "duplicate" of an existing
+        one, or "failed".
+        """
+        item = db.Ingest.query.get(ingest_id)
+        if item is None:
+            return {"error": "the upload was not found"}, 404
+        return (
+            {
+                "id": item.id,
+                "state": item.state,
+                "received": item.received.isoformat() + "Z",
+                "processed": (
+                    item.processed.isoformat() + "Z" if item.processed else None
+                ),
+                "test_run_id": item.test_run_id,
+                "error": item.error,
+            },
+            200,
+        )
+
+
+class ResultsFeed(Resource):
+    def get(self):
+        """
+        Stream test runs as they're finalized, as server-sent "result" events.
+
+        Each event's ID is the test run's ID and its data is a JSON summary of
+        the run. Clients reconnecting with the ``Last-Event-ID`` header, or the
+        ``since`` argument, are first sent the runs finalized since then.
+
+        This is only routed if ``FEED_WSGI`` is set, since each client holds a
+        thread; :mod:`kerneltest.asgi` serves the feed without one.
+        """
+        args = feed_parser().parse_args()
+        config = flask.current_app.config
+        results_feed = flask.current_app.extensions["results_feed"]
+        filters = feed_filters(args)
+        # Anything finalized while catching up is sent from the feed
+        sequence = results_feed.sequence
+        backlog, complete = feed.backlog(db.Session(), feed_since(args), filters)
+        stream = feed.stream(
+            results_feed,
+            sequence,
+            backlog,
+            filters,
+            keepalive=config["FEED_KEEPALIVE"],
+            # Have clients that are far behind reconnect straight away
+            duration=config["FEED_MAX_DURATION"] if complete else 0,
+        )
+        return flask.Response(
+            stream, mimetype="text/event-stream", headers=feed.HEADERS
+        )
+
+
+def feed_parser():
+    """Make the parser for the arguments of :meth:`ResultsFeed.get`."""
+    parser = reqparse.RequestParser(trim=True, bundle_errors=True)
+    parser.add_argument(
+        "fedora_version",
+        type=int,
+        help="Only include runs on this Fedora release. For example: 30.",
+        location="args",
+    )
+    parser.add_argument(
+        "arch",
+        type=str,
+        help="Only include runs on this architecture. For example: 'aarch64'.",
+        location="args",
+    )
+    parser.add_argument(
+        "since",
+        type=inputs.natural,
+        help="Start with the runs with higher IDs than this one.",
+        location="args",
+    )
+    parser.add_argument(
+        "Last-Event-ID",
+        dest="last_event_id",
+        type=inputs.natural,
+        help="The ID of the last event received before reconnecting.",
+        location="headers",
+    )
+    return parser
+
+
+def feed_filters(args):
+    """Get the summary fields a feed is filtered on from its arguments."""
+    return {field: args[field] for field in ("fedora_version", "arch") if args[field]}
+
+
+def feed_since(args):
+    """Get the test run ID a feed starts after from its arguments, if any."""
+    return args.last_event_id if args.last_event_id is not None else args.since
+
+
+class ResultsOpen(Resource):
+    @oidc.accept_token(require_token=False, scopes_required=_SCOPES)
+    def post(self):
+        """
+        Open a test run that tests are appended to while they run.
+
+        The run must be finalized once all its tests are in; runs that nothing
+        is appended to for ``TEST_RUN_ABANDON_AFTER`` seconds are deleted.
+        """
+        args = _OPEN_PARSER.parse_args(strict=True)
+        tests, error = results.validate_tests(args.tests or [])
+        if error:
+            return error, 400
+        session = db.Session()
+        fields, error = _run_fields(args)
+        if error:
+            return error
+        try:
+            run, new = results.store(
+                session,
+                dict(fields, state="open", updated=datetime.datetime.utcnow()),
+                tests,
+            )
+        except IntegrityError as e:
+            return _not_stored(e)
+        if not new:
+            return _duplicate(run)
+        session.commit()
+        return {"id": run.id}, 201
+
+
+def _test_count(session, run):
+    """Count a test run's tests without loading them."""
+    return session.query(func.count(db.Test.id)).filter_by(run_id=run.id).scalar()
+
+
+class ResultsAppend(Resource):
+    @oidc.accept_token(require_token=False, scopes_required=_SCOPES)
+    def post(self, run_id):
+        """Append a batch of tests to an open test run."""
+        args = _APPEND_PARSER.parse_args(strict=True)
+        tests, error = results.validate_tests(args.tests)
+        if error:
+            return error, 400
+        session = db.Session()
+        run, error = _open_run(run_id)
+        if error:
+            return error
+        results.add_tests(session, run, tests)
+        run.updated = datetime.datetime.utcnow()
+        session.commit()
+        return {"id": run.id, "tests": _test_count(session, run)}, 200
+
+
+class ResultsFinalize(Resource):
+    @oidc.accept_token(require_token=False, scopes_required=_SCOPES)
+    def post(self, run_id):
+        """Finalize an open test run once all its tests have been appended."""
+        args = _FINALIZE_PARSER.parse_args(strict=True)
+        session = db.Session()
+        run, error = _open_run(run_id)
+        if error:
+            return error
+        run.state = "finalized"
+        run.updated = datetime.datetime.utcnow()
+        run.tests_finished = _utc(args.tests_finished) or run.tests_finished
+        jobs.record_upload(session, run)
+        feed.notify(session)
+        results.commit(session, [run])
+        return {"id": run.id, "tests": _test_count(session, run)}, 200
+
+
+#: The names artifacts may have.
+_ARTIFACT_NAME = re.compile(r"^[\w.+-]{1,256}$")
+
+
+def _artifact(artifact):
+    """Serialize a :class:`kerneltest.db.Artifact` for the artifacts API."""
+    return {
+        "id": artifact.id,
+        "name": artifact.name,
+        "content_type": artifact.content_type,
+        "length": artifact.length,
+        "offset": artifact.received,
+        "state": artifact.state,
+        "sha256": artifact.sha256,
+        "test_run_id": artifact.run_id,
+        "test_id": artifact.test_id,
+        "url": flask.url_for("ui.artifact", artifact_id=artifact.id),
+    }
+
+
+def _artifact_store():
+    return artifacts.ArtifactStore(flask.current_app.config["ARTIFACT_DIR"])
+
+
+class Artifacts(Resource):
+    @oidc.accept_token(require_token=False, scopes_required=_SCOPES)
+    def post(self):
+        """
+        Start uploading an artifact for a test run or one of its tests.
+
+        The contents are then sent in one or more PATCH requests to the
+        artifact's URL.
+        """
         parser = reqparse.RequestParser(trim=True, bundle_errors=True)
         parser.add_argument(
-            "kernel_version",
-            type=str,
-            help="The kernel version tested. For example: '5.1.3'.",
-            location="args",
+            "test_run_id",
+            type=int,
+            help="The ID of the test run the artifact belongs to.",
+            required=True,
+            location="json",
         )
         parser.add_argument(
-            "build_release",
+            "test_id",
+            type=int,
+            help="The ID of the test within the run the artifact belongs to.",
+            location="json",
+        )
+        parser.add_argument(
+            "name",
             type=str,
-            help="The release of the build tested. For example: '300.fc30'.",
-            location="args",
+            help="The artifact's file name. For example: 'dmesg.log'.",
+            required=True,
+            location="json",
         )
         parser.add_argument(
-            "arch",
+            "length",
+            type=inputs.natural,
+            help="The size of the artifact in bytes.",
+            required=True,
+            location="json",
+        )
+        parser.add_argument(
+            "content_type",
             type=str,
-            help="The architecture the tests were run on. For example: 'aarch64'.",
-            location="args",
+            help="The artifact's MIME type; it defaults to 'text/plain'.",
+            location="json",
+        )
+        args = parser.parse_args(strict=True)
+        if not _ARTIFACT_NAME.match(args.name):
+            return {"error": "name may only contain letters, digits and .+-_"}, 400
+        if args.length > flask.current_app.config["ARTIFACT_MAX_SIZE"]:
+            return {"error": "the artifact is too large"}, 413
+        run = db.TestRun.query.get(args.test_run_id)
+        if run is None:
+            return {"error": "test_run_id was not found"}, 400
+        if args.test_id is not None and args.test_id not in [t.id for t in run.tests]:
+            return {"error": "test_id is not part of the test run"}, 400
+        user = flask.g.user.username if flask.g.user else None
+        if run.user != user:
+            return {"error": "the test run was uploaded by another user"}, 403
+
+        session = db.Session()
+        artifact = db.Artifact(
+            name=args.name,
+            content_type=args.content_type or "text/plain",
+            length=args.length,
+            run=run,
+            test_id=args.test_id,
+        )
+        session.add(artifact)
+        session.flush()
+        if artifact.length == 0:
+            _artifact_store().append(artifact, 0, flask.request.stream, 0)
+        session.commit()
+        location = flask.url_for("artifact", artifact_id=artifact.id)
+        return _artifact(artifact), 201, {"Location": location}
+
+
+class Artifact(Resource):
+    def get(self, artifact_id):
+        """Get an artifact's metadata, including how much has been uploaded."""
+        artifact = db.Artifact.query.get(artifact_id)
+        if artifact is None:
+            return {"error": "the artifact was not found"}, 404
+        return _artifact(artifact), 200
+
+    def head(self, artifact_id):
+        """Get the offset to resume uploading an artifact from."""
+        artifact = db.Artifact.query.get(artifact_id)
+        if artifact is None:
+            return flask.Response(status=404)
+        return flask.Response(
+            headers={
+                "Upload-Offset": str(artifact.received),
+                "Upload-Length": str(artifact.length),
+                "Cache-Control": "no-store",
+            }
+        )
+
+    @oidc.accept_token(require_token=False, scopes_required=_SCOPES)
+    def patch(self, artifact_id):
+        """
+        Upload a chunk of an artifact.
+
+        The request body is the chunk, with the "application/offset+octet-stream"
+        content type, and the Upload-Offset header says where in the file it
+        starts. A chunk that doesn't start at the current offset is rejected
+        with HTTP 409 and the current offset in the Upload-Offset header.
+        """
+        request = flask.request
+        if request.mimetype != "application/offset+octet-stream":
+            return {"error": "chunks must be application/offset+octet-stream"}, 415
+        try:
+            offset = int(request.headers["Upload-Offset"])
+        except (KeyError, ValueError):
+            return {"error": "the Upload-Offset header is required"}, 400
+        if request.content_length is None:
+            return {"error": "the Content-Length header is required"}, 411
+
+        session = db.Session()
+        artifact = session.query(db.Artifact).with_for_update().get(artifact_id)
+        if artifact is None:
+            return {"error": "the artifact was not found"}, 404
+        user = flask.g.user.username if flask.g.user else None
+        if artifact.run.user != user:
+            return {"error": "the artifact was uploaded by another user"}, 403
+        if artifact.state == "complete":
+            return {"error": "the artifact has already been uploaded"}, 409
+        if request.content_length > min(
+            artifact.length - offset, flask.current_app.config["ARTIFACT_MAX_CHUNK"]
+        ):
+            return {"error": "the chunk is too large"}, 413
+        try:
+            _artifact_store().append(
+                artifact, offset, request.stream, request.content_length
+            )
+        except artifacts.OffsetMismatch as e:
+            session.rollback()
+            return (
+                {"error": "the upload is at offset {}".format(e.expected)},
+                409,
+                {"Upload-Offset": str(e.expected)},
+            )
+        session.commit()
+        return flask.Response(
+            status=204, headers={"Upload-Offset": str(artifact.received)}
         )
+
+
+def _run_parser(tests_required):
+    """
+    Make a parser for the arguments describing a new test run.
+
+    Args:
+        tests_required (bool): Whether the run must be uploaded with tests.
+    """
+    parser = reqparse.RequestParser(trim=True, bundle_errors=True)
+    parser.add_argument(
+        "kernel_version",
+        type=str,
+        help="The kernel version tested. For example: '5.1.3'.",
+        required=True,
+        location="json",
+    )
+    parser.add_argument(
+        "build_release",
+        type=str,
+        help="The release of the build tested. For example: '300.fc30'.",
+        required=True,
+        location="json",
+    )
+    parser.add_argument(
+        "arch",
+        type=str,
+        help="The architecture the tests were run on. For example: 'aarch64'.",
+        required=True,
+        location="json",
+    )
+    parser.add_argument(
+        "fedora_version",
+        type=int,
+        help="The Fedora release the tests were run on. For example: 30.",
+        required=True,
+        location="json",
+    )
+    parser.add_argument(
+        "correlation_id",
+        type=str,
+        help=_CORRELATION_ID_HELP,
+        location="json",
+    )
+    parser.add_argument(
+        "tests_started",
+        type=inputs.datetime_from_iso8601,
+        help="When the tests started, as an ISO 8601 timestamp.",
+        location="json",
+    )
+    parser.add_argument(
+        "tests_finished",
+        type=inputs.datetime_from_iso8601,
+        help="When the tests finished, as an ISO 8601 timestamp.",
+        location="json",
+    )
+    parser.add_argument(
+        "tests",
+        type=_unparsed,
+        help=_TEST_HELP,
+        required=tests_required,
+        location="json",
+    )
+    return parser
+
+
+def _unparsed(value):
+    """Leave an argument as it was sent, for tests, which are validated later."""
+    return value
+
+
+def _tests_parser():
+    """Make a parser for a batch of tests appended to a test run."""
+    parser = reqparse.RequestParser(trim=True, bundle_errors=True)
+    parser.add_argument(
+        "tests", type=_unparsed, help=_TEST_HELP, required=True, location="json"
+    )
+    return parser
+
+
+def _finalize_parser():
+    """Make a parser for the arguments finalizing a test run."""
+    parser = reqparse.RequestParser(trim=True, bundle_errors=True)
+    parser.add_argument(
+        "tests_finished",
+        type=inputs.datetime_from_iso8601,
+        help="When the tests finished, as an ISO 8601 timestamp.",
+        location="json",
+    )
+    return parser
+
+
+# The upload parsers are built once rather than for each upload
+_UPLOAD_PARSER = _run_parser(tests_required=True)
+_OPEN_PARSER = _run_parser(tests_required=False)
+_APPEND_PARSER = _tests_parser()
+_FINALIZE_PARSER = _finalize_parser()
+
+
+def _run_fields(args):
+    """
+    Get the fields of a new test run for the current user from the parsed
+    arguments and the Idempotency-Key header, if there is one.
+
+    Returns:
+        tuple: A dictionary of :class:`kerneltest.db.TestRun` fields and
+            ``None``, or ``None`` and an error response.
+    """
+    try:
+        fedora_version = db.Release.query.filter_by(version=args.fedora_version).one()
+    except NoResultFound:
+        return None, ({"error": "fedora_version was not found"}, 400)
+
+    user = flask.g.user.username if flask.g.user else None
+    key = flask.request.headers.get("Idempotency-Key")
+    if key is not None and not 0 < len(key) <= 255:
+        return None, ({"error": "Idempotency-Key must be 1-255 characters"}, 400)
+
+    fields = dict(
+        kernel_version=args.kernel_version,
+        build_release=args.build_release,
+        arch=args.arch,
+        release=fedora_version,
+        user=user,
+        correlation_id=args.correlation_id or None,
+        tests_started=_utc(args.tests_started),
+        tests_finished=_utc(args.tests_finished),
+        idempotency_key=results.idempotency_key(user, key) if key else None,
+    )
+    return fields, None
+
+
+def _duplicate(run):
+    """Respond to an upload that duplicates an existing test run."""
+    return {"id": run.id}, 200, {"Idempotent-Replayed": "true"}
+
+
+def _not_stored(error):
+    """Respond to an upload that breaks a database constraint."""
+    _log.warning("Rejected an upload that could not be stored: %r", error)
+    return {"error": "the test run is invalid and could not be stored"}, 400
+
+
+def _open_run(run_id):
+    """
+    Get an open test run the current user may append to.
+
+    Returns:
+        tuple: The :class:`kerneltest.db.TestRun` and ``None``, or ``None`` and
+            an error response.
+    """
+    run = db.TestRun.query.get(run_id)
+    if run is None:
+        return None, ({"error": "the test run was not found"}, 404)
+    user = flask.g.user.username if flask.g.user else None
+    if run.user != user:
+        return None, ({"error": "the test run was opened by another user"}, 403)
+    if run.state != "open":
+        return None, ({"error": "the test run has been finalized"}, 409)
+    return run, None
+
+
+def _utc(value):
+    """Convert a timestamp to the naive UTC datetimes the database stores."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class Search(Resource):
+    def get(self):
+        """
+        Search the names and details of tests, newest first.
+
+        Each hit includes the test run it belongs to and an HTML snippet of the
+        text around the match, with the matching words in bold.
+        """
+        parser = reqparse.RequestParser(trim=True, bundle_errors=True)
         parser.add_argument(
-            "fedora_version",
-            type=int,
-            help="The Fedora release the tests were run on. For example: 30.",
+            "q",
+            type=str,
+            help="The words to search for; tests must contain all of them.",
+            required=True,
             location="args",
         )
         parser.add_argument(
@@ -70,139 +791,313 @@ class Results(Resource):
             location="args",
         )
         args = parser.parse_args()
+        if not args.q.split():
+            return {"error": "q must contain at least one word"}, 400
+
+        page = search.search(
+            args.q,
+            page=args.page or 1,
+            items_per_page=args.items_per_page or db.DEFAULT_PAGE_SIZE,
+        )
+        return (
+            {
+                "page": page.page,
+                "items_per_page": page.items_per_page,
+                "total_items": page.total_items,
+                "items": [
+                    {
+                        "test": {
+                            "id": hit.test.id,
+                            "name": hit.test.name,
+                            "passed": hit.test.passed,
+                            "waived": hit.test.waived,
+                        },
+                        "test_run": {
+                            "id": hit.test.run.id,
+                            "kernel_version": hit.test.run.kernel_version,
+                            "build_release": hit.test.run.build_release,
+                            "arch": hit.test.run.arch,
+                            "fedora_version": hit.test.run.fedora_version,
+                            "created": hit.test.run.created,
+                        },
+                        "snippet": str(hit.snippet),
+                    }
+                    for hit in page.items
+                ],
+            },
+            200,
+        )
+
+
+class TestHistory(Resource):
+    def get(self, name):
+        """
+        Get how often a test passed, failed, or was waived over time.
+
+        Outcomes are counted for each release and architecture the test ran
+        on, by the day, week (starting on Monday), or kernel build they were
+        uploaded for.
+        """
+        args = history_parser().parse_args()
+        return history_body(db.Session(), name, args), 200
+
+
+def history_parser():
+    """Make the parser for the arguments of :meth:`TestHistory.get`."""
+    parser = reqparse.RequestParser(trim=True, bundle_errors=True)
+    parser.add_argument(
+        "bucket",
+        type=str,
+        choices=history.BUCKETS,
+        help="How to group the outcomes: 'day' (the default), 'week' or 'kernel'.",
+        location="args",
+    )
+    parser.add_argument(
+        "release",
+        type=int,
+        help="Only include test runs for this Fedora version. For example: 30.",
+        location="args",
+    )
+    parser.add_argument(
+        "arch",
+        type=str,
+        help="Only include test runs for this architecture. For example: 'x86_64'.",
+        location="args",
+    )
+    parser.add_argument(
+        "days",
+        type=inputs.positive,
+        help="Only include test runs created in this many days.",
+        location="args",
+    )
+    return parser
+
+
+def history_body(session, name, args):
+    """
+    Get a test's history for :meth:`TestHistory.get` and the asynchronous
+    read API.
+
+    Args:
+        session (sqlalchemy.orm.Session): The session to query with.
+        name (str): The test's name.
+        args (flask_restful.reqparse.Namespace): The arguments parsed by
+            :func:`history_parser`.
+
+    Returns:
+        dict: The response body.
+    """
+    bucket = args.bucket or "day"
+    since = None
+    if args.days:
+        since = datetime.datetime.utcnow() - datetime.timedelta(days=args.days)
+    series = history.series(
+        session,
+        name,
+        bucket=bucket,
+        release=args.release,
+        arch=args.arch,
+        since=since,
+    )
+    return {
+        "name": name,
+        "bucket": bucket,
+        "series": [
+            {
+                "release": release,
+                "arch": arch,
+                "points": [
+                    {
+                        "bucket": (
+                            point.bucket
+                            if bucket == "kernel"
+                            else point.bucket.isoformat()
+                        ),
+                        "passed": point.passed,
+                        "failed": point.failed,
+                        "waived": point.waived,
+                    }
+                    for point in points
+                ],
+            }
+            for (release, arch), points in series.items()
+        ],
+    }
+
+
+class Latency(Resource):
+    def get(self):
+        """
+        Get percentiles of how long each stage of the harness's jobs took.
+
+        The stages are "queue", from the Koji build completing until the guest
+        boots; "boot", until the tests start; "test", until they finish; and
+        "upload", until the results arrive. Durations are in seconds.
+        """
+        args = latency_parser().parse_args()
+        return latency_body(db.Session(), args), 200
+
+
+def latency_parser():
+    """Make the parser for the arguments of :meth:`Latency.get`."""
+    parser = reqparse.RequestParser(trim=True, bundle_errors=True)
+    parser.add_argument(
+        "release",
+        type=str,
+        help="Only include jobs for this release. For example: 'Fedora30'.",
+        location="args",
+    )
+    parser.add_argument(
+        "arch",
+        type=str,
+        help="Only include jobs for this architecture. For example: 'x86_64'.",
+        location="args",
+    )
+    parser.add_argument(
+        "days",
+        type=inputs.positive,
+        help="Only include jobs queued in this many days; it defaults to 30.",
+        location="args",
+    )
+    return parser
+
+
+def latency_body(session, args):
+    """
+    Get the harness's job latency for :meth:`Latency.get` and the asynchronous
+    read API.
+
+    Args:
+        session (sqlalchemy.orm.Session): The session to query with.
+        args (flask_restful.reqparse.Namespace): The arguments parsed by
+            :func:`latency_parser`.
+
+    Returns:
+        dict: The response body.
+    """
+    since = datetime.datetime.utcnow() - datetime.timedelta(days=args.days or 30)
+    latency = jobs.latency(session, since=since, release=args.release, arch=args.arch)
+    items = []
+    for (release, arch), stages in sorted(latency.items()):
+        items.append(
+            {
+                "release": release,
+                "arch": arch,
+                "stages": {
+                    stage: dict(
+                        count=count,
+                        **{"p{}".format(pct): value for pct, value in pcts.items()}
+                    )
+                    for stage, (count, pcts) in stages.items()
+                },
+            }
+        )
+    return {"since": datetime.datetime.isoformat(since), "items": items}
+
+
+def _job(job):
+    """Serialize a :class:`kerneltest.db.Job` for the jobs API."""
+    return {
+        "id": job.id,
+        "build": job.build,
+        "release": job.release,
+        "arch": job.arch,
+        "state": job.state,
+        "worker": job.worker,
+        "correlation_id": job.correlation_id,
+        "lease_expires": (
+            datetime.datetime.isoformat(job.lease_expires)
+            if job.lease_expires
+            else None
+        ),
+    }
 
-        query = db.TestRun.query
-        if args.arch:
-            query = query.filter_by(arch=args.arch)
-        if args.kernel_version:
-            query = query.filter_by(kernel_version=args.kernel_version)
-        if args.build_release:
-            query = query.filter_by(build_release=args.build_release)
-        if args.fedora_version:
-            query = query.filter_by(fedora_version=args.fedora_version)
-        page_number = args.page or 1
-        items_per_page = args.items_per_page or db.DEFAULT_PAGE_SIZE
-        page = query.paginate(page=page_number, items_per_page=items_per_page)
-        result = {
-            "page": page.page,
-            "items_per_page": page.items_per_page,
-            "total_items": page.total_items,
-            "items": [
-                {
-                    "id": i.id,
-                    "created": datetime.datetime.isoformat(i.created),
-                    "arch": i.arch,
-                    "kernel_version": i.kernel_version,
-                    "build_release": i.build_release,
-                    "fedora_version": i.fedora_version,
-                    "tests": [
-                        {
-                            "id": t.id,
-                            "name": t.name,
-                            "passed": t.passed,
-                            "waived": t.waived,
-                            "details": t.details,
-                        }
-                        for t in i.tests
-                    ],
-                }
-                for i in page.items
-            ],
-        }
-        return result, 200
 
+class JobLease(Resource):
     @oidc.accept_token(require_token=False, scopes_required=_SCOPES)
     def post(self):
+        """
+        Lease the oldest queued job to a test worker.
+
+        Responds with HTTP 204 if there is no job to lease. Leases expire after
+        ``JOB_LEASE_DURATION`` seconds unless the worker sends a heartbeat.
+        """
         parser = reqparse.RequestParser(trim=True, bundle_errors=True)
         parser.add_argument(
-            "kernel_version",
-            type=str,
-            help="The kernel version tested. For example: '5.1.3'.",
-            required=True,
-            location="json",
+            "worker", type=str, help=_WORKER_HELP, required=True, location="json"
         )
         parser.add_argument(
-            "build_release",
+            "arch",
             type=str,
-            help="The release of the build tested. For example: '300.fc30'.",
-            required=True,
+            help="Only lease jobs for this architecture. For example: 'x86_64'.",
             location="json",
         )
         parser.add_argument(
-            "arch",
+            "release",
             type=str,
-            help="The architecture the tests were run on. For example: 'aarch64'.",
-            required=True,
+            help="Only lease jobs for this release. For example: 'Fedora30'.",
             location="json",
         )
-        parser.add_argument(
-            "fedora_version",
-            type=int,
-            help="The Fedora release the tests were run on. For example: 30.",
-            required=True,
-            location="json",
+        args = parser.parse_args(strict=True)
+        session = db.Session()
+        job = jobs.lease(
+            session,
+            args.worker,
+            flask.current_app.config["JOB_LEASE_DURATION"],
+            arch=args.arch,
+            release=args.release,
         )
+        session.commit()
+        if job is None:
+            return flask.Response(status=204)
+        return _job(job), 200
+
+
+class JobHeartbeat(Resource):
+    @oidc.accept_token(require_token=False, scopes_required=_SCOPES)
+    def post(self, job_id):
+        """Extend a test worker's lease on a job."""
+        parser = reqparse.RequestParser(trim=True, bundle_errors=True)
         parser.add_argument(
-            "tests", type=list, help=_TEST_HELP, required=True, location="json"
+            "worker", type=str, help=_WORKER_HELP, required=True, location="json"
         )
         args = parser.parse_args(strict=True)
         session = db.Session()
-        try:
-            fedora_version = db.Release.query.filter_by(
-                version=args.fedora_version
-            ).one()
-        except NoResultFound:
-            return {"error": "fedora_version was not found"}, 400
-
-        user = flask.g.user.username if flask.g.user else None
-
-        run = db.TestRun(
-            kernel_version=args.kernel_version,
-            build_release=args.build_release,
-            arch=args.arch,
-            release=fedora_version,
-            user=user,
-        )
-        for test in args.tests:
-            session.add(
-                db.Test(
-                    name=test["name"],
-                    passed=test["passed"],
-                    waived=test["waived"],
-                    details=test["details"],
-                    run=run,
-                )
-            )
-        session.add(run)
+        extended = jobs.heartbeat(
+            session, job_id, args.worker, flask.current_app.config["JOB_LEASE_DURATION"]
+        )
         session.commit()
+        if not extended:
+            return {"error": "the worker does not hold a lease on this job"}, 409
+        return _job(db.Job.query.populate_existing().get(job_id)), 200
 
-        # The message format here matches the old fedmsg schema. Eventually it
-        # should be changed, but message consumers need to be cataloged and notified.
-        message = fm_api.Message(
-            topic="kerneltest.upload.new",
-            body={
-                "agent": user or "anon",
-                "test": {
-                    "tester": user or "anon",
-                    "testdate": str(run.created),
-                    "testset": ", ".join([test.name for test in run.tests]),
-                    "kernel_version": run.package_name,
-                    "fedora_version": run.fedora_version,
-                    "arch": run.arch,
-                    "release": "Fedora release {}".format(run.fedora_version),
-                    "failed_tests": ", ".join(
-                        [test.name for test in run.tests if not test.passed]
-                    ),
-                    "authenticated": True,
-                },
-            },
+
+class JobComplete(Resource):
+    @oidc.accept_token(require_token=False, scopes_required=_SCOPES)
+    def post(self, job_id):
+        """Complete a leased job by linking it to its uploaded test run."""
+        parser = reqparse.RequestParser(trim=True, bundle_errors=True)
+        parser.add_argument(
+            "worker", type=str, help=_WORKER_HELP, required=True, location="json"
         )
-        try:
-            fm_api.publish(message)
-        except (
-            fm_api.exceptions.PublishException,
-            fm_api.exceptions.ConnectionException,
-        ) as err:
-            _log.error("Failed to send %r: %r", message, err)
-
-        return {}, 201
+        parser.add_argument(
+            "test_run_id",
+            type=int,
+            help="The ID of the test run the job's results were uploaded as.",
+            required=True,
+            location="json",
+        )
+        args = parser.parse_args(strict=True)
+        session = db.Session()
+        test_run = db.TestRun.query.get(args.test_run_id)
+        if test_run is None:
+            return {"error": "test_run_id was not found"}, 400
+        job = db.Job.query.get(job_id)
+        build = "kernel-{}-{}".format(test_run.kernel_version, test_run.build_release)
+        if job is not None and (job.build, job.arch) != (build, test_run.arch):
+            return {"error": "the test run is not of the job's build and arch"}, 400
+        completed = jobs.complete(session, job_id, args.worker, test_run)
+        session.commit()
+        if not completed:
+            return {"error": "the worker does not hold a lease on this job"}, 409
+        return _job(db.Job.query.populate_existing().get(job_id)), 200
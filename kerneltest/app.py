@@ -5,17 +5,58 @@ This module handles the creation and configuration of the Flask application.
 
 import collections
 import datetime
+import logging
+import time
 
 from flask_restful import Api
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm.exc import NoResultFound
+import click
 import flask
 
-from . import default_config, db, __version__, ui_view, authentication, api
+from . import (
+    default_config,
+    db,
+    __version__,
+    ui_view,
+    authentication,
+    api,
+    archive,
+    artifacts,
+    cache,
+    compression,
+    feed,
+    ingest,
+    prerender,
+    representation,
+    results,
+)
+
+
+_log = logging.getLogger(__name__)
 
 
 User = collections.namedtuple("User", ["groups", "cla", "username"])
 
 
+class Request(flask.Request):
+    """
+    A request that allows artifact chunks and compressed bodies to be larger
+    than other requests.
+
+    The limit is enforced whenever the form is parsed, which authentication
+    does for every request, even when the body isn't form data.
+    """
+
+    @property
+    def max_content_length(self):
+        if self.mimetype == "application/offset+octet-stream":
+            return flask.current_app.config["ARTIFACT_MAX_CHUNK"]
+        if self.environ.get("kerneltest.decompressed"):
+            return flask.current_app.config["MAX_DECOMPRESSED_LENGTH"]
+        return super(Request, self).max_content_length
+
+
 def create(config=None):
     """
     Create an instance of the Flask application
@@ -29,25 +70,141 @@ def create(config=None):
         flask.Flask: The configured Flask application.
     """
     app = flask.Flask(__name__)
+    app.request_class = Request
+    app.wsgi_app = compression.CompressionMiddleware(app.wsgi_app, app.config)
     if config:
         app.config.update(config)
     else:
         app.config.update(default_config.config.load_config())
     db.initialize(app.config)
     authentication.oidc.init_app(app)
+    app.extensions["render_cache"] = cache.RenderCache(
+        app.config["RENDER_CACHE_SIZE"],
+        app.config["RENDER_CACHE_DIR"] or None,
+        app.config["RENDER_CACHE_DIR_SIZE"],
+    )
+    app.extensions["results_feed"] = feed.Feed(app.config["FEED_POLL_INTERVAL"])
 
     app.api = Api(app)
+    app.api.representation("application/json")(representation.output_json)
     app.api.add_resource(api.Results, "/api/v1/results/")
+    app.api.add_resource(api.IngestStatus, "/api/v1/results/queue/<int:ingest_id>")
+    if app.config["FEED_WSGI"]:
+        app.api.add_resource(api.ResultsFeed, "/api/v1/results/feed")
+    app.api.add_resource(api.ResultsOpen, "/api/v1/results/open")
+    app.api.add_resource(api.ResultsAppend, "/api/v1/results/<int:run_id>/tests")
+    app.api.add_resource(api.ResultsFinalize, "/api/v1/results/<int:run_id>/finalize")
+    app.api.add_resource(api.Artifacts, "/api/v1/artifacts/")
+    app.api.add_resource(api.Artifact, "/api/v1/artifacts/<int:artifact_id>")
+    app.api.add_resource(api.Search, "/api/v1/search/")
+    app.api.add_resource(api.TestHistory, "/api/v1/tests/<path:name>/history")
+    app.api.add_resource(api.Latency, "/api/v1/latency/")
+    app.api.add_resource(api.JobLease, "/api/v1/jobs/lease")
+    app.api.add_resource(api.JobHeartbeat, "/api/v1/jobs/<int:job_id>/heartbeat")
+    app.api.add_resource(api.JobComplete, "/api/v1/jobs/<int:job_id>/complete")
     app.register_blueprint(ui_view.blueprint, url_prefix="/")
 
     app.before_request(pre_request_user)
     app.teardown_request(post_request_db)
     app.context_processor(include_template_variables)
     app.register_error_handler(NoResultFound, handle_no_result)
+    app.cli.command("delete-abandoned-runs")(delete_abandoned_runs)
+    app.cli.command("ingest-writer")(ingest_writer)
+    app.cli.command("archive-retired-releases")(archive_retired_releases)
+    app.cli.command("prerender")(prerender_pages)
 
     return app
 
 
+def delete_abandoned_runs():
+    """
+    Delete open test runs that nothing has been appended to for a while, and
+    any artifact files no longer referenced by the database.
+    """
+    session = db.Session()
+    deleted = results.delete_abandoned(
+        session, flask.current_app.config["TEST_RUN_ABANDON_AFTER"]
+    )
+    session.commit()
+    print("Deleted {} abandoned test runs".format(deleted))
+    uploading = {
+        artifact_id
+        for artifact_id, in session.query(db.Artifact.id).filter_by(state="uploading")
+    }
+    stored = {
+        sha256
+        for sha256, in session.query(db.Artifact.sha256).filter_by(state="complete")
+    }
+    store = artifacts.ArtifactStore(flask.current_app.config["ARTIFACT_DIR"])
+    print(
+        "Deleted {} unreferenced artifact files".format(store.prune(uploading, stored))
+    )
+
+
+@click.option("--once", is_flag=True, help="Store one batch and exit.")
+@click.option("--batch-size", type=int, help="The most uploads per transaction.")
+def ingest_writer(once, batch_size):
+    """Store uploads queued by the asynchronous ingest mode in batches."""
+    config = flask.current_app.config
+    batch_size = batch_size or config["INGEST_BATCH_SIZE"]
+    session = db.Session()
+    while True:
+        try:
+            counts = ingest.write_batch(session, batch_size)
+        except SQLAlchemyError as e:
+            session.rollback()
+            _log.error("Failed to store a batch of uploads: %r", e)
+            counts = None
+        if counts:
+            _log.info(
+                "Stored %d uploads, %d duplicates, %d failed",
+                counts["stored"],
+                counts["duplicate"],
+                counts["failed"],
+            )
+        if once:
+            if counts is None:
+                raise click.ClickException("Failed to store a batch of uploads")
+            print(
+                "Stored {} uploads, {} duplicates, {} failed".format(
+                    counts["stored"], counts["duplicate"], counts["failed"]
+                )
+            )
+            return
+        if not counts or sum(counts.values()) < batch_size:
+            time.sleep(config["INGEST_POLL_INTERVAL"])
+
+
+def archive_retired_releases():
+    """
+    Move the test runs of retired releases out of the database into archive
+    files, where they can still be read, more slowly.
+    """
+    session = db.Session()
+    store = archive.Archive(flask.current_app.config["ARCHIVE_DIR"])
+    retired = (
+        session.query(db.Release)
+        .filter_by(support="RETIRED")
+        .order_by(db.Release.version)
+    )
+    for release in retired.all():
+        archived = store.store(session, release)
+        session.commit()
+        print("Archived {} test runs of Fedora {}".format(archived, release.version))
+
+
+@click.option("--all", "everything", is_flag=True, help="Render every page.")
+def prerender_pages(everything):
+    """
+    Render the public pages into static files, only rendering those affected
+    by test runs changed since the last time unless --all is given.
+    """
+    if not flask.current_app.config["PRERENDER_DIR"]:
+        raise click.ClickException("PRERENDER_DIR is not set")
+    rendered = prerender.prerender(flask.current_app._get_current_object(), everything)
+    print("Rendered {} pages".format(rendered))
+
+
 def handle_no_result(exception):
     """Turn SQLAlchemy NotFound into HTTP 404"""
     return "Not found", 404
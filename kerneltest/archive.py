@@ -0,0 +1,280 @@
+# Licensed under the terms of the GNU GPL License version 2
+"""
+Cold storage for the test runs of retired releases.
+
+The ``archive-retired-releases`` command moves each retired release's test
+runs out of the database into a gzipped file in ``ARCHIVE_DIR``, with one
+run per line as JSON, so the tables every page and API call queries only hold
+maintained releases. Archived runs are still served, by reading the files,
+which is slower; see :class:`Archive`.
+
+A release is archived by writing its runs to a new file and renaming it into
+place before deleting them from the database. Runs already in the file when a
+release is archived again, for example after an interrupted run, are not
+written twice. Artifacts of archived runs are listed in the file, but their
+files are no longer referenced and are removed with the other unreferenced
+artifacts.
+"""
+import datetime
+import gzip
+import json
+import os
+import re
+import shutil
+
+from sqlalchemy import orm
+
+from . import db
+from .ingest import parse_time
+
+
+#: The most test runs deleted from the database in one statement.
+BATCH_SIZE = 500
+
+_FILE_NAME = re.compile(r"^fedora-(\d+)\.ndjson\.gz$")
+
+
+class Archive(object):
+    """
+    The archived test runs in a directory.
+
+    Args:
+        root (str): The directory; it is created when a release is archived.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, version):
+        """The path of a release's archive file."""
+        return os.path.join(self.root, "fedora-{}.ndjson.gz".format(version))
+
+    def versions(self):
+        """
+        The releases that have been archived.
+
+        Returns:
+            list: The Fedora versions, newest first.
+        """
+        if not os.path.isdir(self.root):
+            return []
+        versions = []
+        for name in os.listdir(self.root):
+            match = _FILE_NAME.match(name)
+            if match:
+                versions.append(int(match.group(1)))
+        return sorted(versions, reverse=True)
+
+    def runs(self, version=None):
+        """
+        Read archived test runs.
+
+        The runs are new, transient :class:`kerneltest.db.TestRun` objects with
+        their tests; they must not be added to a session.
+
+        Args:
+            version (int): Only read this release's runs; by default every
+                archived release's runs are read.
+
+        Yields:
+            kerneltest.db.TestRun: The test runs, oldest first for each release.
+        """
+        versions = self.versions() if version is None else [version]
+        for version in versions:
+            for record in self._records(version):
+                yield _run(record)
+
+    def get(self, run_id):
+        """
+        Find an archived test run by its ID.
+
+        Every archive file is read until the run is found, so this is slow.
+
+        Returns:
+            kerneltest.db.TestRun: The transient test run, or ``None``.
+        """
+        # Runs are written with their ID first, so most lines aren't parsed
+        prefix = '{{"id": {},'.format(run_id)
+        for version in self.versions():
+            with gzip.open(self.path(version), "rt", encoding="utf-8") as fd:
+                for line in fd:
+                    if line.startswith(prefix):
+                        return _run(json.loads(line))
+        return None
+
+    def store(self, session, release):
+        """
+        Move a release's test runs from the database into its archive file.
+
+        Args:
+            session (sqlalchemy.orm.Session): The session to use; it is not
+                committed, so the runs stay in the database until it is.
+            release (kerneltest.db.Release): The release to archive.
+
+        Returns:
+            int: The number of test runs moved.
+        """
+        run_ids = [
+            run_id
+            for run_id, in session.query(db.TestRun.id)
+            .filter_by(fedora_version=release.version)
+            .order_by(db.TestRun.id)
+        ]
+        if not run_ids:
+            return 0
+
+        os.makedirs(self.root, exist_ok=True)
+        path = self.path(release.version)
+        archived = set()
+        if os.path.exists(path):
+            archived = {record["id"] for record in self._records(release.version)}
+            shutil.copyfile(path, path + ".tmp")
+        elif os.path.exists(path + ".tmp"):
+            os.unlink(path + ".tmp")
+        # Appending adds a gzip member, which readers treat as one stream
+        with open(path + ".tmp", "ab") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="ab") as fd:
+                self._write(session, fd, [i for i in run_ids if i not in archived])
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(path + ".tmp", path)
+
+        # If the tables are partitioned by release, dropping the release's
+        # partitions deletes its runs and tests at once; only those in the
+        # default partitions are left for the deletes below
+        db.models.drop_partitions(session, release.version)
+        for batch in _batches(run_ids):
+            for model in (db.Job, db.Ingest):
+                session.query(model).filter(model.test_run_id.in_(batch)).update(
+                    {model.test_run_id: None}, synchronize_session=False
+                )
+            for model in (db.Artifact, db.Test):
+                session.query(model).filter(model.run_id.in_(batch)).delete(
+                    synchronize_session=False
+                )
+            session.query(db.TestRun).filter(db.TestRun.id.in_(batch)).delete(
+                synchronize_session=False
+            )
+        session.expire_all()
+        return len(run_ids)
+
+    def _write(self, session, fd, run_ids):
+        """Write test runs to an archive file."""
+        for batch in _batches(run_ids):
+            runs = (
+                session.query(db.TestRun)
+                .options(
+                    orm.selectinload(db.TestRun.tests),
+                    orm.selectinload(db.TestRun.artifacts),
+                )
+                .filter(db.TestRun.id.in_(batch))
+                .order_by(db.TestRun.id)
+            )
+            for run in runs:
+                fd.write(json.dumps(_record(run)).encode("utf-8") + b"\n")
+
+    def _records(self, version):
+        """Read the JSON records in a release's archive file."""
+        path = self.path(version)
+        if not os.path.exists(path):
+            return
+        with gzip.open(path, "rt", encoding="utf-8") as fd:
+            for line in fd:
+                yield json.loads(line)
+
+
+def paginate(items, page=1, items_per_page=db.DEFAULT_PAGE_SIZE):
+    """
+    Make a page of archived items, like :meth:`kerneltest.db.BaseQuery.paginate`.
+
+    Args:
+        items (list): All the items.
+        page (int): The page number to make.
+        items_per_page (int): The number of items per page.
+
+    Returns:
+        kerneltest.db.meta.Page: The page.
+    """
+    start = items_per_page * (page - 1)
+    return db.meta.Page(
+        items=items[start : start + items_per_page],
+        page=page,
+        items_per_page=items_per_page,
+        total_items=len(items),
+    )
+
+
+def _batches(ids):
+    for start in range(0, len(ids), BATCH_SIZE):
+        yield ids[start : start + BATCH_SIZE]
+
+
+def _time(value):
+    return None if value is None else datetime.datetime.isoformat(value)
+
+
+def _record(run):
+    """Serialize a test run for its archive file, starting with its ID."""
+    return {
+        "id": run.id,
+        "created": _time(run.created),
+        "kernel_version": run.kernel_version,
+        "build_release": run.build_release,
+        "arch": run.arch,
+        "fedora_version": run.fedora_version,
+        "user": run.user,
+        "state": run.state,
+        "correlation_id": run.correlation_id,
+        "tests_started": _time(run.tests_started),
+        "tests_finished": _time(run.tests_finished),
+        "tests": [
+            {
+                "id": test.id,
+                "name": test.name,
+                "passed": test.passed,
+                "waived": test.waived,
+                "details": test.details,
+            }
+            for test in run.tests
+        ],
+        "artifacts": [
+            {
+                "id": artifact.id,
+                "name": artifact.name,
+                "content_type": artifact.content_type,
+                "length": artifact.length,
+                "sha256": artifact.sha256,
+                "test_id": artifact.test_id,
+            }
+            for artifact in run.artifacts
+            if artifact.state == "complete"
+        ],
+    }
+
+
+def _run(record):
+    """Make a transient test run from its archived record."""
+    run = db.TestRun(
+        id=record["id"],
+        created=parse_time(record["created"]),
+        kernel_version=record["kernel_version"],
+        build_release=record["build_release"],
+        arch=record["arch"],
+        fedora_version=record["fedora_version"],
+        user=record["user"],
+        state=record["state"],
+        correlation_id=record["correlation_id"],
+        tests_started=parse_time(record["tests_started"]),
+        tests_finished=parse_time(record["tests_finished"]),
+    )
+    run.tests = [
+        db.Test(
+            id=test["id"],
+            name=test["name"],
+            passed=test["passed"],
+            waived=test["waived"],
+            details=test["details"],
+        )
+        for test in record["tests"]
+    ]
+    return run
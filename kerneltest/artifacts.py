@@ -0,0 +1,241 @@
+# Licensed under the terms of the GNU GPL License version 2
+"""
+On-disk storage for large files uploaded with test results, such as kernel logs.
+
+Artifacts are uploaded in chunks, in the style of the tus resumable upload
+protocol: the client declares the file's length up front, sends chunks with the
+offset they start at, and after an interruption asks for the offset the server
+has and carries on from there. Chunks are appended to a partial file named
+after the artifact. Once the last byte arrives the file is hashed, compressed
+with gzip and moved to a content-addressed object store, so identical files are
+only stored once::
+
+    <root>/partial/42
+    <root>/objects/ab/ab12...ef.gz
+
+Only the metadata lives in the database, in :class:`kerneltest.db.Artifact`.
+"""
+import gzip
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import flask
+
+
+_log = logging.getLogger(__name__)
+
+#: The size of the blocks files are read and written in.
+BLOCK_SIZE = 64 * 1024
+
+#: The seconds since they were last written before unreferenced files may be
+#: pruned, so uploads whose rows aren't committed yet keep their files.
+PRUNE_GRACE = 60 * 60
+
+
+class OffsetMismatch(Exception):
+    """Raised when a chunk doesn't start where the upload left off."""
+
+    def __init__(self, expected):
+        super(OffsetMismatch, self).__init__(expected)
+        self.expected = expected
+
+
+class ArtifactStore(object):
+    """
+    Store the contents of artifacts on the local disk.
+
+    Args:
+        root (str): The directory to keep artifacts in.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.partial = os.path.join(root, "partial")
+        self.objects = os.path.join(root, "objects")
+        os.makedirs(self.partial, exist_ok=True)
+        os.makedirs(self.objects, exist_ok=True)
+
+    def partial_path(self, artifact):
+        """The path of the artifact's partial upload."""
+        return os.path.join(self.partial, str(artifact.id))
+
+    def object_path(self, artifact):
+        """The path of the complete artifact's compressed contents."""
+        return os.path.join(self.objects, artifact.sha256[:2], artifact.sha256 + ".gz")
+
+    def append(self, artifact, offset, stream, length):
+        """
+        Append a chunk to an artifact that is being uploaded.
+
+        The artifact's ``received`` count is authoritative: anything in the
+        partial file past it, left by an interrupted request, is discarded.
+        Once the whole file has been received, it is moved to the object store
+        and the artifact is marked complete.
+
+        Args:
+            artifact (kerneltest.db.Artifact): The artifact; its ``received``,
+                ``state`` and ``sha256`` are updated but not committed.
+            offset (int): The offset the chunk starts at.
+            stream (file): The chunk's contents.
+            length (int): The number of bytes to read from ``stream``.
+
+        Raises:
+            OffsetMismatch: If ``offset`` isn't where the upload left off.
+        """
+        if offset != artifact.received:
+            raise OffsetMismatch(artifact.received)
+        with open(self.partial_path(artifact), "ab") as fd:
+            fd.truncate(artifact.received)
+            remaining = length
+            while remaining > 0:
+                block = stream.read(min(BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                fd.write(block)
+                remaining -= len(block)
+            fd.flush()
+            os.fsync(fd.fileno())
+        artifact.received = offset + length - remaining
+        if artifact.received >= artifact.length:
+            self._finish(artifact)
+
+    def _finish(self, artifact):
+        """Hash, compress and move a fully uploaded artifact into place."""
+        partial = self.partial_path(artifact)
+        digest = hashlib.sha256()
+        with open(partial, "rb") as fd:
+            for block in iter(lambda: fd.read(BLOCK_SIZE), b""):
+                digest.update(block)
+        artifact.sha256 = digest.hexdigest()
+        artifact.state = "complete"
+        target = self.object_path(artifact)
+        if os.path.exists(target):
+            # Mark the object as recently written so it isn't pruned before the
+            # artifact referring to it again is committed
+            os.utime(target)
+            os.unlink(partial)
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, compressed = tempfile.mkstemp(dir=os.path.dirname(target))
+        try:
+            with open(partial, "rb") as src, gzip.open(
+                os.fdopen(fd, "wb"), "wb"
+            ) as dst:
+                shutil.copyfileobj(src, dst, BLOCK_SIZE)
+            os.rename(compressed, target)
+        except Exception:
+            os.unlink(compressed)
+            raise
+        os.unlink(partial)
+        _log.info("Stored artifact %d as %s", artifact.id, artifact.sha256)
+
+    def prune(self, uploading, stored, grace=PRUNE_GRACE):
+        """
+        Remove files that no artifact refers to any more.
+
+        Files written in the last ``grace`` seconds are kept, since chunks are
+        appended and objects stored before the transaction that records them
+        commits, so they may be missing from the database's state.
+
+        Args:
+            uploading (set): The IDs of artifacts that are still uploading.
+            stored (set): The SHA-256 digests of complete artifacts.
+            grace (float): The seconds a file must not have been written for.
+
+        Returns:
+            int: The number of files removed.
+        """
+        cutoff = time.time() - grace
+        unreferenced = []
+        for name in os.listdir(self.partial):
+            if not name.isdigit() or int(name) not in uploading:
+                unreferenced.append(os.path.join(self.partial, name))
+        for prefix in os.listdir(self.objects):
+            directory = os.path.join(self.objects, prefix)
+            for name in os.listdir(directory):
+                if name[: -len(".gz")] not in stored:
+                    unreferenced.append(os.path.join(directory, name))
+        removed = 0
+        for path in unreferenced:
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.unlink(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def response(self, artifact, request):
+        """
+        Make a response serving a complete artifact.
+
+        A single byte range is honoured if the request asks for one. Otherwise,
+        clients that accept gzip get the stored compressed file as-is.
+
+        Args:
+            artifact (kerneltest.db.Artifact): The complete artifact.
+            request (flask.Request): The request to respond to.
+
+        Returns:
+            flask.Response: The response.
+        """
+        path = self.object_path(artifact)
+        headers = {
+            "Accept-Ranges": "bytes",
+            "ETag": '"{}"'.format(artifact.sha256),
+            "Content-Disposition": 'inline; filename="{}"'.format(artifact.name),
+        }
+        if request.if_none_match.contains(artifact.sha256):
+            return flask.Response(status=304, headers=headers)
+
+        byte_range = request.range
+        if byte_range is not None and len(byte_range.ranges) == 1:
+            bounds = byte_range.range_for_length(artifact.length)
+            if bounds is None:
+                headers["Content-Range"] = "bytes */{}".format(artifact.length)
+                return flask.Response(status=416, headers=headers)
+            start, stop = bounds
+            headers["Content-Range"] = "bytes {}-{}/{}".format(
+                start, stop - 1, artifact.length
+            )
+            headers["Content-Length"] = str(stop - start)
+            return flask.Response(
+                _read(gzip.open(path, "rb"), start, stop),
+                status=206,
+                headers=headers,
+                mimetype=artifact.content_type,
+            )
+
+        if "gzip" in request.accept_encodings:
+            headers["Content-Encoding"] = "gzip"
+            headers["Content-Length"] = str(os.path.getsize(path))
+            return flask.Response(
+                _read(open(path, "rb"), 0, None),
+                headers=headers,
+                mimetype=artifact.content_type,
+            )
+        headers["Content-Length"] = str(artifact.length)
+        return flask.Response(
+            _read(gzip.open(path, "rb"), 0, None),
+            headers=headers,
+            mimetype=artifact.content_type,
+        )
+
+
+def _read(fd, start, stop):
+    """Yield the bytes of a file from ``start`` up to ``stop``, then close it."""
+    with fd:
+        fd.seek(start)
+        remaining = None if stop is None else stop - start
+        while remaining is None or remaining > 0:
+            size = BLOCK_SIZE if remaining is None else min(BLOCK_SIZE, remaining)
+            block = fd.read(size)
+            if not block:
+                break
+            if remaining is not None:
+                remaining -= len(block)
+            yield block
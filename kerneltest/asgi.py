@@ -0,0 +1,291 @@
+# Licensed under the terms of the GNU GPL License version 2
+"""
+An asynchronous server for the read API.
+
+The Flask application handles one request per thread, so a handful of
+processes only serve a handful of dashboards at once, and each results feed
+client holds a thread for as long as it's connected. This module serves the
+read-only endpoints, ``/api/v1/results/``, ``/api/v1/results/feed``,
+``/api/v1/tests/<name>/history`` and ``/api/v1/latency/``, as an ASGI
+application instead, querying the database through SQLAlchemy's asyncio
+support so one process can serve thousands of connections.
+
+The endpoints share their argument parsing, queries and responses with the
+Flask application; the queries are run with :meth:`AsyncSession.run_sync`.
+Everything else, uploads included, is still served by the Flask application,
+so a proxy in front of both sends the read endpoints' GET requests here. Run
+it with any ASGI server, for example::
+
+    uvicorn --factory kerneltest.asgi:create
+
+This needs the ``async`` extra: SQLAlchemy 1.4 or newer and an asyncio
+database driver, such as asyncpg for PostgreSQL. The database URL is taken
+from ``ASYNC_DB_URL``, or worked out from ``DB_URL`` for asyncpg and aiosqlite.
+"""
+import asyncio
+import re
+
+from werkzeug.exceptions import HTTPException, MethodNotAllowed, NotFound
+
+try:
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+except ImportError:  # SQLAlchemy 1.3
+    AsyncSession = create_async_engine = None
+
+from . import api, app, archive, db, feed, representation
+
+
+#: The asyncio drivers used for each database unless ``ASYNC_DB_URL`` is set.
+DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+
+def async_url(url):
+    """
+    Get the URL of a database for its asyncio driver.
+
+    Args:
+        url (str): The database's URL, for example ``postgresql://host/db``.
+
+    Returns:
+        str: The URL with the driver in :data:`DRIVERS`, for example
+        ``postgresql+asyncpg://host/db``.
+    """
+    scheme, separator, rest = url.partition("://")
+    dialect = scheme.split("+")[0]
+    if dialect not in DRIVERS:
+        return url
+    return "{}+{}{}{}".format(dialect, DRIVERS[dialect], separator, rest)
+
+
+def create(config=None):
+    """
+    Create the ASGI application.
+
+    Args:
+        config (dict): The configuration to use; it's loaded like the Flask
+            application's by default.
+
+    Returns:
+        ReadAPI: The application.
+    """
+    if create_async_engine is None:
+        raise RuntimeError("The asynchronous read API needs SQLAlchemy 1.4 or newer")
+    flask_app = app.create(config)
+    engine = create_async_engine(
+        flask_app.config["ASYNC_DB_URL"] or async_url(flask_app.config["DB_URL"]),
+        echo=flask_app.config["SQL_DEBUG"],
+    )
+    return ReadAPI(flask_app, engine)
+
+
+class ReadAPI(object):
+    """
+    An ASGI application serving the read API.
+
+    Args:
+        flask_app (flask.Flask): The Flask application, for its configuration,
+            argument parsing and results feed.
+        engine (sqlalchemy.ext.asyncio.AsyncEngine): The database engine.
+    """
+
+    def __init__(self, flask_app, engine):
+        self.flask_app = flask_app
+        self.engine = engine
+        self.routes = [
+            (re.compile(r"^/api/v1/results/$"), api.results_parser, self.results),
+            (re.compile(r"^/api/v1/results/feed$"), api.feed_parser, self.feed),
+            (
+                re.compile(r"^/api/v1/tests/(?P<name>.+)/history$"),
+                api.history_parser,
+                self.history,
+            ),
+            (re.compile(r"^/api/v1/latency/$"), api.latency_parser, self.latency),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        path = scope["path"]
+        root_path = scope.get("root_path", "")
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path) :]
+        for pattern, parser, handler in self.routes:
+            match = pattern.match(path)
+            if match:
+                break
+        else:
+            await _respond(send, {"message": NotFound.description}, 404)
+            return
+        if scope["method"] not in ("GET", "HEAD"):
+            await _respond(
+                send,
+                {"message": MethodNotAllowed.description},
+                405,
+                [(b"allow", b"GET, HEAD")],
+            )
+            return
+        if scope["method"] == "HEAD":
+            send = _without_body(send)
+        args, error = self._parse(scope, parser)
+        if error:
+            await _respond(send, *error)
+            return
+        await handler(scope, receive, send, args, **match.groupdict())
+
+    async def results(self, scope, receive, send, args):
+        """Serve :meth:`kerneltest.api.Results.get`."""
+        archive_dir = self.flask_app.config["ARCHIVE_DIR"]
+        if args.fedora_version in archive.Archive(archive_dir).versions():
+            # Reading the archive file would hold up every other request
+            body = await self._in_thread(api.results_body, args, archive_dir)
+        else:
+            body = await self._query(api.results_body, args, archive_dir)
+        await _respond(send, body, 200)
+
+    async def history(self, scope, receive, send, args, name):
+        """Serve :meth:`kerneltest.api.TestHistory.get`."""
+        await _respond(send, await self._query(api.history_body, name, args), 200)
+
+    async def latency(self, scope, receive, send, args):
+        """Serve :meth:`kerneltest.api.Latency.get`."""
+        await _respond(send, await self._query(api.latency_body, args), 200)
+
+    async def feed(self, scope, receive, send, args):
+        """Serve :meth:`kerneltest.api.ResultsFeed.get` until the client leaves."""
+        config = self.flask_app.config
+        results_feed = self.flask_app.extensions["results_feed"]
+        filters = api.feed_filters(args)
+        # Anything finalized while catching up is sent from the feed
+        sequence = results_feed.sequence
+        backlog, complete = await self._query(
+            feed.backlog, api.feed_since(args), filters
+        )
+        headers = [(b"content-type", b"text/event-stream; charset=utf-8")]
+        headers += [
+            (name.lower().encode("latin-1"), value.encode("latin-1"))
+            for name, value in feed.HEADERS.items()
+        ]
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        if scope["method"] == "HEAD":
+            await send({"type": "http.response.body", "body": b""})
+            return
+        stream = feed.astream(
+            results_feed,
+            sequence,
+            backlog,
+            filters,
+            keepalive=config["FEED_KEEPALIVE"],
+            # Have clients that are far behind reconnect straight away
+            duration=config["FEED_MAX_DURATION"] if complete else 0,
+        )
+        streaming = asyncio.ensure_future(_stream(send, stream))
+        disconnected = asyncio.ensure_future(_disconnected(receive))
+        await asyncio.wait(
+            [streaming, disconnected], return_when=asyncio.FIRST_COMPLETED
+        )
+        for task in (streaming, disconnected):
+            task.cancel()
+        await asyncio.gather(streaming, disconnected, return_exceptions=True)
+        if not streaming.cancelled() and streaming.exception() is not None:
+            raise streaming.exception()
+
+    def _parse(self, scope, parser):
+        """
+        Parse a request's arguments with the Flask API's parser.
+
+        Returns:
+            tuple: The arguments and ``None``, or ``None`` and an error
+            response's body and status.
+        """
+        headers = [
+            (name.decode("latin-1"), value.decode("latin-1"))
+            for name, value in scope["headers"]
+        ]
+        with self.flask_app.test_request_context(
+            scope["path"],
+            query_string=scope["query_string"].decode("latin-1"),
+            headers=headers,
+        ):
+            try:
+                return parser().parse_args(), None
+            except HTTPException as e:
+                return None, (
+                    getattr(e, "data", None) or {"message": e.description},
+                    e.code,
+                )
+
+    async def _query(self, function, *args):
+        """Call a function that queries the database with a session."""
+        async with AsyncSession(self.engine, query_cls=db.meta.BaseQuery) as session:
+            return await session.run_sync(function, *args)
+
+    async def _in_thread(self, function, *args):
+        """Call a function that queries the database in another thread."""
+
+        def call():
+            try:
+                return function(db.Session(), *args)
+            finally:
+                db.Session.remove()
+
+        return await asyncio.get_event_loop().run_in_executor(None, call)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.engine.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+async def _respond(send, body, status, headers=()):
+    """Send a JSON response, like the API's representation."""
+    data = representation.dumps(body)
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(data)).encode("latin-1")),
+            ]
+            + list(headers),
+        }
+    )
+    await send({"type": "http.response.body", "body": data})
+
+
+def _without_body(send):
+    """Wrap an ASGI send function to leave out the body, for HEAD requests."""
+
+    async def send_headers(message):
+        if message["type"] == "http.response.body":
+            message = dict(message, body=b"")
+        await send(message)
+
+    return send_headers
+
+
+async def _stream(send, stream):
+    """Send each chunk of a stream as it's produced, then end the response."""
+    async for chunk in stream:
+        await send(
+            {
+                "type": "http.response.body",
+                "body": chunk.encode("utf-8"),
+                "more_body": True,
+            }
+        )
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def _disconnected(receive):
+    """Wait for the client to go away."""
+    while (await receive())["type"] != "http.disconnect":
+        pass
@@ -0,0 +1,152 @@
+# Licensed under the terms of the GNU GPL License version 2
+"""
+A cache of rendered pages.
+
+Pages are cached under keys that include whatever they're rendered from that
+can change, such as the state of a test run, so a cached page is never stale;
+pages that are out of date are just never asked for again, and are evicted.
+Keys are cheap to work out from indexed columns, so a repeat view costs one
+small query rather than loading and rendering the results.
+
+Pages are kept in memory, least recently used first out, up to
+``RENDER_CACHE_SIZE`` bytes in each process. If ``RENDER_CACHE_DIR`` is set,
+they're also kept there, where they're shared between processes and survive
+restarts, up to ``RENDER_CACHE_DIR_SIZE`` bytes.
+"""
+import collections
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+
+_log = logging.getLogger(__name__)
+
+
+class RenderCache(object):
+    """
+    A least-recently-used cache of rendered pages, bounded by size.
+
+    Args:
+        max_size (int): The most bytes of pages to keep in memory.
+        directory (str): A directory to keep pages in as well, or ``None``.
+        max_dir_size (int): The most bytes of pages to keep in the directory.
+    """
+
+    def __init__(self, max_size, directory=None, max_dir_size=None):
+        self.max_size = max_size
+        self.directory = directory
+        self.max_dir_size = max_dir_size
+        self._pages = collections.OrderedDict()
+        self._size = 0
+        self._dir_size = None
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Get a cached page.
+
+        Args:
+            key (tuple): The page's key.
+
+        Returns:
+            str: The page, or ``None`` if it isn't cached.
+        """
+        digest = _digest(key)
+        with self._lock:
+            cached = self._pages.get(digest)
+            if cached is not None:
+                self._pages.move_to_end(digest)
+                return cached[0]
+        if self.directory is None:
+            return None
+        path = self._path(digest)
+        try:
+            with open(path, encoding="utf-8") as fd:
+                page = fd.read()
+            # Pruning removes the least recently modified files first
+            os.utime(path)
+        except (OSError, UnicodeDecodeError):
+            return None
+        self._remember(digest, page)
+        return page
+
+    def set(self, key, page):
+        """
+        Cache a page.
+
+        Args:
+            key (tuple): The page's key.
+            page (str): The rendered page.
+        """
+        digest = _digest(key)
+        self._remember(digest, page)
+        if self.directory is not None:
+            try:
+                self._store(digest, page)
+            except OSError as e:
+                _log.warning("Failed to cache a page in %s: %r", self.directory, e)
+
+    def _remember(self, digest, page):
+        """Keep a page in memory, evicting the least recently used pages."""
+        size = len(page.encode("utf-8"))
+        if size > self.max_size:
+            return
+        with self._lock:
+            previous = self._pages.pop(digest, None)
+            if previous is not None:
+                self._size -= previous[1]
+            self._pages[digest] = (page, size)
+            self._size += size
+            while self._size > self.max_size:
+                __, (__, evicted) = self._pages.popitem(last=False)
+                self._size -= evicted
+
+    def _path(self, digest):
+        return os.path.join(self.directory, digest + ".html")
+
+    def _store(self, digest, page):
+        """Keep a page on disk, evicting the oldest pages if it's full."""
+        os.makedirs(self.directory, exist_ok=True)
+        data = page.encode("utf-8")
+        fd, path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as tmp:
+            tmp.write(data)
+        os.replace(path, self._path(digest))
+        with self._lock:
+            if self._dir_size is None:
+                self._dir_size = sum(size for __, __, size in self._files())
+            else:
+                self._dir_size += len(data)
+            if self._dir_size > self.max_dir_size:
+                self._prune()
+
+    def _files(self):
+        """List the cached files as ``(modified, path, size)`` tuples."""
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, path, stat.st_size))
+        return files
+
+    def _prune(self):
+        """Remove the least recently used files until the directory is 90% full."""
+        files = sorted(self._files())
+        self._dir_size = sum(size for __, __, size in files)
+        for __, path, size in files:
+            if self._dir_size <= self.max_dir_size * 0.9:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            self._dir_size -= size
+
+
+def _digest(key):
+    return hashlib.sha256(repr(key).encode("utf-8")).hexdigest()
@@ -0,0 +1,304 @@
+# Licensed under the terms of the GNU GPL License version 2
+"""
+WSGI middleware that compresses request and response bodies.
+
+Request bodies sent with ``Content-Encoding: gzip`` (or ``zstd``, if the
+optional ``zstandard`` package is installed) are decompressed before Flask sees
+them. Decompression happens incrementally and stops as soon as the output
+passes ``MAX_DECOMPRESSED_LENGTH``, so a small "decompression bomb" can't
+exhaust the server's memory.
+
+Responses are compressed with a streaming encoder when the client's
+``Accept-Encoding`` allows it and the body is a compressible type, so large
+pages of results are never held in memory twice.
+"""
+import io
+import json
+import logging
+import zlib
+
+from werkzeug.wsgi import ClosingIterator
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+
+_log = logging.getLogger(__name__)
+
+#: The size of the blocks request bodies are read in.
+BLOCK_SIZE = 64 * 1024
+
+#: The media types worth compressing; everything else is passed through as-is.
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
+
+
+#: The exceptions decompressors raise for invalid input.
+_DECOMPRESSION_ERRORS = (zlib.error,)
+if zstandard is not None:
+    _DECOMPRESSION_ERRORS += (zstandard.ZstdError,)
+
+
+def _gunzip(stream, limit):
+    # 32 + MAX_WBITS accepts both gzip and zlib headers
+    decompressor = zlib.decompressobj(32 + zlib.MAX_WBITS)
+    body = io.BytesIO()
+    while True:
+        block = stream.read(BLOCK_SIZE)
+        if not block:
+            break
+        # Never expand more than one byte past the limit, however well the
+        # input compresses; whatever isn't decompressed yet is kept unconsumed
+        while block and not decompressor.eof:
+            body.write(decompressor.decompress(block, limit + 1 - body.tell()))
+            if body.tell() > limit:
+                raise BodyTooLarge()
+            block = decompressor.unconsumed_tail
+    if not decompressor.eof:
+        raise ValueError("the compressed body is truncated")
+    return body.getvalue()
+
+
+def _gzip_compressor(level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress, compressor.flush
+
+
+def _unzstd(stream, limit):
+    reader = zstandard.ZstdDecompressor().stream_reader(stream, read_size=BLOCK_SIZE)
+    body = io.BytesIO()
+    while True:
+        block = reader.read(limit + 1 - body.tell())
+        if not block:
+            return body.getvalue()
+        body.write(block)
+        if body.tell() > limit:
+            raise BodyTooLarge()
+
+
+def _zstd_compressor(level):
+    compressor = zstandard.ZstdCompressor(level=level).compressobj()
+    return compressor.compress, compressor.flush
+
+
+def encodings():
+    """
+    The content encodings that can be used, most preferred first.
+
+    Returns:
+        list: Tuples of the encoding's name, a function that decompresses a
+        stream up to a limit, and a function that makes a compressor at a
+        given level.
+    """
+    available = []
+    if zstandard is not None:
+        available.append(("zstd", _unzstd, _zstd_compressor))
+    available.append(("gzip", _gunzip, _gzip_compressor))
+    return available
+
+
+class BodyTooLarge(Exception):
+    """Raised when a request body decompresses to more than the limit."""
+
+
+def decompress(stream, decompressor, limit):
+    """
+    Decompress a request body, refusing to produce more than ``limit`` bytes.
+
+    The output is bounded at every step rather than checked after each block
+    of input, since a single block can expand to many times the limit.
+
+    Args:
+        stream (file): The compressed body.
+        decompressor (callable): Decompresses a stream for the encoding, up to
+            one byte past a limit, raising :class:`BodyTooLarge` past it.
+        limit (int): The most bytes the body may decompress to.
+
+    Returns:
+        bytes: The decompressed body.
+
+    Raises:
+        BodyTooLarge: If the body decompresses to more than ``limit`` bytes.
+        ValueError: If the body isn't valid for its encoding.
+    """
+    try:
+        return decompressor(stream, limit)
+    except _DECOMPRESSION_ERRORS as e:
+        raise ValueError(str(e))
+
+
+def _compressible(headers, min_size):
+    """Whether a response with the given headers should be compressed."""
+    content_type = ""
+    for name, value in headers:
+        name = name.lower()
+        if name == "content-encoding":
+            return False
+        if name == "content-length" and int(value) < min_size:
+            return False
+        if name == "content-type":
+            content_type = value.lower()
+    # Compressors hold on to small writes, which would delay streamed events
+    if content_type.startswith("text/event-stream"):
+        return False
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def _vary(headers):
+    """Add Accept-Encoding to the response's Vary header."""
+    vary = [value for name, value in headers if name.lower() == "vary"]
+    headers = [(name, value) for name, value in headers if name.lower() != "vary"]
+    headers.append(("Vary", ", ".join(vary + ["Accept-Encoding"])))
+    return headers
+
+
+def _accepted(accept_encoding, names):
+    """Pick the first of ``names`` the Accept-Encoding header allows."""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, __, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip()] = quality
+    for name in names:
+        if accepted.get(name, accepted.get("*", 0.0)) > 0:
+            return name
+    return None
+
+
+class CompressionMiddleware(object):
+    """
+    Decompress request bodies and compress response bodies.
+
+    Args:
+        app (callable): The WSGI application to wrap.
+        config (dict): The application's configuration; the
+            ``MAX_DECOMPRESSED_LENGTH``, ``COMPRESSION_MIN_SIZE`` and
+            ``COMPRESSION_LEVEL`` keys are used.
+    """
+
+    def __init__(self, app, config):
+        self.app = app
+        self.config = config
+        self.encodings = {name: (d, c) for name, d, c in encodings()}
+        self.preference = [name for name, __, __ in encodings()]
+
+    def __call__(self, environ, start_response):
+        encoding = environ.get("HTTP_CONTENT_ENCODING", "").strip().lower()
+        if encoding and encoding != "identity":
+            error = self._decompress_request(environ, encoding)
+            if error is not None:
+                status, message = error
+                start_response(
+                    status,
+                    [
+                        ("Content-Type", "application/json"),
+                        ("Accept-Encoding", ", ".join(self.preference)),
+                    ],
+                )
+                return [json.dumps({"error": message}).encode("utf-8")]
+
+        response_encoding = _accepted(
+            environ.get("HTTP_ACCEPT_ENCODING", ""), self.preference
+        )
+        if response_encoding is None:
+            return self.app(environ, start_response)
+
+        compressor = []
+
+        def compressing_start_response(status, headers, exc_info=None):
+            if not status.startswith(("204", "206", "304")) and _compressible(
+                headers, self.config["COMPRESSION_MIN_SIZE"]
+            ):
+                headers = [
+                    (name, value)
+                    for name, value in headers
+                    if name.lower() != "content-length"
+                ]
+                headers.append(("Content-Encoding", response_encoding))
+                compressor.append(
+                    self.encodings[response_encoding][1](
+                        self.config["COMPRESSION_LEVEL"]
+                    )
+                )
+            return start_response(status, _vary(headers), exc_info)
+
+        body = self.app(environ, compressing_start_response)
+        if not compressor:
+            return body
+        return self._compress(body, *compressor[0])
+
+    def _decompress_request(self, environ, encoding):
+        """
+        Replace the request body with its decompressed contents.
+
+        Returns:
+            tuple: The HTTP status and error message if the body can't be
+            decompressed, or ``None`` if it was.
+        """
+        if encoding not in self.encodings:
+            return "415 UNSUPPORTED MEDIA TYPE", "unsupported Content-Encoding"
+        try:
+            length = int(environ.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            length = 0
+        limit = self.config["MAX_DECOMPRESSED_LENGTH"]
+        if length > limit:
+            return "413 REQUEST ENTITY TOO LARGE", "the request body is too large"
+        stream = _LimitedStream(environ["wsgi.input"], length)
+        try:
+            body = decompress(stream, self.encodings[encoding][0], limit)
+        except BodyTooLarge:
+            _log.warning(
+                "Rejected a %s request body that decompresses past %d bytes",
+                encoding,
+                limit,
+            )
+            return "413 REQUEST ENTITY TOO LARGE", "the request body is too large"
+        except ValueError:
+            return "400 BAD REQUEST", "the request body could not be decompressed"
+        environ["wsgi.input"] = io.BytesIO(body)
+        environ["CONTENT_LENGTH"] = str(len(body))
+        environ["kerneltest.decompressed"] = True
+        del environ["HTTP_CONTENT_ENCODING"]
+        return None
+
+    def _compress(self, body, compress, flush):
+        """Compress a response body as it's iterated over."""
+
+        def compressed():
+            for block in body:
+                block = compress(block)
+                if block:
+                    yield block
+            yield flush()
+
+        return ClosingIterator(compressed(), getattr(body, "close", None))
+
+
+class _LimitedStream(object):
+    """Read at most ``length`` bytes from a WSGI input stream."""
+
+    def __init__(self, stream, length):
+        self.stream = stream
+        self.remaining = length
+
+    def read(self, size):
+        size = min(size, self.remaining)
+        if size <= 0:
+            return b""
+        block = self.stream.read(size)
+        self.remaining -= len(block)
+        return block
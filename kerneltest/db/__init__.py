@@ -14,4 +14,4 @@ from .meta import (  # noqa: F401
     DEFAULT_PAGE_SIZE,
     MAX_PAGE_SIZE,
 )
-from .models import Release, TestRun, Test  # noqa: F401
+from .models import Release, TestRun, Test, Job, Artifact, Ingest  # noqa: F401
@@ -63,7 +63,8 @@ def initialize(config):
             "connect",
             lambda db_con, con_record: db_con.execute("PRAGMA foreign_keys=ON"),
         )
-    Session.configure(bind=engine)
+    # Every query can be paginated, not just those made with ``Model.query``
+    Session.configure(bind=engine, query_cls=BaseQuery)
     return engine
 
 
@@ -0,0 +1,40 @@
+"""Add indexes for filtering test runs by their tests
+
+Revision ID: 0b5f3e7a9c12
+Revises: e2a8b6c4d0f9
+Create Date: 2026-10-19 21:05:44.730162
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0b5f3e7a9c12"
+down_revision = "e2a8b6c4d0f9"
+
+
+def upgrade():
+    """ Upgrade """
+    op.create_index(
+        "ix_test_name_outcome",
+        "test",
+        ["name", "passed", "waived", "run_id"],
+        unique=False,
+    )
+    failures = sa.and_(
+        sa.column("passed") == sa.false(), sa.column("waived") == sa.false()
+    )
+    op.create_index(
+        "ix_test_failures",
+        "test",
+        ["run_id", "name"],
+        unique=False,
+        postgresql_where=failures,
+        sqlite_where=failures,
+    )
+
+
+def downgrade():
+    """ Downgrade """
+    op.drop_index("ix_test_failures", table_name="test")
+    op.drop_index("ix_test_name_outcome", table_name="test")
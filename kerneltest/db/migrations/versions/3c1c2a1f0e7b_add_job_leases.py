@@ -0,0 +1,38 @@
+"""Add job leases for test workers
+
+Revision ID: 3c1c2a1f0e7b
+Revises: f9d989d66a45
+Create Date: 2026-10-19 11:02:17.845213
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "3c1c2a1f0e7b"
+down_revision = "f9d989d66a45"
+
+
+def upgrade():
+    """ Upgrade """
+    with op.batch_alter_table("job") as batch_op:
+        batch_op.alter_column(
+            "domain", existing_type=sa.String(length=128), nullable=True
+        )
+        batch_op.add_column(sa.Column("worker", sa.String(length=256), nullable=True))
+        batch_op.add_column(sa.Column("lease_expires", sa.DateTime(), nullable=True))
+        batch_op.create_index(
+            batch_op.f("ix_job_lease_expires"), ["lease_expires"], unique=False
+        )
+
+
+def downgrade():
+    """ Downgrade """
+    op.execute("DELETE FROM job WHERE domain IS NULL")
+    with op.batch_alter_table("job") as batch_op:
+        batch_op.drop_index(batch_op.f("ix_job_lease_expires"))
+        batch_op.drop_column("lease_expires")
+        batch_op.drop_column("worker")
+        batch_op.alter_column(
+            "domain", existing_type=sa.String(length=128), nullable=False
+        )
@@ -0,0 +1,34 @@
+"""Add the state of test runs for incremental uploads
+
+Revision ID: 51f7e2b9c0d3
+Revises: 8e0b7d5a2c94
+Create Date: 2026-10-19 17:41:52.907311
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "51f7e2b9c0d3"
+down_revision = "8e0b7d5a2c94"
+
+
+def upgrade():
+    """ Upgrade """
+    state = sa.Enum("open", "finalized", name="test_run_state")
+    state.create(op.get_bind(), checkfirst=True)
+    op.add_column(
+        "test_run",
+        sa.Column("state", state, nullable=False, server_default="finalized"),
+    )
+    op.add_column("test_run", sa.Column("updated", sa.DateTime(), nullable=True))
+    op.create_index(op.f("ix_test_run_state"), "test_run", ["state"], unique=False)
+
+
+def downgrade():
+    """ Downgrade """
+    op.drop_index(op.f("ix_test_run_state"), table_name="test_run")
+    with op.batch_alter_table("test_run") as batch_op:
+        batch_op.drop_column("updated")
+        batch_op.drop_column("state")
+    sa.Enum(name="test_run_state").drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,149 @@
+"""Partition test runs and tests by release
+
+This is optional and only applies to PostgreSQL 12 or newer. It's skipped
+unless it's asked for with::
+
+    $ alembic -x partition=true upgrade head
+
+The test_run and test tables are rebuilt as tables partitioned by
+fedora_version, with a partition for each release and a default partition for
+anything else. New releases get their partitions when they're added.
+
+Unique indexes on partitioned tables must include the partition key, so the
+primary keys become unique (id, fedora_version) constraints and the
+deduplication keys of test runs are unique per release. The foreign keys from
+the job, artifact and ingest tables to test runs and tests are dropped, since
+they can't include the release.
+
+Revision ID: 5e9b2d7f4c31
+Revises: 9c3e5a1b7d64
+Create Date: 2026-10-19 22:14:51.093584
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "5e9b2d7f4c31"
+down_revision = "9c3e5a1b7d64"
+
+TABLES = ("test_run", "test")
+
+
+def upgrade():
+    """ Upgrade """
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql" or _partitioned(bind):
+        return
+    if context.get_x_argument(as_dictionary=True).get("partition") != "true":
+        return
+
+    _drop_foreign_keys(bind)
+    versions = [version for version, in bind.execute("SELECT version FROM release")]
+    for table in TABLES:
+        indexes = _indexes(bind, table)
+        op.execute("ALTER TABLE {0} RENAME TO {0}_unpartitioned".format(table))
+        op.execute(
+            "CREATE TABLE {0} (LIKE {0}_unpartitioned INCLUDING DEFAULTS "
+            "INCLUDING CONSTRAINTS) PARTITION BY LIST (fedora_version)".format(table)
+        )
+        for version in versions:
+            op.execute(
+                "CREATE TABLE {0}_f{1} PARTITION OF {0} FOR VALUES IN ({1})".format(
+                    table, version
+                )
+            )
+        op.execute("CREATE TABLE {0}_default PARTITION OF {0} DEFAULT".format(table))
+        _move(table, "{}_unpartitioned".format(table))
+        op.execute(
+            "ALTER TABLE {0} ADD CONSTRAINT {0}_id_fedora_version_key "
+            "UNIQUE (id, fedora_version)".format(table)
+        )
+        for index in indexes:
+            if index.startswith("CREATE UNIQUE INDEX"):
+                index = index[: -len(")")] + ", fedora_version)"
+            op.execute(index)
+
+    op.create_foreign_key(None, "test_run", "release", ["fedora_version"], ["version"])
+    op.create_foreign_key(
+        None, "test", "test_run", ["run_id", "fedora_version"], ["id", "fedora_version"]
+    )
+
+
+def downgrade():
+    """ Downgrade """
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql" or not _partitioned(bind):
+        return
+
+    _drop_foreign_keys(bind)
+    for table in TABLES:
+        indexes = _indexes(bind, table)
+        op.execute("ALTER TABLE {0} RENAME TO {0}_partitioned".format(table))
+        op.execute(
+            "CREATE TABLE {0} (LIKE {0}_partitioned INCLUDING DEFAULTS "
+            "INCLUDING CONSTRAINTS)".format(table)
+        )
+        _move(table, "{}_partitioned".format(table))
+        op.create_primary_key("{}_pkey".format(table), table, ["id"])
+        for index in indexes:
+            index = index.replace(" ON ONLY ", " ON ")
+            if index.startswith("CREATE UNIQUE INDEX"):
+                index = index.replace(", fedora_version)", ")")
+            op.execute(index)
+
+    op.create_foreign_key(None, "test_run", "release", ["fedora_version"], ["version"])
+    op.create_foreign_key(None, "test", "test_run", ["run_id"], ["id"])
+    op.create_foreign_key(None, "job", "test_run", ["test_run_id"], ["id"])
+    op.create_foreign_key(None, "artifact", "test_run", ["run_id"], ["id"])
+    op.create_foreign_key(None, "artifact", "test", ["test_id"], ["id"])
+    op.create_foreign_key(None, "ingest", "test_run", ["test_run_id"], ["id"])
+
+
+def _partitioned(bind):
+    """Whether the test_run table is partitioned."""
+    return (
+        bind.execute(
+            "SELECT count(*) FROM pg_partitioned_table "
+            "WHERE partrelid = to_regclass('test_run')"
+        ).scalar()
+        > 0
+    )
+
+
+def _drop_foreign_keys(bind):
+    """Drop the foreign keys from and to the test_run and test tables."""
+    keys = bind.execute(
+        sa.text(
+            "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+            "WHERE contype = 'f' AND conparentid = 0 AND ("
+            "confrelid IN ('test_run'::regclass, 'test'::regclass) OR "
+            "conrelid IN ('test_run'::regclass, 'test'::regclass))"
+        )
+    ).fetchall()
+    for table, name in keys:
+        op.drop_constraint(name, table, type_="foreignkey")
+
+
+def _indexes(bind, table):
+    """The definitions of a table's indexes, other than its constraints'."""
+    return [
+        index
+        for index, in bind.execute(
+            sa.text(
+                "SELECT indexdef FROM pg_indexes "
+                "WHERE schemaname = current_schema() AND tablename = :table "
+                "AND indexname NOT IN (SELECT conname FROM pg_constraint "
+                "WHERE conrelid = CAST(:table AS regclass))"
+            ),
+            table=table,
+        )
+    ]
+
+
+def _move(table, old_table):
+    """Copy the rows of a table into its replacement and drop it."""
+    op.execute("INSERT INTO {} SELECT * FROM {}".format(table, old_table))
+    op.execute("ALTER SEQUENCE {}_id_seq OWNED BY NONE".format(table))
+    op.execute("DROP TABLE {}".format(old_table))
+    op.execute("ALTER SEQUENCE {0}_id_seq OWNED BY {0}.id".format(table))
@@ -0,0 +1,41 @@
+"""Add idempotency keys and content hashes to test runs
+
+Revision ID: 6d2e9b4f1a87
+Revises: a4c3e8d1f6b2
+Create Date: 2026-10-19 19:02:37.518204
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "6d2e9b4f1a87"
+down_revision = "a4c3e8d1f6b2"
+
+
+def upgrade():
+    """ Upgrade """
+    op.add_column(
+        "test_run", sa.Column("idempotency_key", sa.String(length=64), nullable=True)
+    )
+    op.add_column(
+        "test_run", sa.Column("content_hash", sa.String(length=64), nullable=True)
+    )
+    op.create_index(
+        op.f("ix_test_run_idempotency_key"),
+        "test_run",
+        ["idempotency_key"],
+        unique=True,
+    )
+    op.create_index(
+        op.f("ix_test_run_content_hash"), "test_run", ["content_hash"], unique=True
+    )
+
+
+def downgrade():
+    """ Downgrade """
+    op.drop_index(op.f("ix_test_run_content_hash"), table_name="test_run")
+    op.drop_index(op.f("ix_test_run_idempotency_key"), table_name="test_run")
+    with op.batch_alter_table("test_run") as batch_op:
+        batch_op.drop_column("content_hash")
+        batch_op.drop_column("idempotency_key")
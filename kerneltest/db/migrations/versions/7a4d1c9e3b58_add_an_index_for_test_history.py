@@ -0,0 +1,27 @@
+"""Add an index for the history of tests' outcomes
+
+Revision ID: 7a4d1c9e3b58
+Revises: 0b5f3e7a9c12
+Create Date: 2026-10-19 21:32:18.264903
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "7a4d1c9e3b58"
+down_revision = "0b5f3e7a9c12"
+
+
+def upgrade():
+    """ Upgrade """
+    op.create_index(
+        "ix_test_run_history",
+        "test_run",
+        ["id", "fedora_version", "arch", "created"],
+        unique=False,
+    )
+
+
+def downgrade():
+    """ Downgrade """
+    op.drop_index("ix_test_run_history", table_name="test_run")
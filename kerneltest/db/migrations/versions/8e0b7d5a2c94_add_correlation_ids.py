@@ -0,0 +1,43 @@
+"""Add correlation IDs and test timestamps
+
+Revision ID: 8e0b7d5a2c94
+Revises: 3c1c2a1f0e7b
+Create Date: 2026-10-19 13:27:05.112640
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "8e0b7d5a2c94"
+down_revision = "3c1c2a1f0e7b"
+
+
+def upgrade():
+    """ Upgrade """
+    op.add_column(
+        "test_run", sa.Column("correlation_id", sa.String(length=64), nullable=True)
+    )
+    op.add_column("test_run", sa.Column("tests_started", sa.DateTime(), nullable=True))
+    op.add_column("test_run", sa.Column("tests_finished", sa.DateTime(), nullable=True))
+    op.create_index(
+        op.f("ix_test_run_correlation_id"), "test_run", ["correlation_id"], unique=False
+    )
+    op.add_column(
+        "job", sa.Column("correlation_id", sa.String(length=64), nullable=True)
+    )
+    op.create_index(
+        op.f("ix_job_correlation_id"), "job", ["correlation_id"], unique=False
+    )
+
+
+def downgrade():
+    """ Downgrade """
+    op.drop_index(op.f("ix_job_correlation_id"), table_name="job")
+    with op.batch_alter_table("job") as batch_op:
+        batch_op.drop_column("correlation_id")
+    op.drop_index(op.f("ix_test_run_correlation_id"), table_name="test_run")
+    with op.batch_alter_table("test_run") as batch_op:
+        batch_op.drop_column("tests_finished")
+        batch_op.drop_column("tests_started")
+        batch_op.drop_column("correlation_id")
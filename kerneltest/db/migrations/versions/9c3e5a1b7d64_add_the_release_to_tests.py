@@ -0,0 +1,27 @@
+"""Add the release to tests
+
+Revision ID: 9c3e5a1b7d64
+Revises: 7a4d1c9e3b58
+Create Date: 2026-10-19 21:58:03.417265
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "9c3e5a1b7d64"
+down_revision = "7a4d1c9e3b58"
+
+
+def upgrade():
+    """ Upgrade """
+    op.add_column("test", sa.Column("fedora_version", sa.Integer(), nullable=True))
+    op.execute(
+        "UPDATE test SET fedora_version = "
+        "(SELECT test_run.fedora_version FROM test_run WHERE test_run.id = test.run_id)"
+    )
+
+
+def downgrade():
+    """ Downgrade """
+    op.drop_column("test", "fedora_version")
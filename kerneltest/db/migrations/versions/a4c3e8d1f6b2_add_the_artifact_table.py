@@ -0,0 +1,51 @@
+"""Add the artifact table
+
+Revision ID: a4c3e8d1f6b2
+Revises: 51f7e2b9c0d3
+Create Date: 2026-10-19 18:20:36.571904
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "a4c3e8d1f6b2"
+down_revision = "51f7e2b9c0d3"
+
+
+def upgrade():
+    """ Upgrade """
+    op.create_table(
+        "artifact",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(length=256), nullable=False),
+        sa.Column("content_type", sa.String(length=128), nullable=False),
+        sa.Column("length", sa.BigInteger(), nullable=False),
+        sa.Column("received", sa.BigInteger(), nullable=False),
+        sa.Column(
+            "state",
+            sa.Enum("uploading", "complete", name="artifact_state"),
+            nullable=False,
+        ),
+        sa.Column("sha256", sa.String(length=64), nullable=True),
+        sa.Column("created", sa.DateTime(), nullable=False),
+        sa.Column("run_id", sa.Integer(), nullable=False),
+        sa.Column("test_id", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["run_id"], ["test_run.id"]),
+        sa.ForeignKeyConstraint(["test_id"], ["test.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_artifact_run_id"), "artifact", ["run_id"], unique=False)
+    op.create_index(op.f("ix_artifact_sha256"), "artifact", ["sha256"], unique=False)
+    op.create_index(
+        op.f("ix_artifact_test_id"), "artifact", ["test_id"], unique=False
+    )
+
+
+def downgrade():
+    """ Downgrade """
+    op.drop_index(op.f("ix_artifact_test_id"), table_name="artifact")
+    op.drop_index(op.f("ix_artifact_sha256"), table_name="artifact")
+    op.drop_index(op.f("ix_artifact_run_id"), table_name="artifact")
+    op.drop_table("artifact")
+    sa.Enum(name="artifact_state").drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,52 @@
+"""Add the ingest table for asynchronous uploads
+
+Revision ID: c7f1d3a95e20
+Revises: 6d2e9b4f1a87
+Create Date: 2026-10-19 19:48:12.093517
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c7f1d3a95e20"
+down_revision = "6d2e9b4f1a87"
+
+
+def upgrade():
+    """ Upgrade """
+    op.create_table(
+        "ingest",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("received", sa.DateTime(), nullable=False),
+        sa.Column("user", sa.String(length=256), nullable=True),
+        sa.Column("payload", sa.Text(), nullable=True),
+        sa.Column("idempotency_key", sa.String(length=64), nullable=True),
+        sa.Column("content_hash", sa.String(length=64), nullable=True),
+        sa.Column(
+            "state",
+            sa.Enum("queued", "stored", "duplicate", "failed", name="ingest_state"),
+            nullable=False,
+        ),
+        sa.Column("processed", sa.DateTime(), nullable=True),
+        sa.Column("test_run_id", sa.Integer(), nullable=True),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.ForeignKeyConstraint(["test_run_id"], ["test_run.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_ingest_content_hash"), "ingest", ["content_hash"], unique=False
+    )
+    op.create_index(
+        op.f("ix_ingest_idempotency_key"), "ingest", ["idempotency_key"], unique=False
+    )
+    op.create_index(op.f("ix_ingest_state"), "ingest", ["state"], unique=False)
+
+
+def downgrade():
+    """ Downgrade """
+    op.drop_index(op.f("ix_ingest_state"), table_name="ingest")
+    op.drop_index(op.f("ix_ingest_idempotency_key"), table_name="ingest")
+    op.drop_index(op.f("ix_ingest_content_hash"), table_name="ingest")
+    op.drop_table("ingest")
+    sa.Enum(name="ingest_state").drop(op.get_bind(), checkfirst=True)
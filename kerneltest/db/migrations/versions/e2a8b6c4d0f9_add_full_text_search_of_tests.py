@@ -0,0 +1,59 @@
+"""Add a full-text index over test names and details
+
+Revision ID: e2a8b6c4d0f9
+Revises: c7f1d3a95e20
+Create Date: 2026-10-19 20:31:05.264918
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "e2a8b6c4d0f9"
+down_revision = "c7f1d3a95e20"
+
+
+def upgrade():
+    """ Upgrade """
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        op.execute(
+            "CREATE INDEX ix_test_search ON test USING gin "
+            "(to_tsvector('simple', coalesce(name, '') || ' ' || "
+            "coalesce(details, '')))"
+        )
+    elif dialect == "sqlite":
+        op.execute(
+            "CREATE VIRTUAL TABLE test_fts USING fts5(name, details, content='test', "
+            "content_rowid='id', tokenize=\"unicode61 tokenchars '_'\")"
+        )
+        op.execute(
+            "CREATE TRIGGER test_fts_insert AFTER INSERT ON test BEGIN "
+            "INSERT INTO test_fts(rowid, name, details) "
+            "VALUES (new.id, new.name, new.details); END"
+        )
+        op.execute(
+            "CREATE TRIGGER test_fts_delete AFTER DELETE ON test BEGIN "
+            "INSERT INTO test_fts(test_fts, rowid, name, details) "
+            "VALUES ('delete', old.id, old.name, old.details); END"
+        )
+        op.execute(
+            "CREATE TRIGGER test_fts_update AFTER UPDATE ON test BEGIN "
+            "INSERT INTO test_fts(test_fts, rowid, name, details) "
+            "VALUES ('delete', old.id, old.name, old.details); "
+            "INSERT INTO test_fts(rowid, name, details) "
+            "VALUES (new.id, new.name, new.details); END"
+        )
+        # Index the tests that are already stored
+        op.execute("INSERT INTO test_fts(test_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    """ Downgrade """
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        op.execute("DROP INDEX ix_test_search")
+    elif dialect == "sqlite":
+        op.execute("DROP TRIGGER test_fts_update")
+        op.execute("DROP TRIGGER test_fts_delete")
+        op.execute("DROP TRIGGER test_fts_insert")
+        op.execute("DROP TABLE test_fts")
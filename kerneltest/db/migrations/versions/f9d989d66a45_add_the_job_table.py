@@ -0,0 +1,58 @@
+"""Add the job table
+
+Revision ID: f9d989d66a45
+Revises: None
+Create Date: 2026-10-19 09:12:41.337118
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "f9d989d66a45"
+down_revision = None
+
+
+def upgrade():
+    """ Upgrade """
+    op.create_table(
+        "job",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("build", sa.String(length=256), nullable=False),
+        sa.Column("release", sa.String(length=64), nullable=False),
+        sa.Column("domain", sa.String(length=128), nullable=False),
+        sa.Column("arch", sa.String(length=64), nullable=False),
+        sa.Column(
+            "state",
+            sa.Enum(
+                "queued",
+                "started",
+                "finished",
+                "uploaded",
+                "superseded",
+                "cancelled",
+                "failed",
+                name="job_state",
+            ),
+            nullable=False,
+        ),
+        sa.Column("queued", sa.DateTime(), nullable=False),
+        sa.Column("started", sa.DateTime(), nullable=True),
+        sa.Column("finished", sa.DateTime(), nullable=True),
+        sa.Column("uploaded", sa.DateTime(), nullable=True),
+        sa.Column("test_run_id", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["test_run_id"], ["test_run.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_job_build"), "job", ["build"], unique=False)
+    op.create_index(op.f("ix_job_domain"), "job", ["domain"], unique=False)
+    op.create_index(op.f("ix_job_state"), "job", ["state"], unique=False)
+
+
+def downgrade():
+    """ Downgrade """
+    op.drop_index(op.f("ix_job_state"), table_name="job")
+    op.drop_index(op.f("ix_job_domain"), table_name="job")
+    op.drop_index(op.f("ix_job_build"), table_name="job")
+    op.drop_table("job")
+    sa.Enum(name="job_state").drop(op.get_bind(), checkfirst=True)
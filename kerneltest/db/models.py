@@ -20,6 +20,9 @@ class Test(Base):
             tests that don't reliably pass.
         details (str): A free-form text field containing test details.
         run (TestRun): The test run this test is a part of.
+        fedora_version (int): The release of the test run, copied from it
+            when the test is added so the table can be partitioned by release.
+        artifacts (list of Artifact): The files uploaded for this test.
     """
 
     __tablename__ = "test"
@@ -30,6 +33,66 @@ class Test(Base):
     details = Column(Text)
     run = orm.relationship("TestRun", back_populates="tests")
     run_id = Column(Integer, ForeignKey("test_run.id"))
+    fedora_version = Column(Integer, nullable=True)
+    artifacts = orm.relationship("Artifact", back_populates="test")
+
+
+def _copy_release(mapper, connection, test):
+    """Copy the release of a test's run to the test as it's inserted."""
+    if test.fedora_version is None and test.run is not None:
+        test.fedora_version = test.run.fedora_version
+
+
+sa.event.listen(Test, "before_insert", _copy_release)
+
+
+# Filtering runs by the tests in them selects test.run_id by name and outcome,
+# which these answer without reading the test table; see
+# kerneltest.results.runs_with_tests.
+sa.Index("ix_test_name_outcome", Test.name, Test.passed, Test.waived, Test.run_id)
+sa.Index(
+    "ix_test_failures",
+    Test.run_id,
+    Test.name,
+    postgresql_where=sa.and_(Test.passed == sa.false(), Test.waived == sa.false()),
+    sqlite_where=sa.and_(Test.passed == sa.false(), Test.waived == sa.false()),
+)
+
+
+# The full-text index over test names and details; see kerneltest.search.
+# SQLite keeps it in an FTS5 table that triggers update as tests change, and
+# PostgreSQL in a GIN expression index.
+for statement in (
+    "CREATE VIRTUAL TABLE test_fts USING fts5(name, details, content='test', "
+    "content_rowid='id', tokenize=\"unicode61 tokenchars '_'\")",
+    "CREATE TRIGGER test_fts_insert AFTER INSERT ON test BEGIN "
+    "INSERT INTO test_fts(rowid, name, details) "
+    "VALUES (new.id, new.name, new.details); END",
+    "CREATE TRIGGER test_fts_delete AFTER DELETE ON test BEGIN "
+    "INSERT INTO test_fts(test_fts, rowid, name, details) "
+    "VALUES ('delete', old.id, old.name, old.details); END",
+    "CREATE TRIGGER test_fts_update AFTER UPDATE ON test BEGIN "
+    "INSERT INTO test_fts(test_fts, rowid, name, details) "
+    "VALUES ('delete', old.id, old.name, old.details); "
+    "INSERT INTO test_fts(rowid, name, details) "
+    "VALUES (new.id, new.name, new.details); END",
+):
+    sa.event.listen(
+        Test.__table__, "after_create", sa.DDL(statement).execute_if(dialect="sqlite")
+    )
+sa.event.listen(
+    Test.__table__,
+    "before_drop",
+    sa.DDL("DROP TABLE IF EXISTS test_fts").execute_if(dialect="sqlite"),
+)
+sa.event.listen(
+    Test.__table__,
+    "after_create",
+    sa.DDL(
+        "CREATE INDEX ix_test_search ON test USING gin "
+        "(to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(details, '')))"
+    ).execute_if(dialect="postgresql"),
+)
 
 
 class TestRun(Base):
@@ -47,6 +110,20 @@ class TestRun(Base):
             "ppc64le", or "aarch64".
         user (str): The user who ran the tests. If null, the results were uploaded
             anonymously.
+        correlation_id (str): The ID of the Koji message that started the test
+            harness job these results belong to, if any.
+        tests_started (datetime.datetime): When the guest started running the
+            tests, if it said.
+        tests_finished (datetime.datetime): When the guest finished running the
+            tests, if it said.
+        state (sa.Enum): "open" while tests are still being appended to the run,
+            "finalized" once they're all in.
+        updated (datetime.datetime): When tests were last appended to an open run.
+        artifacts (list of Artifact): The files uploaded for this test run.
+        idempotency_key (str): A hash of the uploader and the Idempotency-Key
+            header they sent, so retried uploads aren't stored twice.
+        content_hash (str): A hash of the uploader and the complete upload, so
+            uploads retried without an Idempotency-Key aren't stored twice.
     """
 
     __tablename__ = "test_run"
@@ -60,6 +137,19 @@ class TestRun(Base):
     tests = orm.relationship("Test", back_populates="run")
     release = sa.orm.relationship("Release", back_populates="tests")
     fedora_version = Column(Integer, ForeignKey("release.version"))
+    correlation_id = Column(String(64), nullable=True, index=True)
+    tests_started = Column(DateTime, nullable=True)
+    tests_finished = Column(DateTime, nullable=True)
+    state = Column(
+        sa.Enum("open", "finalized", name="test_run_state"),
+        nullable=False,
+        default="finalized",
+        index=True,
+    )
+    updated = Column(DateTime, nullable=True)
+    artifacts = orm.relationship("Artifact", back_populates="run")
+    idempotency_key = Column(String(64), nullable=True, index=True, unique=True)
+    content_hash = Column(String(64), nullable=True, index=True, unique=True)
 
     @property
     def package_name(self):
@@ -77,6 +167,18 @@ class TestRun(Base):
             return "FAIL"
 
 
+# A test's history counts its outcomes per release, architecture and day of
+# the runs it's in, which this lets PostgreSQL answer with an index-only scan
+# rather than reading the test_run table; see kerneltest.history.
+sa.Index(
+    "ix_test_run_history",
+    TestRun.id,
+    TestRun.fedora_version,
+    TestRun.arch,
+    TestRun.created,
+)
+
+
 class ReleaseQuery(BaseQuery):
     def rawhide(self):
         """
@@ -124,6 +226,227 @@ class Release(Base):
     tests = sa.orm.relationship("TestRun", back_populates="release")
 
 
+# The test_run and test tables can be partitioned by release in PostgreSQL; see
+# the 5e9b2d7f4c31 migration. Each release then has a partition of each, and
+# runs and tests for releases without one go to the default partitions.
+_PARTITIONED_TABLES = ("test_run", "test")
+
+
+def _partitioned(session):
+    """Whether the test_run and test tables are partitioned by release."""
+    if session.get_bind().dialect.name != "postgresql":
+        return False
+    return (
+        session.execute(
+            sa.text(
+                "SELECT count(*) FROM pg_partitioned_table "
+                "WHERE partrelid = to_regclass('test_run')"
+            )
+        ).scalar()
+        > 0
+    )
+
+
+def create_partitions(session, version):
+    """
+    Create the partitions for a release's test runs and tests, if the tables
+    are partitioned by release.
+
+    Args:
+        session (sqlalchemy.orm.Session): The session to use; it is not committed.
+        version (int): The release's Fedora version.
+
+    Returns:
+        bool: Whether the tables are partitioned.
+    """
+    if not _partitioned(session):
+        return False
+    for table in _PARTITIONED_TABLES:
+        session.execute(
+            sa.text(
+                "CREATE TABLE IF NOT EXISTS {0}_f{1} PARTITION OF {0} "
+                "FOR VALUES IN ({1})".format(table, int(version))
+            )
+        )
+    return True
+
+
+def drop_partitions(session, version):
+    """
+    Detach and drop the partitions for a release's test runs and tests, if the
+    tables are partitioned by release, which deletes them all at once.
+
+    Args:
+        session (sqlalchemy.orm.Session): The session to use; it is not committed.
+        version (int): The release's Fedora version.
+
+    Returns:
+        bool: Whether the tables are partitioned.
+    """
+    if not _partitioned(session):
+        return False
+    # Tests reference test runs, so their partition goes first
+    for table in reversed(_PARTITIONED_TABLES):
+        partition = "{}_f{}".format(table, int(version))
+        exists = session.execute(
+            sa.text("SELECT to_regclass(:partition)"), {"partition": partition}
+        ).scalar()
+        if exists is not None:
+            session.execute(
+                sa.text("ALTER TABLE {} DETACH PARTITION {}".format(table, partition))
+            )
+            session.execute(sa.text("DROP TABLE {}".format(partition)))
+    return True
+
+
+class Job(Base):
+    """
+    Represents a request for the test harness to test a build on a guest.
+
+    Attributes:
+        id (int): The primary key.
+        build (str): The name-version-release of the Koji build to test. For
+            example, "kernel-5.1.3-300.fc30".
+        release (str): The name of the release the guest belongs to. For example,
+            "Fedora30" or "Rawhide".
+        domain (str): The name of the libvirt domain that runs the tests, or
+            ``None`` for jobs that test workers lease through the API.
+        arch (str): The architecture the tests run on.
+        state (sa.Enum): The state of the job; "queued" until the guest boots,
+            "started" while it runs the tests, "finished" once it shuts off and
+            "uploaded" once its results arrive. Jobs that never run are either
+            "superseded" by a newer build, "cancelled" part way through, or
+            "failed".
+        queued (datetime.datetime): When the harness received the build.
+        started (datetime.datetime): When the guest was booted.
+        finished (datetime.datetime): When the job reached its final state on
+            the guest.
+        uploaded (datetime.datetime): When the results were uploaded.
+        test_run (TestRun): The test run the results were uploaded as.
+        worker (str): The test worker holding the lease on the job, if any.
+        lease_expires (datetime.datetime): When the worker's lease runs out
+            unless it sends a heartbeat.
+        correlation_id (str): The ID of the Koji message that announced the
+            build, used to match the job to the results the guest uploads.
+    """
+
+    __tablename__ = "job"
+
+    id = Column(Integer, primary_key=True)
+    build = Column(String(256), nullable=False, index=True)
+    release = Column(String(64), nullable=False)
+    domain = Column(String(128), nullable=True, index=True)
+    arch = Column(String(64), nullable=False)
+    state = Column(
+        sa.Enum(
+            "queued",
+            "started",
+            "finished",
+            "uploaded",
+            "superseded",
+            "cancelled",
+            "failed",
+            name="job_state",
+        ),
+        nullable=False,
+        default="queued",
+        index=True,
+    )
+    queued = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    started = Column(DateTime, nullable=True)
+    finished = Column(DateTime, nullable=True)
+    uploaded = Column(DateTime, nullable=True)
+    test_run_id = Column(Integer, ForeignKey("test_run.id"), nullable=True)
+    test_run = orm.relationship("TestRun")
+    worker = Column(String(256), nullable=True)
+    lease_expires = Column(DateTime, nullable=True, index=True)
+    correlation_id = Column(String(64), nullable=True, index=True)
+
+
+class Artifact(Base):
+    """
+    Represents a file, such as a kernel log, uploaded for a test run or test.
+
+    The contents are kept on disk rather than in the database; see
+    :mod:`kerneltest.artifacts`.
+
+    Attributes:
+        id (int): The primary key.
+        name (str): The file's name. For example, "dmesg.log".
+        content_type (str): The file's MIME type.
+        length (int): The size of the file in bytes.
+        received (int): How many bytes of the file have been uploaded so far.
+        state (sa.Enum): "uploading" until all ``length`` bytes are received,
+            then "complete".
+        sha256 (str): The SHA-256 of the complete file, which is where its
+            compressed contents are stored.
+        created (datetime.datetime): When the upload was started.
+        run (TestRun): The test run the file belongs to.
+        test (Test): The test within the run the file belongs to, if any.
+    """
+
+    __tablename__ = "artifact"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(256), nullable=False)
+    content_type = Column(String(128), nullable=False, default="text/plain")
+    length = Column(sa.BigInteger, nullable=False)
+    received = Column(sa.BigInteger, nullable=False, default=0)
+    state = Column(
+        sa.Enum("uploading", "complete", name="artifact_state"),
+        nullable=False,
+        default="uploading",
+    )
+    sha256 = Column(String(64), nullable=True, index=True)
+    created = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    run_id = Column(Integer, ForeignKey("test_run.id"), nullable=False, index=True)
+    run = orm.relationship("TestRun", back_populates="artifacts")
+    test_id = Column(Integer, ForeignKey("test.id"), nullable=True, index=True)
+    test = orm.relationship("Test", back_populates="artifacts")
+
+
+class Ingest(Base):
+    """
+    Represents an upload queued by the asynchronous ingest mode, until the
+    ingest writer stores it as a test run; see :mod:`kerneltest.ingest`.
+
+    Attributes:
+        id (int): The primary key.
+        received (datetime.datetime): When the upload was queued.
+        user (str): The uploader, or ``None`` for anonymous uploads.
+        payload (str): The validated test run and its tests as JSON; it is
+            cleared once the upload has been processed.
+        idempotency_key (str): The upload's hashed Idempotency-Key, if any.
+        content_hash (str): The hash of the complete upload.
+        state (sa.Enum): "queued" until the writer processes the upload, then
+            "stored", "duplicate" if an identical run was already stored, or
+            "failed".
+        processed (datetime.datetime): When the writer processed the upload.
+        test_run (TestRun): The test run the upload was stored as, or the run
+            it duplicates.
+        error (str): Why the upload failed, if it did.
+    """
+
+    __tablename__ = "ingest"
+
+    id = Column(Integer, primary_key=True)
+    received = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    user = Column(String(256), nullable=True)
+    payload = Column(Text, nullable=True)
+    idempotency_key = Column(String(64), nullable=True, index=True)
+    content_hash = Column(String(64), nullable=True, index=True)
+    state = Column(
+        sa.Enum("queued", "stored", "duplicate", "failed", name="ingest_state"),
+        nullable=False,
+        default="queued",
+        index=True,
+    )
+    processed = Column(DateTime, nullable=True)
+    test_run_id = Column(Integer, ForeignKey("test_run.id"), nullable=True)
+    test_run = orm.relationship("TestRun")
+    error = Column(Text, nullable=True)
+
+
 def get_stats():
     """ Return a dictionary containing statistics about the data in the
     database.
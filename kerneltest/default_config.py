@@ -16,6 +16,9 @@ DEFAULTS = dict(
     # API key used to authenticate the autotest client, should be private as well
     API_KEY="This is a secret only the cli knows about",
     DB_URL="sqlite:////var/tmp/kernel-test_dev.sqlite",
+    # The database URL the asynchronous read API uses; an empty string uses
+    # DB_URL with the asyncpg or aiosqlite driver
+    ASYNC_DB_URL="",
     SQL_DEBUG=False,
     # FAS group or groups (provided as a list) in which should be the admins
     # of this application
@@ -24,6 +27,102 @@ DEFAULTS = dict(
     ALLOWED_MIMETYPES=["text/plain"],
     # Restrict the size of content uploaded, this is 25Kb
     MAX_CONTENT_LENGTH=1024 * 25,
+    # The largest size, in bytes, a gzip or zstd compressed request body may
+    # decompress to; decompression stops as soon as it passes this
+    MAX_DECOMPRESSED_LENGTH=8 * 1024 * 1024,
+    # Responses smaller than this, in bytes, aren't worth compressing
+    COMPRESSION_MIN_SIZE=1024,
+    # The gzip or zstd compression level for responses; low levels are fast
+    # enough to compress large pages of results on the fly
+    COMPRESSION_LEVEL=3,
+    # How uploads to the results API are stored: "sync" stores them while the
+    # client waits; "async" queues them and responds with HTTP 202 straight
+    # away, and the "ingest-writer" command stores them in batches
+    RESULTS_INGEST="sync",
+    # The most queued uploads the ingest writer stores in one transaction
+    INGEST_BATCH_SIZE=500,
+    # How long, in seconds, the ingest writer waits when the queue is empty
+    INGEST_POLL_INTERVAL=1,
+    # How long, in seconds, each process waits between looking for newly
+    # finalized test runs for the results feed; on PostgreSQL it's woken early
+    FEED_POLL_INTERVAL=2,
+    # The longest, in seconds, the results feed sends nothing for
+    FEED_KEEPALIVE=15,
+    # How long, in seconds, a results feed stream lasts before clients have to
+    # reconnect, which frees up the worker serving it
+    FEED_MAX_DURATION=300,
+    # Whether the Flask application serves the results feed itself. Each
+    # client holds a worker thread for up to FEED_MAX_DURATION seconds, so
+    # only enable this with many more threads than clients; otherwise serve
+    # the feed from the asynchronous application in kerneltest/asgi.py
+    FEED_WSGI=False,
+    # How long, in seconds, a test run can stay open without any tests being
+    # appended to it before it's considered abandoned and deleted
+    TEST_RUN_ABANDON_AFTER=24 * 60 * 60,
+    # The directory uploaded artifacts, such as kernel logs, are stored in
+    ARTIFACT_DIR="/var/lib/kerneltest/artifacts",
+    # The largest artifact, in bytes, that can be uploaded
+    ARTIFACT_MAX_SIZE=1024 * 1024 * 1024,
+    # The largest chunk, in bytes, an artifact can be uploaded in; this is
+    # separate from MAX_CONTENT_LENGTH, which applies to everything else
+    ARTIFACT_MAX_CHUNK=8 * 1024 * 1024,
+    # The directory the "archive-retired-releases" command moves the test runs
+    # of retired releases to
+    ARCHIVE_DIR="/var/lib/kerneltest/archive",
+    # The most memory, in bytes, each process caches rendered result pages in
+    RENDER_CACHE_SIZE=64 * 1024 * 1024,
+    # A directory to also cache rendered result pages in, shared by every
+    # process; an empty string only caches them in memory
+    RENDER_CACHE_DIR="",
+    # The most disk space, in bytes, the rendered pages in RENDER_CACHE_DIR use
+    RENDER_CACHE_DIR_SIZE=1024 * 1024 * 1024,
+    # The directory the "prerender" command and the ingest writer render the
+    # public pages into as static files; an empty string disables them
+    PRERENDER_DIR="",
+    # The URL the pre-rendered pages are served at, used for the links in them
+    PRERENDER_BASE_URL="http://localhost/",
+    # How long, in seconds, a test worker's lease on a job lasts without a
+    # heartbeat before the job goes back in the queue
+    JOB_LEASE_DURATION=10 * 60,
+    # How the test harness dispatches builds: "libvirt" boots its own guests,
+    # "pull" queues jobs for test workers to lease through the API
+    HARNESS_DISPATCH="libvirt",
+    # The architectures the harness queues jobs for in "pull" mode
+    HARNESS_PULL_ARCHES=["x86_64"],
+    # The libvirt URIs of the hosts the test harness launches guests on; an
+    # empty string is the local hypervisor
+    HARNESS_LIBVIRT_URIS=[""],
+    # The maximum number of guest launches the harness runs concurrently
+    HARNESS_MAX_WORKERS=4,
+    # The maximum number of libvirt connections the harness keeps open per host
+    HARNESS_MAX_CONNECTIONS=2,
+    # The maximum number of domains the harness lets run on a host; 0 means no
+    # limit beyond the host's free vCPUs and memory
+    HARNESS_MAX_DOMAINS_PER_HOST=0,
+    # The maximum number of guests the harness boots at once on a host; 0 means
+    # no limit
+    HARNESS_MAX_BOOTING_PER_HOST=2,
+    # How long, in seconds, a guest counts as booting after the harness starts it
+    HARNESS_BOOT_TIME=300,
+    # How long, in seconds, the harness waits before trying again to place a
+    # guest no host had room for
+    HARNESS_PLACEMENT_RETRY=60,
+    # How long, in seconds, the harness waits for a guest to shut off at the end
+    # of its test cycle before forcing it off
+    HARNESS_SHUTOFF_TIMEOUT=4 * 60 * 60,
+    # What the harness does with a guest still testing a build when a newer
+    # build for its release arrives: "finish" lets the test cycle complete,
+    # "cancel" forces the guest off and restarts it on the newer build
+    HARNESS_SUPERSEDED_POLICY="finish",
+    # The directory the harness records each release's latest build in; guests
+    # read it from the shared /data mount
+    HARNESS_LATEST_DIR="/data/latest",
+    # The directory the harness caches each build's RPMs in for guests to
+    # install from over the shared /data mount or HTTP; an empty string makes
+    # every guest download builds from Koji itself
+    HARNESS_RPM_CACHE_DIR="",
+    # The number of builds to keep in the RPM cache before evicting the oldest
+    HARNESS_RPM_CACHE_KEEP=10,
     OIDC_COOKIE_SECURE=True,
     OIDC_CLIENT_SECRETS="/etc/kerneltest/client_secrets.json",
     OIDC_SCOPES=[
@@ -0,0 +1,418 @@
+# Licensed under the terms of the GNU GPL License version 2
+"""
+A live feed of finalized test runs.
+
+Rather than every dashboard polling the results API, each process runs one
+:class:`Feed`, which polls the database for test runs finalized since it last
+looked and hands them to every client of the ``/api/v1/results/feed``
+server-sent events stream. On PostgreSQL, storing or finalizing a test run
+also sends a notification on the :data:`CHANNEL` channel when it's committed,
+which wakes the poller up straight away; on other databases new runs are seen
+within ``FEED_POLL_INTERVAL`` seconds.
+
+Each event's ID is the test run's ID. Clients that reconnect with the
+``Last-Event-ID`` header, as browsers do, first get the runs finalized since
+then with a higher ID; runs opened earlier but finalized while they were
+disconnected are only in the results API.
+"""
+import asyncio
+import collections
+import json
+import logging
+import select
+import threading
+import time
+
+from sqlalchemy import func, orm
+from sqlalchemy.exc import SQLAlchemyError
+
+from . import db
+
+
+_log = logging.getLogger(__name__)
+
+#: The PostgreSQL notification channel new test runs are announced on.
+CHANNEL = "kerneltest_results"
+
+#: The most test runs the poller reads in one query, and the most runs a
+#: reconnecting client is sent before it has to reconnect again for the rest.
+BATCH_SIZE = 500
+
+#: How long, in seconds, a test run ID skipped over by the poller is watched
+#: for. IDs are handed out in order but transactions commit in any order, so a
+#: run can appear after runs with higher IDs; IDs that never appear belong to
+#: rolled back or deleted runs.
+GAP_TIMEOUT = 300
+
+#: The headers of event stream responses; proxies mustn't buffer or cache them.
+HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def notify(session):
+    """
+    Wake up the feeds once the session's transaction commits.
+
+    This does nothing unless the database is PostgreSQL.
+
+    Args:
+        session (sqlalchemy.orm.Session): The session storing a test run.
+    """
+    if session.get_bind().dialect.name == "postgresql":
+        session.execute("NOTIFY {}".format(CHANNEL))
+
+
+def summary(run):
+    """
+    Summarize a test run for the feed.
+
+    Args:
+        run (kerneltest.db.TestRun): The test run, with its tests.
+
+    Returns:
+        dict: The summary, which can be serialized as JSON.
+    """
+    return {
+        "id": run.id,
+        "created": run.created.isoformat(),
+        "arch": run.arch,
+        "kernel_version": run.kernel_version,
+        "build_release": run.build_release,
+        "fedora_version": run.fedora_version,
+        "tests": len(run.tests),
+        "failed": sorted(
+            test.name for test in run.tests if not test.passed and not test.waived
+        ),
+    }
+
+
+def finalized(session, ids):
+    """
+    Summarize the finalized test runs out of a list of IDs.
+
+    Args:
+        session (sqlalchemy.orm.Session): The session to query with.
+        ids (list): The test runs' IDs.
+
+    Returns:
+        list: The runs' summaries, in order of ID.
+    """
+    if not ids:
+        return []
+    runs = (
+        session.query(db.TestRun)
+        .options(orm.selectinload(db.TestRun.tests))
+        .filter(db.TestRun.id.in_(ids), db.TestRun.state == "finalized")
+        .order_by(db.TestRun.id)
+    )
+    return [summary(run) for run in runs]
+
+
+def backlog(session, since, filters):
+    """
+    Summarize the finalized test runs a reconnecting client missed.
+
+    Args:
+        session (sqlalchemy.orm.Session): The session to query with.
+        since (int): The ID of the last run the client was sent, or ``None``
+            if it's not reconnecting.
+        filters (dict): The values the client is filtering summaries on.
+
+    Returns:
+        tuple: The runs' summaries, in order of ID, and whether they are all
+        the runs missed.
+    """
+    if since is None:
+        return [], True
+    ids = [
+        run_id
+        for run_id, in session.query(db.TestRun.id)
+        .filter_by(state="finalized", **filters)
+        .filter(db.TestRun.id > since)
+        .order_by(db.TestRun.id)
+        .limit(BATCH_SIZE + 1)
+    ]
+    return finalized(session, ids[:BATCH_SIZE]), len(ids) <= BATCH_SIZE
+
+
+class Feed(object):
+    """
+    Polls for finalized test runs and passes them on to waiting clients.
+
+    The poller remembers the highest test run ID it has seen, the open test
+    runs below it, and the IDs below it that it hasn't seen yet, which may
+    belong to runs still being committed, so each poll is two indexed queries
+    whatever the number of clients. The most recent runs are kept in memory
+    for clients to catch up on between their waits.
+
+    Args:
+        interval (float): How long, in seconds, to wait between polls.
+        backlog (int): The most recent test runs to keep.
+    """
+
+    def __init__(self, interval, backlog=1000):
+        self.interval = interval
+        self._events = collections.deque(maxlen=backlog)
+        self._sequence = 0
+        self._watermark = None
+        self._pending = set()
+        self._gaps = {}
+        self._condition = threading.Condition()
+        self._listeners = set()
+        self._thread = None
+
+    @property
+    def sequence(self):
+        """The position of the newest event, to wait for events after."""
+        with self._condition:
+            return self._sequence
+
+    def start(self):
+        """Start polling in a background thread, unless it already is."""
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="results-feed", daemon=True
+                )
+                self._thread.start()
+
+    def wait(self, after, timeout):
+        """
+        Wait for test runs to be finalized.
+
+        Args:
+            after (int): The :attr:`sequence` to return the events after.
+            timeout (float): The longest, in seconds, to wait.
+
+        Returns:
+            tuple: A list of the new runs' summaries and the sequence to wait
+            after next.
+        """
+        self.start()
+        with self._condition:
+            if self._sequence == after:
+                self._condition.wait(timeout)
+            new = min(self._sequence - after, len(self._events))
+            events = list(self._events)[len(self._events) - new :]
+            return events, self._sequence
+
+    def subscribe(self, listener):
+        """
+        Have a function called, with no arguments, whenever runs are finalized.
+
+        It's called from the poller's thread, so it must be quick.
+        """
+        with self._condition:
+            self._listeners.add(listener)
+
+    def unsubscribe(self, listener):
+        """Stop calling a function passed to :meth:`subscribe`."""
+        with self._condition:
+            self._listeners.discard(listener)
+
+    def poll(self, session):
+        """
+        Look for test runs finalized since the last poll and pass them on.
+
+        Args:
+            session (sqlalchemy.orm.Session): The session to query with.
+        """
+        now = time.monotonic()
+        if self._watermark is None:
+            self._watermark = session.query(func.max(db.TestRun.id)).scalar() or 0
+            self._pending = {
+                run_id
+                for run_id, in session.query(db.TestRun.id).filter(
+                    db.TestRun.state == "open"
+                )
+            }
+            # Runs with lower IDs may still be being committed
+            recent = {
+                run_id
+                for run_id, in session.query(db.TestRun.id).filter(
+                    db.TestRun.id > self._watermark - BATCH_SIZE
+                )
+            }
+            self._gaps = {
+                run_id: now + GAP_TIMEOUT
+                for run_id in range(
+                    max(1, self._watermark - BATCH_SIZE + 1), self._watermark
+                )
+                if run_id not in recent
+            }
+            return
+        new = (
+            session.query(db.TestRun.id, db.TestRun.state)
+            .filter(db.TestRun.id > self._watermark)
+            .order_by(db.TestRun.id)
+            .limit(BATCH_SIZE)
+            .all()
+        )
+        ready = []
+        waiting = self._pending.union(self._gaps)
+        if waiting:
+            states = dict(
+                session.query(db.TestRun.id, db.TestRun.state).filter(
+                    db.TestRun.id.in_(waiting)
+                )
+            )
+            ready = [i for i in waiting if states.get(i) == "finalized"]
+            self._pending = {i for i in waiting if states.get(i) == "open"}
+            self._gaps = {
+                i: expiry
+                for i, expiry in self._gaps.items()
+                if i not in states and expiry > now
+            }
+        for run_id, state in new:
+            for skipped in range(self._watermark + 1, run_id):
+                self._gaps[skipped] = now + GAP_TIMEOUT
+            if state == "open":
+                self._pending.add(run_id)
+            else:
+                ready.append(run_id)
+            self._watermark = run_id
+        events = finalized(session, ready)
+        if events:
+            with self._condition:
+                self._events.extend(events)
+                self._sequence += len(events)
+                self._condition.notify_all()
+                listeners = list(self._listeners)
+            for listener in listeners:
+                listener()
+
+    def _run(self):
+        """Poll until the process exits, waking early on notifications."""
+        engine = db.Session().get_bind()
+        db.Session.remove()
+        listener = None
+        while True:
+            try:
+                self.poll(db.Session())
+            except SQLAlchemyError as e:
+                _log.error("Failed to poll for finalized test runs: %r", e)
+            finally:
+                db.Session.remove()
+            if engine.dialect.name != "postgresql":
+                time.sleep(self.interval)
+                continue
+            try:
+                if listener is None:
+                    listener = _listen(engine)
+                connection = listener.connection
+                if select.select([connection], [], [], self.interval)[0]:
+                    connection.poll()
+                    del connection.notifies[:]
+            except Exception as e:
+                _log.error("Failed to listen for finalized test runs: %r", e)
+                if listener is not None:
+                    listener.invalidate()
+                listener = None
+                time.sleep(self.interval)
+
+
+def _listen(engine):
+    """Take a PostgreSQL connection out of the pool to listen for notifications."""
+    listener = engine.raw_connection()
+    listener.connection.autocommit = True
+    with listener.connection.cursor() as cursor:
+        cursor.execute("LISTEN {}".format(CHANNEL))
+    return listener
+
+
+def stream(feed, after, backlog=(), filters=None, keepalive=15, duration=300):
+    """
+    Produce a server-sent events stream of finalized test runs.
+
+    Args:
+        feed (Feed): The feed to wait on.
+        after (int): The feed's :attr:`Feed.sequence` to stream the runs after.
+        backlog (list): Summaries of earlier runs to send first.
+        filters (dict): Only send the runs whose summaries have these values.
+        keepalive (float): The longest, in seconds, to send nothing for.
+        duration (float): How long, in seconds, to stream for before ending
+            the stream, which clients reconnect to.
+
+    Yields:
+        str: The events.
+    """
+    # Servers send the headers with the first data, so don't keep clients waiting
+    yield ": connected\n\n"
+    sent = set()
+    for event in backlog:
+        sent.add(event["id"])
+        yield _event(event)
+    deadline = time.monotonic() + duration
+    while True:
+        remaining = deadline - time.monotonic()
+        events, after = feed.wait(after, max(0, min(keepalive, remaining)))
+        yield _events(events, sent, filters)
+        if remaining <= keepalive:
+            return
+
+
+async def astream(feed, after, backlog=(), filters=None, keepalive=15, duration=300):
+    """
+    Produce a server-sent events stream of finalized test runs in asyncio.
+
+    This is :func:`stream` for asynchronous servers, where each client waits
+    without holding a thread.
+
+    Args:
+        feed (Feed): The feed to wait on.
+        after (int): The feed's :attr:`Feed.sequence` to stream the runs after.
+        backlog (list): Summaries of earlier runs to send first.
+        filters (dict): Only send the runs whose summaries have these values.
+        keepalive (float): The longest, in seconds, to send nothing for.
+        duration (float): How long, in seconds, to stream for before ending
+            the stream, which clients reconnect to.
+
+    Yields:
+        str: The events.
+    """
+    loop = asyncio.get_event_loop()
+    changed = asyncio.Event()
+
+    def wake():
+        loop.call_soon_threadsafe(changed.set)
+
+    feed.start()
+    feed.subscribe(wake)
+    try:
+        yield ": connected\n\n"
+        sent = set()
+        for event in backlog:
+            sent.add(event["id"])
+            yield _event(event)
+        deadline = loop.time() + duration
+        while True:
+            remaining = deadline - loop.time()
+            try:
+                await asyncio.wait_for(
+                    changed.wait(), max(0, min(keepalive, remaining))
+                )
+            except asyncio.TimeoutError:
+                pass
+            changed.clear()
+            events, after = feed.wait(after, 0)
+            yield _events(events, sent, filters)
+            if remaining <= keepalive:
+                return
+    finally:
+        feed.unsubscribe(wake)
+
+
+def _events(events, sent, filters):
+    """Format the new events a client wants, or a keepalive comment if none."""
+    events = [
+        event
+        for event in events
+        if event["id"] not in sent
+        and all(event[key] == value for key, value in (filters or {}).items())
+    ]
+    return "".join(_event(event) for event in events) or ": keepalive\n\n"
+
+
+def _event(summary):
+    return "id: {}\nevent: result\ndata: {}\n\n".format(
+        summary["id"], json.dumps(summary)
+    )
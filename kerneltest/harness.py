@@ -1,30 +1,746 @@
 # Licensed under the terms of the GNU GPL License version 2
 
+import contextlib
+import functools
 import logging
-import time
-import _thread
+import os
+import queue
+import subprocess
+import threading
+from concurrent import futures
 
 import libvirt
+from sqlalchemy.exc import SQLAlchemyError
+
+from . import db, jobs, placement, rpmcache
+from .default_config import config
+from .jobs import Build
 
 
 _log = logging.getLogger(__name__)
 
 RAWHIDE = "fc31"
 
+#: The libvirt state code of a domain that has been shut off.
+SHUTOFF = libvirt.VIR_DOMAIN_SHUTOFF
+
+#: The ways the scheduler can treat a test cycle that a newer build supersedes.
+SUPERSEDED_POLICIES = ("finish", "cancel")
+
+
+class ConnectionPool(object):
+    """
+    A bounded pool of libvirt connections to a single hypervisor.
+
+    Connections are opened lazily, up to ``size`` of them, and handed out to
+    one caller at a time. Callers that find the pool exhausted block until a
+    connection is returned.
+
+    Args:
+        uri (str): The libvirt URI to connect to. ``None`` connects to the
+            local hypervisor.
+        size (int): The maximum number of open connections.
+    """
+
+    def __init__(self, uri=None, size=2):
+        self.uri = uri
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    @contextlib.contextmanager
+    def connection(self):
+        """
+        Borrow a connection from the pool.
+
+        Connections that raise a :class:`libvirt.libvirtError` while borrowed
+        are closed rather than returned, so a broken connection to the
+        hypervisor is replaced by a fresh one on the next checkout.
 
-def launchdomain(domain):
-    conn = libvirt.open(None)
-    dom = conn.lookupByName(domain)
-    if "Rawhide" in domain:
-        dom.reboot()
-    else:
+        Yields:
+            libvirt.virConnect: An open connection.
+        """
+        self._slots.acquire()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = libvirt.open(self.uri)
+            broken = False
+            try:
+                yield conn
+            except libvirt.libvirtError:
+                broken = True
+                raise
+            finally:
+                if broken:
+                    conn.close()
+                else:
+                    self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """Close all idle connections."""
         while True:
-            domstate = dom.info()[0]
-            if domstate == 5:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
                 break
-            time.sleep(30)
-        dom.create()
-    _log.info("Domain %s started", domain)
+
+
+_event_loop_lock = threading.Lock()
+_event_loop = None
+
+
+def start_event_loop():
+    """
+    Start libvirt's default event loop implementation in a daemon thread.
+
+    This must be called before opening any connection that registers for
+    domain events. Calling it more than once is harmless.
+    """
+    global _event_loop
+    with _event_loop_lock:
+        if _event_loop is not None:
+            return
+        libvirt.virEventRegisterDefaultImpl()
+
+        def run():
+            while True:
+                libvirt.virEventRunDefaultImpl()
+
+        _event_loop = threading.Thread(target=run, name="libvirt-events", daemon=True)
+        _event_loop.start()
+
+
+class LifecycleMonitor(object):
+    """
+    Call back when libvirt reports that a watched domain has stopped.
+
+    The monitor holds its own connection to the hypervisor and registers for
+    domain lifecycle events on it, so nothing needs to poll a domain while
+    waiting for a guest to finish its test cycle. Each watch has a timeout
+    after which its callback is invoked anyway, which covers guests that hang
+    and events lost to a dropped connection.
+
+    Args:
+        uri (str): The libvirt URI to monitor. ``None`` is the local hypervisor.
+    """
+
+    def __init__(self, uri=None):
+        self.uri = uri
+        self._lock = threading.Lock()
+        self._watches = {}
+        self._listeners = []
+        self._conn = None
+
+    def start(self):
+        """Open the event connection and register for lifecycle events."""
+        start_event_loop()
+        self._conn = libvirt.open(self.uri)
+        self._callback_id = self._conn.domainEventRegisterAny(
+            None, libvirt.VIR_DOMAIN_EVENT_ID_LIFECYCLE, self._on_lifecycle, None
+        )
+
+    def close(self):
+        """Cancel all watches and close the event connection."""
+        with self._lock:
+            watches, self._watches = self._watches, {}
+        for __, timer in watches.values():
+            timer.cancel()
+        if self._conn is not None:
+            self._conn.domainEventDeregisterAny(self._callback_id)
+            self._conn.close()
+            self._conn = None
+
+    def watch(self, domain, callback, timeout):
+        """
+        Invoke ``callback`` once the domain stops or ``timeout`` expires.
+
+        Args:
+            domain (str): The name of the domain to watch.
+            callback (callable): Called with a single boolean argument that is
+                ``True`` if the watch timed out rather than seeing the domain stop.
+            timeout (float): The number of seconds to wait for the domain to stop.
+        """
+        timer = threading.Timer(timeout, self._timed_out, (domain,))
+        timer.daemon = True
+        with self._lock:
+            self._watches[domain] = (callback, timer)
+        timer.start()
+
+    def unwatch(self, domain):
+        """
+        Cancel a watch.
+
+        Returns:
+            bool: ``True`` if the watch was cancelled before its callback ran.
+        """
+        with self._lock:
+            watch = self._watches.pop(domain, None)
+        if watch is None:
+            return False
+        watch[1].cancel()
+        return True
+
+    def add_listener(self, listener):
+        """
+        Call ``listener`` with the name of every domain that stops on the host.
+
+        Args:
+            listener (callable): Called with the domain name from the event loop
+                thread, so it must not block.
+        """
+        self._listeners.append(listener)
+
+    def expire(self, domain):
+        """
+        Invoke a watch's callback now, as if it had timed out.
+
+        Args:
+            domain (str): The name of the watched domain.
+        """
+        self._fire(domain, True)
+
+    def watching(self):
+        """
+        Return the domains currently being watched.
+
+        Returns:
+            set: The names of the watched domains.
+        """
+        with self._lock:
+            return set(self._watches)
+
+    def _on_lifecycle(self, conn, dom, event, detail, opaque):
+        if event == libvirt.VIR_DOMAIN_EVENT_STOPPED:
+            for listener in self._listeners:
+                listener(dom.name())
+            self._fire(dom.name(), False)
+
+    def _fire(self, domain, timed_out):
+        with self._lock:
+            watch = self._watches.pop(domain, None)
+        if watch is None:
+            return
+        callback, timer = watch
+        timer.cancel()
+        callback(timed_out)
+
+    def _timed_out(self, domain):
+        _log.warning("Timed out waiting for domain %s to shut off", domain)
+        self._fire(domain, True)
+
+
+class Scheduler(object):
+    """
+    Run guest launches on a bounded pool of worker threads.
+
+    At most one launch for a given domain is in progress at any time, so a
+    burst of builds cannot have two workers fighting over the same guest. The
+    number of workers, and therefore the number of libvirt connections in use,
+    is bounded regardless of how many messages arrive.
+
+    Each domain has at most one pending build. A build submitted while another
+    is still pending supersedes it, and a launch that is waiting for its guest
+    picks up the newest pending build when the guest finally starts, so guests
+    never boot a kernel that a newer build has already replaced. What happens
+    to a build a guest is already testing depends on ``policy``: with
+    ``"finish"`` the guest completes its test cycle, and with ``"cancel"`` the
+    guest is forced off and restarted on the newer build straight away.
+
+    A guest that is still running its previous test cycle does not hold a
+    worker; the launch is parked with its host's :class:`LifecycleMonitor` and
+    resumed the moment libvirt reports the domain stopped. Guests that have not
+    shut off within ``shutoff_timeout`` seconds are forced off and restarted.
+
+    Guests are booted on whichever host the :class:`~kerneltest.placement.Placer`
+    picks. When no host has room, the launch is deferred and retried as soon
+    as a domain stops on any host, or after ``retry_interval`` seconds.
+
+    Args:
+        placer (kerneltest.placement.Placer): Decides which host guests boot on.
+        max_workers (int): The maximum number of concurrent launches.
+        shutoff_timeout (float): The number of seconds to wait for a guest
+            to shut off before forcing it off.
+        policy (str): Either ``"finish"`` or ``"cancel"``; what to do with a
+            test cycle that a newer build supersedes.
+        retry_interval (float): The number of seconds after which a launch
+            that could not be placed is retried.
+        store (kerneltest.jobs.JobStore): Where to record each job's progress,
+            if anywhere.
+    """
+
+    def __init__(
+        self,
+        placer,
+        max_workers=4,
+        shutoff_timeout=14400,
+        policy="finish",
+        retry_interval=60,
+        store=None,
+    ):
+        if policy not in SUPERSEDED_POLICIES:
+            raise ValueError(
+                "policy must be one of {}, not {!r}".format(SUPERSEDED_POLICIES, policy)
+            )
+        self.placer = placer
+        self.shutoff_timeout = shutoff_timeout
+        self.policy = policy
+        self.retry_interval = retry_interval
+        self.store = store
+        self._executor = futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="harness"
+        )
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._active = set()
+        self._deferred = {}
+        self._testing = {}
+        for host in placer.hosts:
+            host.monitor.add_listener(self._retry_deferred)
+            host.monitor.add_listener(self._stopped)
+
+    def submit(self, domain, build):
+        """
+        Queue a launch of the given domain to test a build.
+
+        Args:
+            domain (str): The name of the libvirt domain to launch.
+            build (Build): The build the guest should test.
+        """
+        with self._lock:
+            known = (self._pending.get(domain), self._testing.get(domain))
+            if build.nvr in (b.nvr for b in known if b is not None):
+                _log.info("Domain %s already has %s, ignoring", domain, build.nvr)
+                return
+            superseded = self._pending.get(domain)
+            self._pending[domain] = build
+            cancel = self.policy == "cancel" and domain in self._testing
+        self._record("queue", domain, build)
+        if superseded:
+            _log.info(
+                "%s supersedes %s on domain %s", build.nvr, superseded.nvr, domain
+            )
+            self._record("transition", domain, superseded, "superseded")
+        if cancel:
+            # A launch may be parked waiting for the guest to finish testing an
+            # older build; stop waiting for it.
+            for host in self.placer.hosts:
+                if domain in host.monitor.watching():
+                    host.monitor.expire(domain)
+        self._next(domain)
+        _log.info("Queued domain %s, queue depth is %d", domain, self.queue_depth())
+
+    def resume(self):
+        """
+        Pick up the jobs recorded in the store before the harness restarted.
+
+        Guests that were testing a build are assumed to still be doing so, and
+        queued builds are submitted again.
+        """
+        unfinished = self.store.unfinished()
+        for domain, build, state in unfinished:
+            if state == "started":
+                with self._lock:
+                    self._testing[domain] = build
+        for domain, build, state in unfinished:
+            if state == "queued":
+                self.submit(domain, build)
+
+    def queue_depth(self):
+        """
+        Return the number of builds waiting for a guest.
+
+        Returns:
+            int: The number of pending builds across all domains.
+        """
+        with self._lock:
+            return len(self._pending)
+
+    def pending_builds(self):
+        """
+        Return the build waiting for each domain.
+
+        Returns:
+            dict: A map of domain names to their pending :class:`Build`.
+        """
+        with self._lock:
+            return dict(self._pending)
+
+    def waiting(self):
+        """
+        Return the domains whose launch is waiting for the guest to shut off.
+
+        Returns:
+            set: The names of the domains.
+        """
+        domains = set()
+        for host in self.placer.hosts:
+            domains |= host.monitor.watching()
+        return domains
+
+    def deferred(self):
+        """
+        Return the domains whose launch is waiting for a host with room.
+
+        Returns:
+            set: The names of the domains.
+        """
+        with self._lock:
+            return set(self._deferred)
+
+    def idle(self):
+        """
+        Return whether the scheduler has no queued or in-progress launches.
+
+        Returns:
+            bool: ``True`` if there is nothing left to do.
+        """
+        with self._lock:
+            return not self._pending and not self._active
+
+    def shutdown(self, wait=True):
+        """Stop accepting work and close all connections to the hosts."""
+        with self._lock:
+            deferred, self._deferred = self._deferred, {}
+        for timer in deferred.values():
+            timer.cancel()
+        for host in self.placer.hosts:
+            host.monitor.close()
+        self._executor.shutdown(wait=wait)
+        for host in self.placer.hosts:
+            host.close()
+
+    def _next(self, domain):
+        """Start a launch for the domain's pending build, if it is not busy."""
+        with self._lock:
+            if domain in self._active or domain not in self._pending:
+                return
+            self._active.add(domain)
+        self._executor.submit(self._launch, domain)
+
+    def _done(self, domain):
+        """Mark the in-progress launch of a domain finished."""
+        with self._lock:
+            self._active.discard(domain)
+        self._next(domain)
+
+    def _resume(self, domain, timed_out):
+        """Resume a launch parked with a monitor."""
+        self._executor.submit(self._launch, domain, timed_out)
+
+    def _defer(self, domain):
+        """Retry the launch of a domain once a host might have room for it."""
+        timer = threading.Timer(self.retry_interval, self._retry, (domain,))
+        timer.daemon = True
+        with self._lock:
+            self._deferred[domain] = timer
+        timer.start()
+
+    def _retry(self, domain):
+        """Resume a deferred launch, unless something already did."""
+        with self._lock:
+            timer = self._deferred.pop(domain, None)
+        if timer is not None:
+            timer.cancel()
+            self._executor.submit(self._launch, domain)
+
+    def _retry_deferred(self, stopped_domain):
+        """Retry every deferred launch now that a domain has stopped."""
+        for domain in self.deferred():
+            self._retry(domain)
+
+    def _record(self, method, domain, build, *args):
+        """Call a method of the job store, if there is one, logging any errors."""
+        if self.store is None:
+            return
+        try:
+            getattr(self.store, method)(domain, build, *args)
+        except SQLAlchemyError:
+            _log.exception("Failed to record job for %s on %s", build.nvr, domain)
+
+    def _stopped(self, domain):
+        """Record that a guest finished testing its build."""
+        with self._lock:
+            build = self._testing.get(domain)
+        if build is not None:
+            self._executor.submit(
+                self._record, "transition", domain, build, "finished", ("started",)
+            )
+
+    def _start(self, host, dom):
+        """Take the newest pending build for a domain and boot the guest on it."""
+        with self._lock:
+            build = self._pending.pop(dom.name())
+            previous = self._testing.get(dom.name())
+            self._testing[dom.name()] = build
+        if previous is not None:
+            # In case the guest stopped while nobody was listening
+            self._record("transition", dom.name(), previous, "finished", ("started",))
+        write_latest(build)
+        if dom.isActive():
+            dom.reboot()
+        else:
+            dom.create()
+        self._record("transition", dom.name(), build, "started")
+        _log.info("Domain %s started on %s to test %s", dom.name(), host, build.nvr)
+
+    def _stop(self, domain, force):
+        """
+        Make sure a domain is shut off on every host.
+
+        Args:
+            domain (str): The name of the domain.
+            force (bool): Whether to force the domain off if it is still running.
+
+        Returns:
+            bool: ``True`` if the domain is now shut off everywhere, ``False``
+                if the launch was parked until it stops or was resumed by
+                another worker.
+        """
+        for host in self.placer.hosts:
+            with host.pool.connection() as conn:
+                dom = host.lookup(conn, domain)
+                if dom is None or not dom.isActive():
+                    continue
+                # Register before checking the state again so a guest that
+                # stops in between is not missed.
+                host.monitor.watch(
+                    domain,
+                    functools.partial(self._resume, domain),
+                    self.shutoff_timeout,
+                )
+                if dom.info()[0] != SHUTOFF:
+                    if not force:
+                        return False
+                    _log.warning("Forcing domain %s off on %s", domain, host)
+                    with self._lock:
+                        testing = self._testing.get(domain)
+                    if testing is not None:
+                        self._record(
+                            "transition",
+                            domain,
+                            testing,
+                            "cancelled" if self.policy == "cancel" else "failed",
+                            ("started",),
+                        )
+                    dom.destroy()
+                if not host.monitor.unwatch(domain):
+                    # The monitor fired concurrently and resumed the launch.
+                    return False
+        return True
+
+    def _launch(self, domain, force=False):
+        """
+        Start a domain, or park the launch until the domain stops.
+
+        Rawhide guests are rebooted in place if they are running; other guests
+        always finish their test cycle, unless ``force`` is set or the policy
+        is to cancel superseded builds.
+
+        Args:
+            domain (str): The name of the domain to launch.
+            force (bool): Whether to force the domain off if it is still running.
+        """
+        force = force or self.policy == "cancel"
+        try:
+            if not ("Rawhide" in domain and self._reboot(domain)):
+                if not self._stop(domain, force):
+                    return
+                if self.placer.start(domain, self._start) is None:
+                    self._defer(domain)
+                    return
+        except Exception:
+            for host in self.placer.hosts:
+                host.monitor.unwatch(domain)
+            _log.exception("Failed to launch domain %s", domain)
+            with self._lock:
+                build = self._pending.pop(domain, None)
+            if build is not None:
+                self._record("transition", domain, build, "failed")
+        self._done(domain)
+
+    def _reboot(self, domain):
+        """
+        Reboot a domain onto the pending build wherever it is running.
+
+        Returns:
+            bool: ``True`` if the domain was running and has been rebooted.
+        """
+        for host in self.placer.hosts:
+            with host.pool.connection() as conn:
+                dom = host.lookup(conn, domain)
+                if dom is not None and dom.isActive():
+                    self._start(host, dom)
+                    return True
+        return False
+
+
+def write_latest(build):
+    """
+    Record the build a release's guests should install.
+
+    Guests read this file from the shared ``/data`` mount when they boot. The
+    build's correlation ID is written next to it, in a file with the
+    ``.correlation_id`` suffix, for the guest to upload with its results.
+
+    Args:
+        build (Build): The build to record.
+    """
+    path = os.path.join(config["HARNESS_LATEST_DIR"], build.release)
+    with open(path, "w") as domfile:
+        domfile.write(build.nvr)
+    id_path = path + ".correlation_id"
+    if build.correlation_id:
+        with open(id_path, "w") as idfile:
+            idfile.write(build.correlation_id)
+    elif os.path.exists(id_path):
+        os.remove(id_path)
+
+
+def latest_builds():
+    """
+    Get the builds the guests of every release have been told to install.
+
+    Returns:
+        set: The builds' name-version-releases.
+    """
+    builds = set()
+    directory = config["HARNESS_LATEST_DIR"]
+    if not os.path.isdir(directory):
+        return builds
+    for name in os.listdir(directory):
+        if name.endswith(".correlation_id"):
+            continue
+        with open(os.path.join(directory, name)) as fd:
+            builds.add(fd.read().strip())
+    return builds
+
+
+def cache_build(build, arches):
+    """
+    Download a build into the RPM cache for its guests, if the cache is enabled.
+
+    Failures are logged rather than raised; guests download builds that
+    aren't cached from Koji themselves.
+
+    Args:
+        build (Build): The build to cache.
+        arches (list): The architectures to cache it for.
+    """
+    cache = get_rpm_cache()
+    if cache is None:
+        return
+    for arch in arches:
+        try:
+            cache.populate(build.nvr, arch)
+        except (OSError, subprocess.CalledProcessError):
+            _log.exception("Failed to cache %s for %s", build.nvr, arch)
+    try:
+        cache.evict()
+    except OSError:
+        _log.exception("Failed to evict old builds from the RPM cache")
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+_rpm_cache = None
+_rpm_cache_lock = threading.Lock()
+_store = None
+_store_lock = threading.Lock()
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_store():
+    """
+    Get the process-wide job store, initializing the database on first use.
+
+    Returns:
+        kerneltest.jobs.JobStore: The job store.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            db.initialize(config)
+            _store = jobs.JobStore()
+        return _store
+
+
+def get_rpm_cache():
+    """
+    Get the process-wide RPM cache, creating it on first use.
+
+    Returns:
+        kerneltest.rpmcache.RPMCache: The cache, or ``None`` if it's disabled.
+    """
+    global _rpm_cache
+    with _rpm_cache_lock:
+        if _rpm_cache is None and config["HARNESS_RPM_CACHE_DIR"]:
+            _rpm_cache = rpmcache.RPMCache(
+                config["HARNESS_RPM_CACHE_DIR"],
+                keep=config["HARNESS_RPM_CACHE_KEEP"],
+                protected=latest_builds,
+            )
+        return _rpm_cache
+
+
+def get_dispatcher():
+    """
+    Get the process-wide executor that caches and queues builds, creating it on
+    first use.
+
+    It has a single thread, so builds are queued in the order they arrive.
+
+    Returns:
+        concurrent.futures.ThreadPoolExecutor: The executor.
+    """
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = futures.ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="dispatch"
+            )
+        return _dispatcher
+
+
+def get_scheduler():
+    """
+    Get the process-wide launch scheduler, creating it on first use.
+
+    Returns:
+        Scheduler: The scheduler configured from the application configuration.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            store = get_store()
+            hosts = []
+            for uri in config["HARNESS_LIBVIRT_URIS"]:
+                # TOML has no null, so an empty string means the local hypervisor
+                uri = uri or None
+                monitor = LifecycleMonitor(uri=uri)
+                monitor.start()
+                pool = ConnectionPool(uri=uri, size=config["HARNESS_MAX_CONNECTIONS"])
+                hosts.append(placement.Host(pool, monitor))
+            placer = placement.Placer(
+                hosts,
+                max_domains=config["HARNESS_MAX_DOMAINS_PER_HOST"],
+                max_booting=config["HARNESS_MAX_BOOTING_PER_HOST"],
+                boot_time=config["HARNESS_BOOT_TIME"],
+            )
+            _scheduler = Scheduler(
+                placer,
+                max_workers=config["HARNESS_MAX_WORKERS"],
+                shutoff_timeout=config["HARNESS_SHUTOFF_TIMEOUT"],
+                policy=config["HARNESS_SUPERSEDED_POLICY"],
+                retry_interval=config["HARNESS_PLACEMENT_RETRY"],
+                store=store,
+            )
+            _scheduler.resume()
+        return _scheduler
 
 
 def callback(message):
@@ -36,7 +752,9 @@ def callback(message):
         $ fedora-messaging consume --callback=kerneltest.harness:callback
 
     This callback is meant to be run on messages from Koji. The topic should be
-    "org.fedoraproject.*.buildsys.build.state.change".
+    "org.fedoraproject.*.buildsys.build.state.change". Downloading the build
+    into the RPM cache can take a while, so the build is cached and queued by
+    :func:`dispatch` in the background rather than in the callback.
 
     Args:
         message (fedora_messaging.api.Message): The AMQP message.
@@ -62,10 +780,35 @@ def callback(message):
     package = "{}-{}-{}".format(
         message.body["name"], message.body["version"], message.body["release"]
     )
-    with open("/data/latest/{}".format(domain.replace("_", "")), "w") as domfile:
-        domfile.write(package)
+    build = Build(package, domain.replace("_", ""), message.id)
 
     _log.info("Testing %s", package)
-    for dom in [domain + "32", domain + "64"]:
-        _log.info("Starting domain %s", dom)
-        _thread.start_new(launchdomain, (dom,))
+    get_dispatcher().submit(dispatch, build, domain)
+
+
+def dispatch(build, domain):
+    """
+    Cache a build and queue it for testing, logging any failure.
+
+    Args:
+        build (Build): The build to test.
+        domain (str): The prefix of the names of the release's domains, like
+            "Fedora30_".
+    """
+    try:
+        if config["HARNESS_DISPATCH"] == "pull":
+            cache_build(build, config["HARNESS_PULL_ARCHES"])
+            store = get_store()
+            for arch in config["HARNESS_PULL_ARCHES"]:
+                _log.info("Queueing %s on %s for test workers", build.nvr, arch)
+                store.queue_pull(build, arch)
+            return
+
+        domains = [domain + "32", domain + "64"]
+        cache_build(build, [jobs.arch(dom) for dom in domains])
+        scheduler = get_scheduler()
+        for dom in domains:
+            _log.info("Starting domain %s", dom)
+            scheduler.submit(dom, build)
+    except Exception:
+        _log.exception("Failed to queue %s for testing", build.nvr)
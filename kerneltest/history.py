@@ -0,0 +1,98 @@
+# Licensed under the terms of the GNU GPL License version 2
+"""
+The history of a test's outcomes, for each release and architecture.
+
+Outcomes are counted by the database, grouped by day or by kernel build, so
+only one row per bucket is ever returned however many times a test has run.
+The ``ix_test_name_outcome`` index on the test table covers the query, so the
+test table itself isn't read, and ``ix_test_run_history`` covers the columns
+used from the test run on PostgreSQL; see :mod:`kerneltest.db.models`. Weeks are rolled up
+from days here rather than in SQL, which keeps the query the same on every
+database.
+"""
+import collections
+import datetime
+
+import sqlalchemy as sa
+
+from . import db
+
+
+#: The ways outcomes can be grouped.
+BUCKETS = ("day", "week", "kernel")
+
+#: The outcomes of a test in one bucket. Waived tests are only counted as
+#: waived, whether they passed or failed.
+Point = collections.namedtuple("Point", ["bucket", "passed", "failed", "waived"])
+
+
+def series(session, name, bucket="day", release=None, arch=None, since=None):
+    """
+    Count a test's outcomes over time for each release and architecture.
+
+    Args:
+        session (sqlalchemy.orm.Session): The session to query with.
+        name (str): The test's name.
+        bucket (str): One of :data:`BUCKETS`. Days and weeks are
+            :class:`datetime.date` buckets, weeks starting on Monday; kernels
+            are "<kernel_version>-<build_release>" strings in the order they
+            were first tested.
+        release (int): Only include test runs for this Fedora version.
+        arch (str): Only include test runs for this architecture.
+        since (datetime.datetime): Only include test runs created after this time.
+
+    Returns:
+        collections.OrderedDict: A map of ``(fedora_version, arch)`` tuples,
+        in order, to lists of :class:`Point`, oldest first.
+    """
+    if bucket not in BUCKETS:
+        raise ValueError("Unknown bucket: {}".format(bucket))
+
+    outcomes = (
+        sa.func.count(sa.case([(sa.and_(db.Test.passed, ~db.Test.waived), 1)])),
+        sa.func.count(sa.case([(sa.and_(~db.Test.passed, ~db.Test.waived), 1)])),
+        sa.func.count(sa.case([(db.Test.waived, 1)])),
+    )
+    if bucket == "kernel":
+        keys = (db.TestRun.kernel_version, db.TestRun.build_release)
+        order = sa.func.min(db.TestRun.created)
+    else:
+        keys = (sa.func.date(db.TestRun.created),)
+        order = keys[0]
+    query = (
+        session.query(db.TestRun.fedora_version, db.TestRun.arch, *(keys + outcomes))
+        .select_from(db.Test)
+        .join(db.TestRun, db.Test.run_id == db.TestRun.id)
+        .filter(db.Test.name == name)
+        .group_by(db.TestRun.fedora_version, db.TestRun.arch, *keys)
+        .order_by(db.TestRun.fedora_version, db.TestRun.arch, order)
+    )
+    if release is not None:
+        query = query.filter(db.TestRun.fedora_version == release)
+    if arch:
+        query = query.filter(db.TestRun.arch == arch)
+    if since is not None:
+        query = query.filter(db.TestRun.created >= since)
+
+    history = collections.OrderedDict()
+    for row in query:
+        points = history.setdefault((row[0], row[1]), [])
+        counts = row[-3:]
+        if bucket == "kernel":
+            points.append(Point("{}-{}".format(row[2], row[3]), *counts))
+            continue
+        day = _date(row[2])
+        if bucket == "week":
+            day -= datetime.timedelta(days=day.weekday())
+            if points and points[-1].bucket == day:
+                previous = points.pop()
+                counts = [a + b for a, b in zip(previous[1:], counts)]
+        points.append(Point(day, *counts))
+    return history
+
+
+def _date(value):
+    """SQLite returns ``date()`` as a string rather than a date."""
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.datetime.strptime(value, "%Y-%m-%d").date()
@@ -0,0 +1,174 @@
+# Licensed under the terms of the GNU GPL License version 2
+"""
+The asynchronous ingest mode for uploaded test results.
+
+When ``RESULTS_INGEST`` is "async", the results API validates an upload,
+queues it in the ``ingest`` table and responds with HTTP 202 and a URL to check
+its status, without writing the test run itself. The ``ingest-writer``
+command then stores queued uploads in large batches with one transaction per
+batch, so uploads stay fast however busy the database is.
+
+Uploads are deduplicated both when they're queued and when they're written, in
+the same way as synchronous uploads; see :mod:`kerneltest.results`.
+"""
+import collections
+import datetime
+import json
+import logging
+
+from sqlalchemy import or_
+from sqlalchemy.exc import SQLAlchemyError
+
+from . import db, results
+
+
+_log = logging.getLogger(__name__)
+
+#: The test run fields carried in a queued upload's payload.
+PAYLOAD_FIELDS = (
+    "kernel_version",
+    "build_release",
+    "arch",
+    "correlation_id",
+    "tests_started",
+    "tests_finished",
+)
+
+
+def enqueue(session, fields, tests):
+    """
+    Queue a validated upload for the ingest writer.
+
+    An upload that is already queued with the same idempotency key or content
+    isn't queued again.
+
+    Args:
+        session (sqlalchemy.orm.Session): The session to use; it is not committed.
+        fields (dict): The new :class:`kerneltest.db.TestRun`'s fields,
+            including its "release", "user", "idempotency_key" and
+            "content_hash".
+        tests (list): The tests, validated by
+            :func:`kerneltest.results.validate_tests`.
+
+    Returns:
+        kerneltest.db.Ingest: The queued upload.
+    """
+    criteria = [db.Ingest.content_hash == fields["content_hash"]]
+    if fields["idempotency_key"]:
+        criteria.append(db.Ingest.idempotency_key == fields["idempotency_key"])
+    queued = (
+        session.query(db.Ingest)
+        .filter(db.Ingest.state == "queued", or_(*criteria))
+        .first()
+    )
+    if queued is not None:
+        return queued
+
+    payload = {}
+    for field in PAYLOAD_FIELDS:
+        value = fields[field]
+        if isinstance(value, datetime.datetime):
+            value = value.isoformat()
+        payload[field] = value
+    payload["fedora_version"] = fields["release"].version
+    payload["tests"] = tests
+    item = db.Ingest(
+        user=fields["user"],
+        payload=json.dumps(payload),
+        idempotency_key=fields["idempotency_key"],
+        content_hash=fields["content_hash"],
+        state="queued",
+    )
+    session.add(item)
+    session.flush()
+    return item
+
+
+def write_batch(session, size):
+    """
+    Store a batch of queued uploads as test runs in a single transaction.
+
+    Each new test run is announced once the batch is committed. Uploads that
+    can't be stored are marked failed without affecting the rest of the batch.
+
+    Args:
+        session (sqlalchemy.orm.Session): The session to use; it is committed.
+        size (int): The most uploads to store.
+
+    Returns:
+        collections.Counter: The number of uploads that were "stored", were a
+        "duplicate", or "failed".
+    """
+    items = (
+        session.query(db.Ingest)
+        .filter(db.Ingest.state == "queued")
+        .order_by(db.Ingest.id)
+        .limit(size)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    counts = collections.Counter()
+    stored = []
+    for item in items:
+        run = _write(session, item)
+        if run is not None:
+            stored.append(run)
+        counts[item.state] += 1
+    results.commit(session, stored)
+    return counts
+
+
+def _write(session, item):
+    """
+    Store a queued upload as a test run.
+
+    Returns:
+        kerneltest.db.TestRun: The new test run, or ``None`` if the upload was
+        a duplicate or failed.
+    """
+    item.processed = datetime.datetime.utcnow()
+    upload = json.loads(item.payload)
+    release = (
+        session.query(db.Release).filter_by(version=upload["fedora_version"]).first()
+    )
+    if release is None:
+        item.state = "failed"
+        item.error = "fedora_version was not found"
+        return None
+
+    fields = dict(
+        kernel_version=upload["kernel_version"],
+        build_release=upload["build_release"],
+        arch=upload["arch"],
+        release=release,
+        user=item.user,
+        correlation_id=upload["correlation_id"],
+        tests_started=parse_time(upload["tests_started"]),
+        tests_finished=parse_time(upload["tests_finished"]),
+        idempotency_key=item.idempotency_key,
+        content_hash=item.content_hash,
+    )
+    try:
+        # The same upload may have been stored synchronously since it was queued
+        run, new = results.store(session, fields, upload["tests"])
+    except SQLAlchemyError as e:
+        _log.error("Failed to store queued upload %d: %r", item.id, e)
+        item.state = "failed"
+        item.error = str(e)
+        return None
+    item.state = "stored" if new else "duplicate"
+    item.test_run = run
+    item.payload = None
+    return run if new else None
+
+
+def parse_time(value):
+    """Parse a timestamp serialized with :meth:`datetime.datetime.isoformat`."""
+    if value is None:
+        return None
+    for fmt in ("%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S"):
+        try:
+            return datetime.datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    raise ValueError("Unknown timestamp format: {}".format(value))
@@ -0,0 +1,476 @@
+# Licensed under the terms of the GNU GPL License version 2
+"""
+Durable records of the work the test harness does.
+
+Every build the harness is asked to test on a guest becomes a
+:class:`kerneltest.db.Job`, which moves through its states as the guest boots,
+runs the tests, shuts off and uploads the results. The table survives restarts
+of the harness, which resumes any job it had not finished, and it records when
+each transition happened.
+
+Jobs that aren't tied to a libvirt domain are handed out to test workers that
+pull them through the API instead. A worker leases the next queued job, sends
+heartbeats to extend the lease while it runs the tests, and completes the job
+once it has uploaded the results. Leases that run out are reclaimed and the job
+goes back in the queue for another worker.
+"""
+import collections
+import contextlib
+import datetime
+import logging
+
+from . import db
+
+
+_log = logging.getLogger(__name__)
+
+#: A kernel build to test. ``nvr`` is the build's name-version-release and
+#: ``release`` is the name of the release its guests belong to, for example
+#: "Fedora30" or "Rawhide". ``correlation_id`` identifies the Koji message that
+#: announced the build; it follows the build to the guests and is uploaded with
+#: the results so the time each stage took can be measured.
+Build = collections.namedtuple("Build", ["nvr", "release", "correlation_id"])
+Build.__new__.__defaults__ = (None,)
+
+#: Map the suffix of a guest's domain name to the architecture it tests.
+ARCHES = {"32": "i686", "64": "x86_64"}
+
+#: How many times to try to lease a job before giving up; another worker can
+#: lease the chosen job between selecting and updating it.
+_LEASE_ATTEMPTS = 5
+
+#: The stages of a job whose latency is tracked, in order, and the names of the
+#: timestamps each one runs between. Job timestamps are recorded by the harness
+#: and test run timestamps are uploaded by the guest with its results.
+STAGES = collections.OrderedDict(
+    [
+        ("queue", ("queued", "started")),
+        ("boot", ("started", "tests_started")),
+        ("test", ("tests_started", "tests_finished")),
+        ("upload", ("tests_finished", "created")),
+    ]
+)
+
+#: The latency percentiles reported for each stage.
+PERCENTILES = (50, 90, 99)
+
+#: The timestamp each state records when a job enters it.
+_TIMESTAMPS = {
+    "started": "started",
+    "finished": "finished",
+    "superseded": "finished",
+    "cancelled": "finished",
+    "failed": "finished",
+    "uploaded": "uploaded",
+}
+
+
+def arch(domain):
+    """
+    Get the architecture a guest tests from its domain name.
+
+    Args:
+        domain (str): The name of the domain, for example "Fedora30_64".
+
+    Returns:
+        str: The architecture, for example "x86_64".
+    """
+    return ARCHES.get(domain[-2:], "unknown")
+
+
+class JobStore(object):
+    """
+    Record the harness's jobs in the database.
+
+    Args:
+        session (sqlalchemy.orm.scoped_session): The session to use; it is
+            committed after every change.
+    """
+
+    def __init__(self, session=db.Session):
+        self.session = session
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        session = self.session()
+        try:
+            yield session
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+
+    def queue(self, domain, build):
+        """
+        Record that a build was queued for a guest.
+
+        Queueing the same build for the same guest twice records a single job.
+
+        Args:
+            domain (str): The name of the guest's domain.
+            build (Build): The build to test.
+        """
+        with self._transaction() as session:
+            queued = (
+                session.query(db.Job.id)
+                .filter_by(domain=domain, build=build.nvr, state="queued")
+                .first()
+            )
+            if queued is None:
+                session.add(
+                    db.Job(
+                        build=build.nvr,
+                        release=build.release,
+                        domain=domain,
+                        arch=arch(domain),
+                        correlation_id=build.correlation_id,
+                    )
+                )
+
+    def queue_pull(self, build, arch):
+        """
+        Record that a build was queued for test workers to lease.
+
+        Any older build for the same release and architecture that no worker
+        has leased yet is superseded.
+
+        Args:
+            build (Build): The build to test.
+            arch (str): The architecture to test it on.
+        """
+        with self._transaction() as session:
+            session.query(db.Job).filter(
+                db.Job.domain.is_(None),
+                db.Job.release == build.release,
+                db.Job.arch == arch,
+                db.Job.state == "queued",
+                db.Job.build != build.nvr,
+            ).update(
+                {"state": "superseded", "finished": datetime.datetime.utcnow()},
+                synchronize_session=False,
+            )
+            queued = (
+                session.query(db.Job.id)
+                .filter(
+                    db.Job.domain.is_(None),
+                    db.Job.build == build.nvr,
+                    db.Job.arch == arch,
+                    db.Job.state.in_(("queued", "started")),
+                )
+                .first()
+            )
+            if queued is None:
+                session.add(
+                    db.Job(
+                        build=build.nvr,
+                        release=build.release,
+                        arch=arch,
+                        correlation_id=build.correlation_id,
+                    )
+                )
+
+    def transition(self, domain, build, state, from_states=("queued",)):
+        """
+        Move the job for a build on a guest to a new state.
+
+        Args:
+            domain (str): The name of the guest's domain.
+            build (Build): The build the job tests.
+            state (str): The new state.
+            from_states (tuple): Only jobs in one of these states are moved.
+
+        Returns:
+            int: The number of jobs moved.
+        """
+        values = {"state": state}
+        if state in _TIMESTAMPS:
+            values[_TIMESTAMPS[state]] = datetime.datetime.utcnow()
+        with self._transaction() as session:
+            return (
+                session.query(db.Job)
+                .filter(
+                    db.Job.domain == domain,
+                    db.Job.build == build.nvr,
+                    db.Job.state.in_(from_states),
+                )
+                .update(values, synchronize_session=False)
+            )
+
+    def unfinished(self):
+        """
+        Get the jobs that were queued or started, oldest first.
+
+        Jobs without a domain were queued for workers to pull, so they're left
+        to the workers.
+
+        Returns:
+            list: ``(domain, Build, state)`` tuples.
+        """
+        with self._transaction() as session:
+            jobs = (
+                session.query(db.Job)
+                .filter(
+                    db.Job.state.in_(("queued", "started")), db.Job.domain.isnot(None)
+                )
+                .order_by(db.Job.id)
+            )
+            return [
+                (
+                    job.domain,
+                    Build(job.build, job.release, job.correlation_id),
+                    job.state,
+                )
+                for job in jobs
+            ]
+
+
+def record_upload(session, test_run):
+    """
+    Mark the harness jobs whose results a test run holds as uploaded.
+
+    Only jobs the harness runs on its own guests are matched; test workers
+    say which job a test run belongs to when they complete it. Test runs that
+    carry a correlation ID only match the jobs started for the same Koji
+    message.
+
+    Args:
+        session (sqlalchemy.orm.Session): The session the test run was added in;
+            it is flushed but not committed.
+        test_run (kerneltest.db.TestRun): The newly uploaded test run.
+
+    Returns:
+        int: The number of jobs marked uploaded.
+    """
+    session.flush()
+    build = "kernel-{}-{}".format(test_run.kernel_version, test_run.build_release)
+    query = session.query(db.Job).filter(
+        db.Job.domain.isnot(None),
+        db.Job.build == build,
+        db.Job.arch == test_run.arch,
+        db.Job.state.in_(("started", "finished")),
+    )
+    if test_run.correlation_id:
+        query = query.filter(db.Job.correlation_id == test_run.correlation_id)
+    return query.update(
+        {
+            "state": "uploaded",
+            "uploaded": datetime.datetime.utcnow(),
+            "test_run_id": test_run.id,
+        },
+        synchronize_session=False,
+    )
+
+
+def reclaim_expired(session):
+    """
+    Put leased jobs whose lease has run out back in the queue.
+
+    Args:
+        session (sqlalchemy.orm.Session): The session to use; it is not committed.
+
+    Returns:
+        int: The number of jobs reclaimed.
+    """
+    reclaimed = (
+        session.query(db.Job)
+        .filter(
+            db.Job.state == "started",
+            db.Job.worker.isnot(None),
+            db.Job.lease_expires < datetime.datetime.utcnow(),
+        )
+        .update(
+            {"state": "queued", "worker": None, "lease_expires": None, "started": None},
+            synchronize_session=False,
+        )
+    )
+    if reclaimed:
+        _log.info("Reclaimed %d jobs with expired leases", reclaimed)
+    return reclaimed
+
+
+def lease(session, worker, duration, arch=None, release=None):
+    """
+    Lease the oldest queued job to a test worker.
+
+    Args:
+        session (sqlalchemy.orm.Session): The session to use; it is not committed.
+        worker (str): A name identifying the worker.
+        duration (int): The number of seconds the lease lasts without a heartbeat.
+        arch (str): Only lease jobs for this architecture.
+        release (str): Only lease jobs for this release, for example "Fedora30".
+
+    Returns:
+        kerneltest.db.Job: The leased job, or ``None`` if no job is queued.
+    """
+    reclaim_expired(session)
+    query = session.query(db.Job.id).filter(
+        db.Job.state == "queued", db.Job.domain.is_(None)
+    )
+    if arch:
+        query = query.filter(db.Job.arch == arch)
+    if release:
+        query = query.filter(db.Job.release == release)
+    for __ in range(_LEASE_ATTEMPTS):
+        candidate = query.order_by(db.Job.id).first()
+        if candidate is None:
+            return None
+        now = datetime.datetime.utcnow()
+        leased = (
+            session.query(db.Job)
+            .filter(db.Job.id == candidate.id, db.Job.state == "queued")
+            .update(
+                {
+                    "state": "started",
+                    "started": now,
+                    "worker": worker,
+                    "lease_expires": now + datetime.timedelta(seconds=duration),
+                },
+                synchronize_session=False,
+            )
+        )
+        if leased:
+            return session.query(db.Job).populate_existing().get(candidate.id)
+    return None
+
+
+def heartbeat(session, job_id, worker, duration):
+    """
+    Extend a worker's lease on a job.
+
+    Args:
+        session (sqlalchemy.orm.Session): The session to use; it is not committed.
+        job_id (int): The job's ID.
+        worker (str): The name of the worker holding the lease.
+        duration (int): The number of seconds from now the lease should last.
+
+    Returns:
+        bool: ``True`` if the lease was extended, ``False`` if the worker does
+            not hold a current lease on the job.
+    """
+    now = datetime.datetime.utcnow()
+    return (
+        session.query(db.Job)
+        .filter(
+            db.Job.id == job_id,
+            db.Job.state == "started",
+            db.Job.worker == worker,
+            db.Job.lease_expires >= now,
+        )
+        .update(
+            {"lease_expires": now + datetime.timedelta(seconds=duration)},
+            synchronize_session=False,
+        )
+        == 1
+    )
+
+
+def complete(session, job_id, worker, test_run):
+    """
+    Complete a leased job with the test run its results were uploaded as.
+
+    Args:
+        session (sqlalchemy.orm.Session): The session to use; it is not committed.
+        job_id (int): The job's ID.
+        worker (str): The name of the worker holding the lease.
+        test_run (kerneltest.db.TestRun): The uploaded test run.
+
+    Returns:
+        bool: ``True`` if the job was completed, ``False`` if the worker does
+            not hold a current lease on the job.
+    """
+    now = datetime.datetime.utcnow()
+    return (
+        session.query(db.Job)
+        .filter(
+            db.Job.id == job_id,
+            db.Job.state == "started",
+            db.Job.worker == worker,
+            db.Job.lease_expires >= now,
+        )
+        .update(
+            {
+                "state": "uploaded",
+                "finished": now,
+                "uploaded": now,
+                "lease_expires": None,
+                "test_run_id": test_run.id,
+            },
+            synchronize_session=False,
+        )
+        == 1
+    )
+
+
+def percentile(values, pct):
+    """
+    Get a percentile of some values using the nearest-rank method.
+
+    Args:
+        values (list): The values, sorted in ascending order.
+        pct (int): The percentile, between 1 and 100.
+
+    Returns:
+        The value at the percentile, or ``None`` if there are no values.
+    """
+    if not values:
+        return None
+    rank = -(-len(values) * pct // 100)
+    return values[max(rank, 1) - 1]
+
+
+def latency(session, since=None, release=None, arch=None):
+    """
+    Work out the latency percentiles of each stage for uploaded jobs.
+
+    Stages whose timestamps are missing, for example because the guest didn't
+    upload when it started and finished the tests, are left out.
+
+    Args:
+        session (sqlalchemy.orm.Session): The session to query with.
+        since (datetime.datetime): Only include jobs queued after this time.
+        release (str): Only include jobs for this release, for example "Fedora30".
+        arch (str): Only include jobs for this architecture.
+
+    Returns:
+        dict: A map of ``(release, arch)`` tuples to a map of stage names to
+            ``(count, {percentile: seconds})`` tuples.
+    """
+    query = (
+        session.query(
+            db.Job.release,
+            db.Job.arch,
+            db.Job.queued,
+            db.Job.started,
+            db.TestRun.tests_started,
+            db.TestRun.tests_finished,
+            db.TestRun.created,
+        )
+        .join(db.TestRun, db.Job.test_run_id == db.TestRun.id)
+        .filter(db.Job.state == "uploaded")
+    )
+    if since is not None:
+        query = query.filter(db.Job.queued >= since)
+    if release:
+        query = query.filter(db.Job.release == release)
+    if arch:
+        query = query.filter(db.Job.arch == arch)
+
+    durations = collections.defaultdict(lambda: {stage: [] for stage in STAGES})
+    for row in query:
+        for stage, (start, end) in STAGES.items():
+            start, end = getattr(row, start), getattr(row, end)
+            if start is not None and end is not None and end >= start:
+                durations[(row.release, row.arch)][stage].append(
+                    (end - start).total_seconds()
+                )
+
+    result = {}
+    for key, stages in durations.items():
+        result[key] = {}
+        for stage, values in stages.items():
+            values.sort()
+            result[key][stage] = (
+                len(values),
+                {pct: percentile(values, pct) for pct in PERCENTILES},
+            )
+    return result
@@ -0,0 +1,180 @@
+# Licensed under the terms of the GNU GPL License version 2
+"""
+Capacity-aware placement of test guests across several libvirt hosts.
+
+The harness can drive any number of hypervisors. Each one is represented by a
+:class:`Host`, and a :class:`Placer` picks the host a guest should boot on
+based on the vCPUs and memory left over by the domains already running there.
+It also limits how many guests run, and how many boot at once, on each host,
+so a batch of builds does not start every guest simultaneously and saturate
+the host's disks.
+"""
+import collections
+import logging
+import threading
+import time
+
+import libvirt
+
+
+_log = logging.getLogger(__name__)
+
+#: The resources a host has free, or a domain needs. ``memory`` is in KiB and
+#: ``domains`` is the number of running domains.
+Capacity = collections.namedtuple("Capacity", ["vcpus", "memory", "domains"])
+
+
+class Host(object):
+    """
+    A libvirt hypervisor guests can be placed on.
+
+    Args:
+        pool (kerneltest.harness.ConnectionPool): Connections to the host.
+        monitor (kerneltest.harness.LifecycleMonitor): The lifecycle event
+            monitor for the host.
+    """
+
+    def __init__(self, pool, monitor):
+        self.pool = pool
+        self.monitor = monitor
+        self._boots = collections.deque()
+
+    def __repr__(self):
+        return "Host({!r})".format(self.uri)
+
+    @property
+    def uri(self):
+        """The libvirt URI of the host."""
+        return self.pool.uri
+
+    def free(self, conn):
+        """
+        Work out the capacity left on the host.
+
+        Args:
+            conn (libvirt.virConnect): A connection to this host.
+
+        Returns:
+            Capacity: The free vCPUs and memory, and the number of running domains.
+        """
+        info = conn.getInfo()
+        vcpus, memory, domains = info[2], info[1] * 1024, 0
+        for dom in conn.listAllDomains(libvirt.VIR_CONNECT_LIST_DOMAINS_ACTIVE):
+            __, __, dom_memory, dom_vcpus, __ = dom.info()
+            vcpus -= dom_vcpus
+            memory -= dom_memory
+            domains += 1
+        return Capacity(vcpus, memory, domains)
+
+    def lookup(self, conn, domain):
+        """
+        Look a domain up by name.
+
+        Args:
+            conn (libvirt.virConnect): A connection to this host.
+            domain (str): The domain's name.
+
+        Returns:
+            libvirt.virDomain: The domain, or ``None`` if it's not defined here.
+        """
+        try:
+            return conn.lookupByName(domain)
+        except libvirt.libvirtError as e:
+            if e.get_error_code() == libvirt.VIR_ERR_NO_DOMAIN:
+                return None
+            raise
+
+    def booting(self, boot_time):
+        """
+        Count the guests started on this host in the last ``boot_time`` seconds.
+
+        Args:
+            boot_time (float): How long a guest counts as booting after it starts.
+
+        Returns:
+            int: The number of guests still booting.
+        """
+        cutoff = time.monotonic() - boot_time
+        while self._boots and self._boots[0] < cutoff:
+            self._boots.popleft()
+        return len(self._boots)
+
+    def booted(self):
+        """Record that a guest was just started on this host."""
+        self._boots.append(time.monotonic())
+
+    def close(self):
+        """Close the monitor and all pooled connections."""
+        self.monitor.close()
+        self.pool.close()
+
+
+class Placer(object):
+    """
+    Choose which host a guest boots on, or hold it back until one has room.
+
+    A guest fits on a host if the host defines the domain, has at least as many
+    free vCPUs and as much free memory as the domain is configured with, runs
+    fewer than ``max_domains`` domains, and has started fewer than
+    ``max_booting`` guests in the last ``boot_time`` seconds. Of the hosts that
+    fit, the one with the most free memory wins.
+
+    Args:
+        hosts (list of Host): The hosts to place guests on.
+        max_domains (int): The most domains to run on a host; 0 is unlimited.
+        max_booting (int): The most guests to boot at once on a host; 0 is
+            unlimited.
+        boot_time (float): How long a guest counts as booting after it starts.
+    """
+
+    def __init__(self, hosts, max_domains=0, max_booting=0, boot_time=300):
+        self.hosts = hosts
+        self.max_domains = max_domains
+        self.max_booting = max_booting
+        self.boot_time = boot_time
+        self._lock = threading.Lock()
+
+    def start(self, domain, starter):
+        """
+        Start a domain on the best host with room for it.
+
+        Placement and start happen under a lock, so two guests can't both be
+        placed on the last free slot of a host.
+
+        Args:
+            domain (str): The domain's name.
+            starter (callable): Called with the chosen :class:`Host` and its
+                :class:`libvirt.virDomain` to actually start the guest.
+
+        Returns:
+            Host: The host the domain was started on, or ``None`` if no host
+                has room for it right now.
+        """
+        with self._lock:
+            best = None
+            for host in self.hosts:
+                with host.pool.connection() as conn:
+                    dom = host.lookup(conn, domain)
+                    if dom is None:
+                        continue
+                    free = host.free(conn)
+                    __, __, memory, vcpus, __ = dom.info()
+                if not self._fits(host, free, Capacity(vcpus, memory, 1)):
+                    continue
+                if best is None or free.memory > best[1].memory:
+                    best = (host, free)
+            if best is None:
+                _log.info("No host has room for domain %s", domain)
+                return None
+            host = best[0]
+            with host.pool.connection() as conn:
+                starter(host, host.lookup(conn, domain))
+            host.booted()
+            return host
+
+    def _fits(self, host, free, needed):
+        if self.max_domains and free.domains >= self.max_domains:
+            return False
+        if self.max_booting and host.booting(self.boot_time) >= self.max_booting:
+            return False
+        return free.vcpus >= needed.vcpus and free.memory >= needed.memory
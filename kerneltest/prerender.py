@@ -0,0 +1,263 @@
+# Licensed under the terms of the GNU GPL License version 2
+"""
+Pre-render the public pages into static files.
+
+The ``prerender`` command renders the pages anonymous users read, that is the
+index, stats, release, kernel and test run pages, into ``PRERENDER_DIR`` so a
+web server or CDN can serve them without the application. A page at
+``/kernel/5.1.2`` is written to ``kernel/5.1.2.html``, and ``/`` to
+``index.html``. Only the first page of paginated pages is rendered; requests
+with a query string should still go to the application.
+
+After the first run, the command only renders the pages affected by test runs
+that were finalized or changed since it last ran. When ``PRERENDER_DIR`` is
+set, the application also keeps the files up to date as it goes: each test
+run it stores or finalizes, whether uploaded synchronously or stored by the
+ingest writer, has its pages re-rendered by :func:`rerender`, one of the
+:data:`kerneltest.results.COMMIT_HOOKS`, and every page is re-rendered when a
+release is added or edited, since every page lists the releases. These renders
+happen in a background thread so they don't hold up the requests, and pages
+queued while a render is waiting are rendered together, so a batch of uploads
+renders the index once.
+"""
+import concurrent.futures
+import datetime
+import logging
+import os
+import tempfile
+import threading
+
+import flask
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
+
+from . import db
+
+
+_log = logging.getLogger(__name__)
+
+#: The file the time of the last render is kept in, in the output directory.
+MARKER = ".prerendered"
+
+# Test runs are timestamped before they're committed, so runs changed shortly
+# before the last render may not have been visible to it
+_OVERLAP = datetime.timedelta(minutes=5)
+
+
+def prerender(app, everything=False):
+    """
+    Render the pages affected by test runs changed since the last render.
+
+    Args:
+        app (flask.Flask): The application, configured with ``PRERENDER_DIR``.
+        everything (bool): Render every page rather than just those affected.
+
+    Returns:
+        int: The number of pages rendered.
+    """
+    directory = app.config["PRERENDER_DIR"]
+    marker = os.path.join(directory, MARKER)
+    started = datetime.datetime.utcnow()
+    since = None
+    if not everything and os.path.exists(marker):
+        with open(marker) as fd:
+            since = datetime.datetime.strptime(fd.read().strip(), "%Y-%m-%dT%H:%M:%S")
+
+    session = db.Session()
+    if since is None:
+        paths = all_paths(session)
+    else:
+        paths = changed_paths(session, since - _OVERLAP)
+    rendered = render(app, directory, paths)
+
+    _write(marker, started.strftime("%Y-%m-%dT%H:%M:%S").encode("utf-8"))
+    return rendered
+
+
+def rerender(run):
+    """
+    Re-render the pages showing a test run in the background, if the current
+    application has ``PRERENDER_DIR`` set.
+
+    Args:
+        run (kerneltest.db.TestRun): The newly stored or finalized test run.
+    """
+    if not flask.has_app_context() or not flask.current_app.config["PRERENDER_DIR"]:
+        return
+    schedule(flask.current_app._get_current_object(), run_paths(run))
+
+
+def run_paths(run):
+    """
+    List the pages that show a test run.
+
+    Args:
+        run (kerneltest.db.TestRun): The test run.
+
+    Returns:
+        set: The pages' paths.
+    """
+    return {
+        "/",
+        "/stats",
+        "/results/{}".format(run.id),
+        "/kernel/{}".format(run.kernel_version),
+        "/release/{}".format(run.fedora_version),
+    }
+
+
+_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix="prerender"
+)
+_lock = threading.Lock()
+# The paths waiting to be rendered for each application, or None for every
+# page, and the render they're waiting for
+_queued = {}
+
+
+def schedule(app, paths=None):
+    """
+    Render pages in a background thread.
+
+    If a render for the application is already waiting to start, the pages
+    are added to it.
+
+    Args:
+        app (flask.Flask): The application, configured with ``PRERENDER_DIR``.
+        paths (set): The paths of the pages, or ``None`` for every page.
+
+    Returns:
+        concurrent.futures.Future: The render, whose result is the number of
+        pages rendered.
+    """
+    with _lock:
+        if app in _queued:
+            queued, future = _queued[app]
+            if paths is None:
+                _queued[app] = (None, future)
+            elif queued is not None:
+                queued.update(paths)
+            return future
+        future = _executor.submit(_render_queued, app)
+        _queued[app] = (None if paths is None else set(paths), future)
+        return future
+
+
+def _render_queued(app):
+    """
+    Render the pages queued for an application, logging any failure.
+
+    The pages are rendered with the thread's own scoped session, which the
+    application removes once each page is rendered.
+    """
+    with _lock:
+        paths, __ = _queued.pop(app)
+    try:
+        with app.app_context():
+            if paths is None:
+                paths = all_paths(db.Session())
+            return render(app, app.config["PRERENDER_DIR"], paths)
+    except (OSError, SQLAlchemyError) as e:
+        _log.error("Failed to pre-render pages: %r", e)
+        return 0
+
+
+def all_paths(session):
+    """
+    List every page to pre-render.
+
+    Args:
+        session (sqlalchemy.orm.Session): The session to query with.
+
+    Returns:
+        set: The pages' paths.
+    """
+    paths = {"/", "/stats"}
+    for release in db.models.ReleaseQuery(db.Release, session=session).maintained():
+        paths.add("/release/{}".format(release.version))
+    runs = session.query(db.TestRun.id, db.TestRun.kernel_version).filter(
+        db.TestRun.state == "finalized"
+    )
+    for run_id, kernel in runs:
+        paths.add("/results/{}".format(run_id))
+        paths.add("/kernel/{}".format(kernel))
+    return paths
+
+
+def changed_paths(session, since):
+    """
+    List the pages affected by test runs changed since a given time.
+
+    Args:
+        session (sqlalchemy.orm.Session): The session to query with.
+        since (datetime.datetime): The time.
+
+    Returns:
+        set: The pages' paths.
+    """
+    changed = func.coalesce(db.TestRun.updated, db.TestRun.created) >= since
+    with_artifacts = db.TestRun.id.in_(
+        session.query(db.Artifact.run_id).filter(
+            db.Artifact.state == "complete", db.Artifact.created >= since
+        )
+    )
+    runs = (
+        session.query(
+            db.TestRun.id, db.TestRun.kernel_version, db.TestRun.fedora_version
+        )
+        .filter(db.TestRun.state == "finalized")
+        .filter(changed | with_artifacts)
+        .all()
+    )
+    if not runs:
+        return set()
+    paths = {"/", "/stats"}
+    for run_id, kernel, version in runs:
+        paths.add("/results/{}".format(run_id))
+        paths.add("/kernel/{}".format(kernel))
+        paths.add("/release/{}".format(version))
+    return paths
+
+
+def render(app, directory, paths):
+    """
+    Render pages as an anonymous user and write them to files.
+
+    Pages that can't be rendered, for example because they no longer exist,
+    have their files removed.
+
+    Args:
+        app (flask.Flask): The application.
+        directory (str): The directory to write the files to.
+        paths (set): The paths of the pages.
+
+    Returns:
+        int: The number of pages rendered.
+    """
+    client = app.test_client()
+    rendered = 0
+    for path in sorted(paths):
+        relative = path.strip("/") or "index"
+        if ".." in relative.split("/"):
+            continue
+        output = os.path.join(directory, relative + ".html")
+        response = client.get(path, base_url=app.config["PRERENDER_BASE_URL"])
+        if response.status_code != 200:
+            _log.info("Not pre-rendering %s: HTTP %d", path, response.status_code)
+            if os.path.exists(output):
+                os.unlink(output)
+            continue
+        _write(output, response.get_data())
+        rendered += 1
+    return rendered
+
+
+def _write(path, data):
+    """Replace a file's contents all at once, so it's never served half-written."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
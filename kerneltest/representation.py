@@ -0,0 +1,59 @@
+# Licensed under the terms of the GNU GPL License version 2
+"""
+The JSON representation of API responses.
+
+Responses are serialized with orjson if the optional ``orjson`` package is
+installed, which is many times faster than the standard library for the large
+pages of results the API returns, and with :mod:`json` otherwise. Either way,
+responses can include :class:`datetime.datetime` and :class:`datetime.date`
+values, which are serialized in ISO 8601 format, so they don't need to be
+formatted one by one beforehand.
+"""
+import datetime
+import json
+
+import flask
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def dumps(data):
+    """
+    Serialize a response body as JSON.
+
+    Args:
+        data: The response body.
+
+    Returns:
+        bytes: The JSON, followed by a newline as Flask-RESTful's is.
+    """
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(data, default=_default) + "\n").encode("utf-8")
+
+
+def output_json(data, code, headers=None):
+    """
+    Make a JSON response; this is the API's "application/json" representation.
+
+    Args:
+        data: The response body.
+        code (int): The HTTP status code.
+        headers (dict): Any extra headers.
+
+    Returns:
+        flask.Response: The response.
+    """
+    response = flask.make_response(dumps(data), code)
+    response.headers.extend(headers or {})
+    return response
+
+
+def _default(value):
+    """Serialize the values :mod:`json` can't, as orjson does."""
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError("{!r} is not JSON serializable".format(value))
@@ -0,0 +1,485 @@
+# Licensed under the terms of the GNU GPL License version 2
+"""
+Storing uploaded test results.
+
+Test runs are either uploaded whole, or opened, appended to in batches while
+the tests run, and finalized. The message announcing a test run is only sent
+once it's complete. Runs left open for longer than
+``TEST_RUN_ABANDON_AFTER`` seconds without any tests being appended are
+assumed to be abandoned and are deleted, along with any artifacts uploaded
+for them.
+
+Guests retry uploads that time out, so uploads are deduplicated: by the
+``Idempotency-Key`` header if the client sends one, and otherwise by a hash of
+the complete upload. Both are stored in uniquely indexed columns, so spotting a
+duplicate is a single index lookup and two concurrent retries can't both be
+inserted.
+
+Uploads through the API and the web UI, and queued uploads the ingest writer
+stores, all go through the same steps: their tests are checked with
+:func:`validate_tests`, the run is stored with :func:`store`, and the session
+is committed with :func:`commit`, which then calls the :data:`COMMIT_HOOKS`.
+"""
+import datetime
+import hashlib
+import json
+import logging
+
+from fedora_messaging import api as fm_api
+from sqlalchemy import false, func, or_, true
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from . import db, feed, jobs, prerender
+
+
+_log = logging.getLogger(__name__)
+
+
+#: The fields of an upload that, along with its tests, make up its content hash.
+CONTENT_FIELDS = (
+    "kernel_version",
+    "build_release",
+    "arch",
+    "fedora_version",
+    "correlation_id",
+    "tests_started",
+    "tests_finished",
+)
+
+
+def idempotency_key(user, key):
+    """
+    Hash an Idempotency-Key header so it's only shared by the user who sent it.
+
+    Args:
+        user (str): The uploader, or ``None`` for anonymous uploads.
+        key (str): The header's value.
+
+    Returns:
+        str: The hex digest to store.
+    """
+    return hashlib.sha256("{}\0{}".format(user or "", key).encode("utf-8")).hexdigest()
+
+
+def content_hash(user, upload, tests):
+    """
+    Hash a complete upload.
+
+    Retries send exactly the same upload, so they hash the same. Genuine
+    re-runs normally differ in their timestamps or test details.
+
+    Args:
+        user (str): The uploader, or ``None`` for anonymous uploads.
+        upload (dict): The upload's arguments; the :data:`CONTENT_FIELDS` are
+            hashed.
+        tests (list): The tests as dictionaries with "name", "passed",
+            "waived", and "details" keys.
+
+    Returns:
+        str: The hex digest to store.
+    """
+    content = {field: upload.get(field) for field in CONTENT_FIELDS}
+    content["user"] = user
+    content["tests"] = [
+        [test["name"], test["passed"], test["waived"], test["details"]]
+        for test in tests
+    ]
+    canonical = json.dumps(content, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def find_duplicate(session, idempotency_key=None, content_hash=None):
+    """
+    Find a test run already stored with the same idempotency key or content.
+
+    Args:
+        session (sqlalchemy.orm.Session): The session to query with.
+        idempotency_key (str): The new upload's hashed Idempotency-Key, if any.
+        content_hash (str): The new upload's content hash, if any.
+
+    Returns:
+        kerneltest.db.TestRun: The stored test run, or ``None``.
+    """
+    criteria = []
+    if idempotency_key:
+        criteria.append(db.TestRun.idempotency_key == idempotency_key)
+    if content_hash:
+        criteria.append(db.TestRun.content_hash == content_hash)
+    if not criteria:
+        return None
+    return session.query(db.TestRun).filter(or_(*criteria)).first()
+
+
+#: The fields of each uploaded test, as their JSON types and whether they're
+#: required. Fields that aren't required default to ``None``.
+TEST_SCHEMA = {
+    "name": ((str,), True),
+    "passed": ((bool,), True),
+    "waived": ((bool,), True),
+    "details": ((str,), False),
+}
+
+#: The fields of a complete upload, as the web UI takes them.
+RUN_SCHEMA = {
+    "kernel_version": ((str,), True),
+    "build_release": ((str,), True),
+    "arch": ((str,), True),
+    "fedora_version": ((int,), True),
+    "tests": ((list,), True),
+}
+
+#: The most invalid tests described in an error; the rest are only counted.
+MAX_REPORTED_ERRORS = 100
+
+_TYPE_NAMES = {str: "a string", bool: "a boolean", int: "an integer", list: "a list"}
+
+
+def compile_schema(schema, name):
+    """
+    Compile a schema into a function that validates JSON objects against it.
+
+    The error messages and the fields to check are worked out once, so each
+    object is checked with a lookup and an exact type check per field. JSON
+    values are never subclasses, so booleans aren't taken for integers.
+
+    Args:
+        schema (dict): The fields, like :data:`TEST_SCHEMA`.
+        name (str): What the objects are, for the error if one isn't an object.
+
+    Returns:
+        callable: Called with an object, it returns a dictionary with exactly
+        the schema's fields and a dictionary of error messages by field, which
+        is empty if the object is valid.
+    """
+    fields = tuple(
+        (
+            field,
+            types,
+            required,
+            "must be " + " or ".join(_TYPE_NAMES[t] for t in types),
+        )
+        for field, (types, required) in schema.items()
+    )
+    not_an_object = {name: "must be an object"}
+
+    def validate(value):
+        if type(value) is not dict:
+            return None, dict(not_an_object)
+        valid = {}
+        errors = {}
+        for field, types, required, message in fields:
+            valid[field] = value.get(field)
+            if valid[field] is None:
+                if required:
+                    errors[field] = "is required"
+            elif type(valid[field]) not in types:
+                errors[field] = message
+        return valid, errors
+
+    return validate
+
+
+_validate_test = compile_schema(TEST_SCHEMA, "test")
+_validate_run = compile_schema(RUN_SCHEMA, "upload")
+
+
+def validate_tests(tests):
+    """
+    Validate an upload's tests against :data:`TEST_SCHEMA`.
+
+    Args:
+        tests (list): The tests, as parsed from JSON.
+
+    Returns:
+        tuple: The tests as dictionaries with "name", "passed", "waived", and
+        "details" keys, and ``None``; or ``None`` and an error response body,
+        listing the "index" and field "errors" of each invalid test.
+    """
+    if type(tests) is not list:
+        return None, {"error": "tests must be a list of test objects"}
+    valid = []
+    invalid = []
+    for index, test in enumerate(tests):
+        test, errors = _validate_test(test)
+        if errors:
+            invalid.append({"index": index, "errors": errors})
+        valid.append(test)
+    if invalid:
+        return None, {
+            "error": "{} of {} tests are invalid".format(len(invalid), len(tests)),
+            "invalid_tests": invalid[:MAX_REPORTED_ERRORS],
+        }
+    return valid, None
+
+
+def validate_upload(upload):
+    """
+    Validate a complete upload against :data:`RUN_SCHEMA` and its tests against
+    :data:`TEST_SCHEMA`.
+
+    Args:
+        upload (dict): The upload, as parsed from JSON.
+
+    Returns:
+        tuple: The upload's fields, with its validated tests, and ``None``; or
+        ``None`` and an error response body.
+    """
+    fields, errors = _validate_run(upload)
+    if errors:
+        return None, {"error": "the upload is invalid", "invalid_fields": errors}
+    fields["tests"], error = validate_tests(fields["tests"])
+    if error:
+        return None, error
+    return fields, None
+
+
+def add_tests(session, run, tests):
+    """
+    Add tests to a test run.
+
+    The tests are inserted with a single executemany statement rather than
+    as an object each, which is most of the time storing a large upload took.
+    The run is flushed first for its ID, and its ``tests`` are loaded again
+    the next time they're used.
+
+    Args:
+        session (sqlalchemy.orm.Session): The session the run was added in; it
+            is flushed but not committed.
+        run (kerneltest.db.TestRun): The test run.
+        tests (list): The tests, validated by :func:`validate_tests`.
+    """
+    if not tests:
+        return
+    session.flush()
+    session.bulk_insert_mappings(
+        db.Test,
+        [
+            dict(test, run_id=run.id, fedora_version=run.fedora_version)
+            for test in tests
+        ],
+    )
+    session.expire(run, ["tests"])
+
+
+def store(session, fields, tests):
+    """
+    Store a validated upload as a test run, unless it duplicates a stored one.
+
+    The run is stored in a savepoint, so if a concurrent retry of the same
+    upload got in first, only this upload is rolled back. Complete runs are
+    recorded against the harness jobs they belong to, and the results feeds
+    are woken up once they're committed.
+
+    Args:
+        session (sqlalchemy.orm.Session): The session to use; it is flushed but
+            not committed. Commit it with :func:`commit`.
+        fields (dict): The new :class:`kerneltest.db.TestRun`'s fields,
+            including its "release", and its "idempotency_key" and
+            "content_hash" if it's to be deduplicated by them.
+        tests (list): The tests, validated by :func:`validate_tests`.
+
+    Returns:
+        tuple: The test run, and whether it's new rather than a duplicate.
+
+    Raises:
+        sqlalchemy.exc.SQLAlchemyError: If the run couldn't be stored for any
+            reason other than being a duplicate.
+    """
+    keys = (fields.get("idempotency_key"), fields.get("content_hash"))
+    duplicate = find_duplicate(session, *keys)
+    if duplicate is not None:
+        return duplicate, False
+    savepoint = session.begin_nested()
+    run = db.TestRun(**fields)
+    session.add(run)
+    try:
+        add_tests(session, run, tests)
+        savepoint.commit()
+    except IntegrityError:
+        savepoint.rollback()
+        duplicate = find_duplicate(session, *keys)
+        if duplicate is None:
+            # Some other constraint failed
+            raise
+        return duplicate, False
+    except SQLAlchemyError:
+        savepoint.rollback()
+        raise
+    if run.state != "open":
+        jobs.record_upload(session, run)
+        feed.notify(session)
+    return run, True
+
+
+def commit(session, runs):
+    """
+    Commit a session that stored complete test runs, then call the
+    :data:`COMMIT_HOOKS` with each of them.
+
+    Args:
+        session (sqlalchemy.orm.Session): The session to commit.
+        runs (list): The new or finalized test runs.
+    """
+    session.commit()
+    for run in runs:
+        for hook in COMMIT_HOOKS:
+            try:
+                hook(run)
+            except Exception:
+                # The results have already been stored
+                _log.exception("Failed to call %r for test run %d", hook, run.id)
+
+
+def runs_with_tests(session, names=None, passed=None, waived=None, match="all"):
+    """
+    Make subqueries selecting the test runs that have certain tests.
+
+    Each subquery selects ``test.run_id`` filtered on test columns only, so
+    it's answered from the ``(name, passed, waived, run_id)`` index, or from
+    the partial index of failures for "any test that failed without being
+    waived".
+
+    Args:
+        session (sqlalchemy.orm.Session): The session to query with.
+        names (list): Test names; ``None`` or an empty list means any test.
+        passed (bool): If not ``None``, the tests must have passed or failed.
+        waived (bool): If not ``None``, the tests must have been waived or not.
+        match (str): "all" to select runs that have every one of the named
+            tests, or "any" to select runs that have at least one of them.
+
+    Returns:
+        list: Subqueries of run IDs; a run must be in all of them.
+    """
+    criteria = []
+    if passed is not None:
+        criteria.append(db.Test.passed == (true() if passed else false()))
+    if waived is not None:
+        criteria.append(db.Test.waived == (true() if waived else false()))
+    if names and match == "all":
+        groups = [[db.Test.name == name] for name in set(names)]
+    elif names:
+        groups = [[db.Test.name.in_(set(names))]]
+    elif criteria:
+        groups = [[]]
+    else:
+        return []
+    return [
+        session.query(db.Test.run_id).filter(*(group + criteria)) for group in groups
+    ]
+
+
+def has_tests(run, names=None, passed=None, waived=None, match="all"):
+    """
+    Check whether a test run has certain tests, like :func:`runs_with_tests`
+    but for runs that aren't in the database, such as archived runs.
+
+    Args:
+        run (kerneltest.db.TestRun): The test run.
+        names (list): Test names; ``None`` or an empty list means any test.
+        passed (bool): If not ``None``, the tests must have passed or failed.
+        waived (bool): If not ``None``, the tests must have been waived or not.
+        match (str): "all" if the run must have every one of the named tests,
+            or "any" if it must have at least one of them.
+
+    Returns:
+        bool: Whether the run has the tests.
+    """
+
+    def matches(test):
+        return (passed is None or test.passed == passed) and (
+            waived is None or test.waived == waived
+        )
+
+    if names and match == "all":
+        return all(
+            any(test.name == name and matches(test) for test in run.tests)
+            for name in set(names)
+        )
+    if names:
+        return any(test.name in names and matches(test) for test in run.tests)
+    if passed is None and waived is None:
+        return True
+    return any(matches(test) for test in run.tests)
+
+
+def publish(run):
+    """
+    Announce a complete test run with a message.
+
+    Runs uploaded in the web UI are announced the same way as API uploads.
+
+    Failures to send the message are logged rather than raised, since the
+    results have already been stored.
+
+    Args:
+        run (kerneltest.db.TestRun): The test run.
+    """
+    # The message format here matches the old fedmsg schema. Eventually it
+    # should be changed, but message consumers need to be cataloged and notified.
+    message = fm_api.Message(
+        topic="kerneltest.upload.new",
+        body={
+            "agent": run.user or "anon",
+            "test": {
+                "tester": run.user or "anon",
+                "testdate": str(run.created),
+                "testset": ", ".join([test.name for test in run.tests]),
+                "kernel_version": run.package_name,
+                "fedora_version": run.fedora_version,
+                "arch": run.arch,
+                "release": "Fedora release {}".format(run.fedora_version),
+                "failed_tests": ", ".join(
+                    [test.name for test in run.tests if not test.passed]
+                ),
+                "authenticated": True,
+            },
+        },
+    )
+    try:
+        fm_api.publish(message)
+    except (
+        fm_api.exceptions.PublishException,
+        fm_api.exceptions.ConnectionException,
+    ) as err:
+        _log.error("Failed to send %r: %r", message, err)
+
+
+#: The functions :func:`commit` calls with each test run once it's stored, for
+#: work that mustn't hold up or roll back storing it, like announcing it.
+#: Exceptions they raise are logged.
+COMMIT_HOOKS = [publish, prerender.rerender]
+
+
+def delete_abandoned(session, older_than):
+    """
+    Delete open test runs that nothing has been appended to for a while.
+
+    Args:
+        session (sqlalchemy.orm.Session): The session to use; it is not committed.
+        older_than (int): The number of seconds after which an open run that
+            hasn't been appended to is abandoned.
+
+    Returns:
+        int: The number of test runs deleted.
+    """
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=older_than)
+    abandoned = [
+        run_id
+        for run_id, in session.query(db.TestRun.id).filter(
+            db.TestRun.state == "open",
+            func.coalesce(db.TestRun.updated, db.TestRun.created) < cutoff,
+        )
+    ]
+    if not abandoned:
+        return 0
+    session.query(db.Artifact).filter(db.Artifact.run_id.in_(abandoned)).delete(
+        synchronize_session=False
+    )
+    session.query(db.Test).filter(db.Test.run_id.in_(abandoned)).delete(
+        synchronize_session=False
+    )
+    session.query(db.TestRun).filter(db.TestRun.id.in_(abandoned)).delete(
+        synchronize_session=False
+    )
+    _log.info("Deleted %d abandoned test runs", len(abandoned))
+    return len(abandoned)
@@ -0,0 +1,174 @@
+# Licensed under the terms of the GNU GPL License version 2
+"""
+A host-side cache of the RPMs the test guests install.
+
+Without the cache every guest runs ``koji download-build`` for itself, so the
+32-bit and 64-bit guests of each release fetch the same build separately on
+every test cycle. Instead, the harness downloads each build once, when the Koji
+message announcing it arrives, and the guests install it from the cache over
+the shared ``/data`` mount or over HTTP.
+
+The cache is content-addressed: each RPM is stored once under the SHA-256 of
+its contents, and each build is a directory of hard links to those objects
+along with a ``SHA256SUMS`` manifest guests can verify the files against::
+
+    <root>/objects/ab/ab12...ef.rpm
+    <root>/builds/kernel-5.1.0-300.fc30/x86_64/kernel-core-5.1.0-300.fc30.x86_64.rpm
+    <root>/builds/kernel-5.1.0-300.fc30/x86_64/SHA256SUMS
+
+Builds are published by renaming a fully populated directory into place, so a
+guest never sees a partial download. The oldest builds are evicted once more
+than ``keep`` are cached, and an object is removed once no build links to it.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+
+
+_log = logging.getLogger(__name__)
+
+#: The name of the manifest in each build's directory, in ``sha256sum`` format.
+MANIFEST = "SHA256SUMS"
+
+
+def _sha256(path):
+    """Hash a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fd:
+        for chunk in iter(lambda: fd.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RPMCache(object):
+    """
+    A content-addressed cache of Koji builds' RPMs.
+
+    Args:
+        root (str): The directory to keep the cache in.
+        keep (int): The number of builds to keep cached; older ones are evicted.
+        protected (callable): Returns the names of builds that must not be
+            evicted, for example the ones guests are about to install.
+    """
+
+    def __init__(self, root, keep=10, protected=None):
+        self.root = root
+        self.keep = keep
+        self.protected = protected or set
+        self.objects = os.path.join(root, "objects")
+        self.builds = os.path.join(root, "builds")
+        os.makedirs(self.objects, exist_ok=True)
+        os.makedirs(self.builds, exist_ok=True)
+
+    def path(self, nvr, arch):
+        """
+        Get the directory a build's RPMs for an architecture are cached in.
+
+        Args:
+            nvr (str): The build's name-version-release.
+            arch (str): The architecture.
+
+        Returns:
+            str: The directory, which may not exist yet.
+        """
+        return os.path.join(self.builds, nvr, arch)
+
+    def populate(self, nvr, arch):
+        """
+        Download a build's RPMs for an architecture into the cache.
+
+        Debuginfo packages are skipped. Builds that are already cached are not
+        downloaded again.
+
+        Args:
+            nvr (str): The build's name-version-release.
+            arch (str): The architecture.
+
+        Returns:
+            str: The directory the RPMs are cached in.
+
+        Raises:
+            subprocess.CalledProcessError: If Koji could not download the build.
+        """
+        path = self.path(nvr, arch)
+        if os.path.isdir(path):
+            _log.info("%s for %s is already cached", nvr, arch)
+            return path
+
+        # Download inside the cache so the results can be linked and renamed
+        # into place without crossing filesystems.
+        staging = tempfile.mkdtemp(prefix=".download-", dir=self.root)
+        try:
+            _log.info("Downloading %s for %s into the RPM cache", nvr, arch)
+            subprocess.run(
+                ["koji", "download-build", "--arch={}".format(arch), nvr],
+                cwd=staging,
+                check=True,
+                stdout=subprocess.DEVNULL,
+            )
+            build = os.path.join(staging, "build")
+            os.mkdir(build)
+            manifest = []
+            for name in sorted(os.listdir(staging)):
+                if not name.endswith(".rpm") or "debug" in name:
+                    continue
+                digest = self._store(os.path.join(staging, name))
+                os.link(self._object(digest), os.path.join(build, name))
+                manifest.append("{}  {}\n".format(digest, name))
+            with open(os.path.join(build, MANIFEST), "w") as fd:
+                fd.writelines(manifest)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                os.rename(build, path)
+            except OSError:
+                if not os.path.isdir(path):
+                    raise
+                # Another process cached the build first
+        finally:
+            shutil.rmtree(staging)
+        return path
+
+    def evict(self):
+        """
+        Remove the oldest builds beyond ``keep``, then any unreferenced objects.
+
+        Returns:
+            list: The names of the builds that were evicted.
+        """
+        builds = sorted(
+            os.listdir(self.builds),
+            key=lambda nvr: os.path.getmtime(os.path.join(self.builds, nvr)),
+            reverse=True,
+        )
+        protected = self.protected()
+        evicted = []
+        for nvr in builds[self.keep :]:
+            if nvr in protected:
+                continue
+            shutil.rmtree(os.path.join(self.builds, nvr))
+            evicted.append(nvr)
+        if evicted:
+            _log.info("Evicted %s from the RPM cache", ", ".join(evicted))
+
+        for prefix in os.listdir(self.objects):
+            directory = os.path.join(self.objects, prefix)
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                if os.stat(path).st_nlink == 1:
+                    os.unlink(path)
+        return evicted
+
+    def _object(self, digest):
+        return os.path.join(self.objects, digest[:2], digest + ".rpm")
+
+    def _store(self, path):
+        """Move a file into the object store unless it's there already."""
+        digest = _sha256(path)
+        target = self._object(digest)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.rename(path, target)
+        return digest
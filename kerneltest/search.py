@@ -0,0 +1,154 @@
+# Licensed under the terms of the GNU GPL License version 2
+"""
+Full-text search over the names and details of tests.
+
+The index is maintained by the database as tests are stored, so results are
+searchable as soon as they're uploaded. SQLite keeps it in an FTS5 table and
+PostgreSQL in a GIN index over a ``tsvector`` expression; both are created
+with the ``test`` table, see :mod:`kerneltest.db.models`. Other databases fall
+back to a substring match, which scans the table.
+
+Queries are split into words and a test matches if its name or details contain
+all of them. Kernel symbols such as ``do_page_fault`` are single words.
+"""
+import collections
+
+from markupsafe import Markup, escape
+from sqlalchemy import and_, bindparam, column, or_, orm, text
+
+from . import db
+
+
+#: A test that matched a search, with a snippet of the text around the match.
+Hit = collections.namedtuple("Hit", ["test", "snippet"])
+
+# Matches are wrapped in these before the snippet is escaped for HTML.
+_START = "\x02"
+_STOP = "\x03"
+
+#: The text of a test that's searched in PostgreSQL.
+_PG_TEXT = "coalesce(test.name, '') || ' ' || coalesce(test.details, '')"
+
+#: The PostgreSQL expression the GIN index is built on.
+_PG_DOCUMENT = "to_tsvector('simple', {})".format(_PG_TEXT)
+
+
+def search(query, page=1, items_per_page=db.DEFAULT_PAGE_SIZE):
+    """
+    Find the tests whose name or details contain all the words in a query.
+
+    Args:
+        query (str): The words to search for.
+        page (int): The page of hits to get.
+        items_per_page (int): The number of hits per page.
+
+    Returns:
+        kerneltest.db.meta.Page: A page of :class:`Hit`, newest first.
+    """
+    dialect = db.Session().get_bind().dialect.name
+    words = query.split()
+    hits = (
+        db.Test.query.options(orm.joinedload(db.Test.run))
+        .filter(_match(dialect, words))
+        .order_by(db.Test.id.desc())
+        .paginate(page=page, items_per_page=items_per_page)
+    )
+    snippets = _snippets(dialect, words, [test.id for test in hits.items])
+    return hits._replace(
+        items=[Hit(test, snippets.get(test.id, "")) for test in hits.items]
+    )
+
+
+def _fts5_query(words):
+    """Quote each word so FTS5 doesn't interpret it as query syntax."""
+    return " ".join('"{}"'.format(word.replace('"', '""')) for word in words)
+
+
+def _match(dialect, words):
+    """The filter that selects tests matching all the words."""
+    if dialect == "sqlite":
+        return db.Test.id.in_(
+            text("SELECT rowid FROM test_fts WHERE test_fts MATCH :query")
+            .bindparams(query=_fts5_query(words))
+            .columns(column("rowid"))
+        )
+    if dialect == "postgresql":
+        return text(
+            "{} @@ plainto_tsquery('simple', :query)".format(_PG_DOCUMENT)
+        ).bindparams(query=" ".join(words))
+    return and_(
+        *[
+            or_(
+                db.Test.name.contains(word, autoescape=True),
+                db.Test.details.contains(word, autoescape=True),
+            )
+            for word in words
+        ]
+    )
+
+
+def _snippets(dialect, words, test_ids):
+    """
+    Make HTML snippets of the text around the matches in the given tests.
+
+    Returns:
+        dict: The snippets as :class:`markupsafe.Markup`, keyed by test ID.
+    """
+    if not test_ids:
+        return {}
+    session = db.Session()
+    if dialect == "sqlite":
+        rows = session.execute(
+            text(
+                "SELECT rowid, snippet(test_fts, -1, :start, :stop, '…', 16) "
+                "FROM test_fts WHERE test_fts MATCH :query AND rowid IN :ids"
+            ).bindparams(bindparam("ids", expanding=True)),
+            {
+                "start": _START,
+                "stop": _STOP,
+                "query": _fts5_query(words),
+                "ids": test_ids,
+            },
+        )
+    elif dialect == "postgresql":
+        rows = session.execute(
+            text(
+                "SELECT id, ts_headline('simple', {}, "
+                "plainto_tsquery('simple', :query), :options) "
+                "FROM test WHERE id IN :ids".format(_PG_TEXT)
+            ).bindparams(bindparam("ids", expanding=True)),
+            {
+                "query": " ".join(words),
+                "options": "StartSel={}, StopSel={}, MaxWords=30, MinWords=10".format(
+                    _START, _STOP
+                ),
+                "ids": test_ids,
+            },
+        )
+    else:
+        rows = [
+            (test.id, _substring_snippet(test.name + " " + (test.details or ""), words))
+            for test in db.Test.query.filter(db.Test.id.in_(test_ids))
+        ]
+    return {test_id: _html(snippet or "") for test_id, snippet in rows}
+
+
+def _substring_snippet(content, words, width=80):
+    """Cut a snippet around the first word found in a test's name and details."""
+    for word in words:
+        index = content.find(word)
+        if index != -1:
+            start = max(index - width, 0)
+            return (
+                content[start:index]
+                + _START
+                + word
+                + _STOP
+                + content[index + len(word) : index + len(word) + width]
+            )
+    return content[: 2 * width]
+
+
+def _html(snippet):
+    """Escape a snippet for HTML and highlight its matches in bold."""
+    return Markup(str(escape(snippet)).replace(_START, "<b>").replace(_STOP, "</b>"))
@@ -3,10 +3,11 @@ import datetime
 import json
 
 from flask import request_started, g
+from sqlalchemy.exc import IntegrityError
 from fedora_messaging.testing import mock_sends
 from fedora_messaging import api as fm_api, exceptions as fm_exceptions
 
-from .. import db, authentication, api
+from .. import db, authentication, api, jobs
 from ..app import User
 from .base import BaseTestCase
 
@@ -83,6 +84,7 @@ class ResultsGetTests(BaseTestCase):
                     "kernel_version": "5.1.0",
                     "build_release": "300.fc30",
                     "fedora_version": 31,
+                    "state": "finalized",
                     "tests": [
                         {
                             "id": 1,
@@ -136,6 +138,7 @@ class ResultsGetTests(BaseTestCase):
                     "kernel_version": "5.1.0",
                     "build_release": "300.fc30",
                     "fedora_version": 31,
+                    "state": "finalized",
                     "tests": [],
                 }
             ],
@@ -152,6 +155,7 @@ class ResultsGetTests(BaseTestCase):
                     "kernel_version": "5.1.1",
                     "build_release": "300.fc30",
                     "fedora_version": 31,
+                    "state": "finalized",
                     "tests": [],
                 }
             ],
@@ -202,6 +206,7 @@ class ResultsGetTests(BaseTestCase):
                 "kernel_version": "5.1.0",
                 "build_release": "300.fc30",
                 "fedora_version": 31,
+                "state": "finalized",
                 "tests": [],
             }
         ]
@@ -243,6 +248,7 @@ class ResultsGetTests(BaseTestCase):
                 "kernel_version": "5.1.1",
                 "build_release": "300.fc30",
                 "fedora_version": 31,
+                "state": "finalized",
                 "tests": [],
             }
         ]
@@ -284,6 +290,7 @@ class ResultsGetTests(BaseTestCase):
                 "kernel_version": "5.1.0",
                 "build_release": "300.fc30",
                 "fedora_version": 31,
+                "state": "finalized",
                 "tests": [],
             }
         ]
@@ -326,11 +333,79 @@ class ResultsGetTests(BaseTestCase):
                 "kernel_version": "5.1.3",
                 "build_release": "300.fc30",
                 "fedora_version": 30,
+                "state": "finalized",
                 "tests": [],
             }
         ]
 
 
+class ResultsTestFiltersTests(BaseTestCase):
+    """Tests for filtering GET /api/v1/results/ by the tests in each run."""
+
+    def setUp(self):
+        super(ResultsTestFiltersTests, self).setUp()
+        release = db.Release(version=30, support="RELEASE")
+        # Each run's tests as (name, passed, waived)
+        for kernel, tests in (
+            ("5.1.1", [("boot", True, False), ("paxtest", False, False)]),
+            ("5.1.2", [("boot", True, False), ("paxtest", False, True)]),
+            ("5.1.3", [("boot", False, False), ("paxtest", True, False)]),
+            ("5.1.4", [("boot", True, False), ("paxtest", True, False)]),
+        ):
+            run = db.TestRun(
+                kernel_version=kernel,
+                build_release="300.fc30",
+                arch="x86_64",
+                release=release,
+            )
+            for name, passed, waived in tests:
+                db.Session.add(
+                    db.Test(name=name, passed=passed, waived=waived, run=run)
+                )
+        db.Session.commit()
+
+    def kernels(self, query):
+        result = self.flask_client.get("/api/v1/results/?" + query)
+        assert result.status_code == 200
+        body = json.loads(result.get_data(as_text=True))
+        return sorted(item["kernel_version"] for item in body["items"])
+
+    def test_failed_test(self):
+        """Assert runs where a named test failed can be found."""
+        assert self.kernels("test=paxtest&test_result=failed") == ["5.1.1", "5.1.2"]
+
+    def test_failed_not_waived(self):
+        """Assert runs with any failure that wasn't waived can be found."""
+        assert self.kernels("test_result=failed&test_waived=false") == [
+            "5.1.1",
+            "5.1.3",
+        ]
+
+    def test_all_tests(self):
+        """Assert every named test must match by default."""
+        assert self.kernels("test=boot&test=paxtest&test_result=passed") == ["5.1.4"]
+
+    def test_any_test(self):
+        """Assert runs can match any one of the named tests."""
+        assert self.kernels(
+            "test=boot&test=paxtest&test_result=failed&test_waived=false"
+            "&test_match=any"
+        ) == ["5.1.1", "5.1.3"]
+
+    def test_combined_with_run_filters(self):
+        """Assert test filters combine with the run filters."""
+        assert self.kernels("kernel_version=5.1.2&test=paxtest&test_waived=true") == [
+            "5.1.2"
+        ]
+        assert self.kernels("kernel_version=5.1.1&test=paxtest&test_waived=true") == []
+
+    def test_bad_result(self):
+        """Assert unknown test results are rejected."""
+        result = self.flask_client.get("/api/v1/results/?test_result=flaky")
+
+        assert result.status_code == 400
+
+
 class ResultsPostTests(BaseTestCase):
     def test_create_unauthenticated(self):
         """Assert unathenticated requests create anonymous results."""
@@ -413,8 +488,9 @@ class ResultsPostTests(BaseTestCase):
         assert result.status_code == 201
         assert db.TestRun.query.count() == 1
         assert db.Test.query.count() == 1
+        assert db.Test.query.one().fedora_version == 29
 
-    @mock.patch("kerneltest.api.fm_api.publish")
+    @mock.patch("kerneltest.results.fm_api.publish")
     def test_create_failed_message(self, mock_publish):
         """Assert test results can be created."""
         test_run = {
@@ -447,3 +523,531 @@ class ResultsPostTests(BaseTestCase):
         assert result.status_code == 201
         assert db.TestRun.query.count() == 1
         assert db.Test.query.count() == 1
+
+    def test_create_latency_fields(self):
+        """Assert the correlation ID and test timestamps are stored in UTC."""
+        test_run = {
+            "kernel_version": "5.1.2",
+            "build_release": "300.fc30",
+            "arch": "aarch64",
+            "fedora_version": 29,
+            "tests": [],
+            "correlation_id": "8b0e9c63-3a5e-4f4c-9d2b-1e2f3a4b5c6d",
+            "tests_started": "2019-05-01T12:00:00+02:00",
+            "tests_finished": "2019-05-01T10:30:00Z",
+        }
+        db.Session.add(db.Release(version=29))
+        db.Session.commit()
+
+        with mock_sends(fm_api.Message):
+            result = self.flask_client.post("/api/v1/results/", json=test_run)
+
+        assert result.status_code == 201
+        run = db.TestRun.query.one()
+        assert run.correlation_id == "8b0e9c63-3a5e-4f4c-9d2b-1e2f3a4b5c6d"
+        assert run.tests_started == datetime.datetime(2019, 5, 1, 10, 0)
+        assert run.tests_finished == datetime.datetime(2019, 5, 1, 10, 30)
+
+    def test_create_invalid_tests(self):
+        """Assert each invalid test is reported and nothing is stored."""
+        test_run = {
+            "kernel_version": "5.1.2",
+            "build_release": "300.fc30",
+            "arch": "aarch64",
+            "fedora_version": 29,
+            "tests": [
+                {"name": "Boot test", "passed": True, "waived": False},
+                {"name": "Boot test", "passed": "yes", "waived": False},
+            ],
+        }
+        db.Session.add(db.Release(version=29))
+        db.Session.commit()
+
+        with mock_sends():
+            result = self.flask_client.post("/api/v1/results/", json=test_run)
+
+        assert result.status_code == 400
+        assert json.loads(result.get_data(as_text=True)) == {
+            "error": "1 of 2 tests are invalid",
+            "invalid_tests": [{"index": 1, "errors": {"passed": "must be a boolean"}}],
+        }
+        assert db.TestRun.query.count() == 0
+
+    def test_create_not_stored(self):
+        """Assert uploads that break a constraint, but aren't duplicates, get 400."""
+        test_run = {
+            "kernel_version": "5.1.2",
+            "build_release": "300.fc30",
+            "arch": "aarch64",
+            "fedora_version": 29,
+            "tests": [],
+        }
+        db.Session.add(db.Release(version=29))
+        db.Session.commit()
+        error = IntegrityError("INSERT", {}, Exception("FOREIGN KEY failed"))
+
+        with mock.patch("kerneltest.results.add_tests", side_effect=error):
+            result = self.flask_client.post("/api/v1/results/", json=test_run)
+
+        assert result.status_code == 400
+        assert json.loads(result.get_data(as_text=True)) == {
+            "error": "the test run is invalid and could not be stored"
+        }
+
+
+class LatencyTests(BaseTestCase):
+    """Tests for the /api/v1/latency/ endpoint."""
+
+    def setUp(self):
+        super(LatencyTests, self).setUp()
+        now = datetime.datetime.utcnow()
+        run = db.TestRun(
+            kernel_version="5.1.2",
+            build_release="300.fc30",
+            arch="x86_64",
+            release=db.Release(version=30, support="RELEASE"),
+            tests_started=now - datetime.timedelta(minutes=20),
+            tests_finished=now - datetime.timedelta(minutes=5),
+            created=now,
+        )
+        job = db.Job(
+            build="kernel-5.1.2-300.fc30",
+            release="Fedora30",
+            domain="Fedora30_64",
+            arch="x86_64",
+            state="uploaded",
+            queued=now - datetime.timedelta(minutes=30),
+            started=now - datetime.timedelta(minutes=25),
+            test_run=run,
+        )
+        db.Session.add_all([run, job])
+        db.Session.commit()
+
+    def test_get(self):
+        """Assert stage percentiles are reported per release and arch."""
+        result = self.flask_client.get("/api/v1/latency/")
+
+        assert result.status_code == 200
+        items = json.loads(result.get_data(as_text=True))["items"]
+        assert items == [
+            {
+                "release": "Fedora30",
+                "arch": "x86_64",
+                "stages": {
+                    "queue": {"count": 1, "p50": 300.0, "p90": 300.0, "p99": 300.0},
+                    "boot": {"count": 1, "p50": 300.0, "p90": 300.0, "p99": 300.0},
+                    "test": {"count": 1, "p50": 900.0, "p90": 900.0, "p99": 900.0},
+                    "upload": {"count": 1, "p50": 300.0, "p90": 300.0, "p99": 300.0},
+                },
+            }
+        ]
+
+    def test_get_filtered(self):
+        """Assert the results can be filtered by release."""
+        result = self.flask_client.get("/api/v1/latency/?release=Rawhide")
+
+        assert result.status_code == 200
+        assert json.loads(result.get_data(as_text=True))["items"] == []
+
+    def test_get_bad_days(self):
+        """Assert HTTP 400 is returned for a bad number of days."""
+        result = self.flask_client.get("/api/v1/latency/?days=0")
+
+        assert result.status_code == 400
+
+
+class JobsTests(BaseTestCase):
+    """Tests for the /api/v1/jobs/ endpoints."""
+
+    def setUp(self):
+        super(JobsTests, self).setUp()
+        jobs.JobStore().queue_pull(
+            jobs.Build("kernel-5.1.2-300.fc30", "Fedora30"), "x86_64"
+        )
+
+    def test_lease(self):
+        """Assert workers can lease a queued job."""
+        result = self.flask_client.post(
+            "/api/v1/jobs/lease", json={"worker": "worker1"}
+        )
+
+        assert result.status_code == 200
+        job = json.loads(result.get_data(as_text=True))
+        assert job["build"] == "kernel-5.1.2-300.fc30"
+        assert job["release"] == "Fedora30"
+        assert job["arch"] == "x86_64"
+        assert job["state"] == "started"
+        assert job["worker"] == "worker1"
+
+    def test_lease_empty(self):
+        """Assert HTTP 204 is returned when there's nothing to lease."""
+        result = self.flask_client.post(
+            "/api/v1/jobs/lease", json={"worker": "worker1", "arch": "aarch64"}
+        )
+
+        assert result.status_code == 204
+
+    def test_lease_no_worker(self):
+        """Assert workers must identify themselves."""
+        result = self.flask_client.post("/api/v1/jobs/lease", json={})
+
+        assert result.status_code == 400
+
+    def test_heartbeat(self):
+        """Assert the lease holder can send heartbeats and others can't."""
+        self.flask_client.post("/api/v1/jobs/lease", json={"worker": "worker1"})
+
+        result = self.flask_client.post(
+            "/api/v1/jobs/1/heartbeat", json={"worker": "worker1"}
+        )
+        other = self.flask_client.post(
+            "/api/v1/jobs/1/heartbeat", json={"worker": "worker2"}
+        )
+
+        assert result.status_code == 200
+        assert other.status_code == 409
+
+    def test_complete(self):
+        """Assert completing a job links it to the uploaded test run."""
+        release = db.Release(version=30, support="RELEASE")
+        run = db.TestRun(
+            kernel_version="5.1.2",
+            build_release="300.fc30",
+            arch="x86_64",
+            release=release,
+        )
+        db.Session.add_all([release, run])
+        db.Session.commit()
+        self.flask_client.post("/api/v1/jobs/lease", json={"worker": "worker1"})
+
+        result = self.flask_client.post(
+            "/api/v1/jobs/1/complete", json={"worker": "worker1", "test_run_id": 1}
+        )
+
+        assert result.status_code == 200
+        assert json.loads(result.get_data(as_text=True))["state"] == "uploaded"
+        job = db.Session.query(db.Job).one()
+        db.Session.refresh(job)
+        assert job.test_run_id == run.id
+        assert job.uploaded is not None
+
+    def test_complete_other_build(self):
+        """Assert jobs can't be completed with a test run of another build."""
+        release = db.Release(version=30, support="RELEASE")
+        runs = [
+            db.TestRun(
+                kernel_version=kernel,
+                build_release="300.fc30",
+                arch=arch,
+                release=release,
+            )
+            for kernel, arch in (("5.1.3", "x86_64"), ("5.1.2", "aarch64"))
+        ]
+        db.Session.add_all([release] + runs)
+        db.Session.commit()
+        self.flask_client.post("/api/v1/jobs/lease", json={"worker": "worker1"})
+
+        results = [
+            self.flask_client.post(
+                "/api/v1/jobs/1/complete",
+                json={"worker": "worker1", "test_run_id": run.id},
+            )
+            for run in runs
+        ]
+
+        assert [result.status_code for result in results] == [400, 400]
+        assert db.Session.query(db.Job).one().state == "started"
+
+    def test_complete_unknown_run(self):
+        """Assert jobs can't be completed with a test run that doesn't exist."""
+        self.flask_client.post("/api/v1/jobs/lease", json={"worker": "worker1"})
+
+        result = self.flask_client.post(
+            "/api/v1/jobs/1/complete", json={"worker": "worker1", "test_run_id": 42}
+        )
+
+        assert result.status_code == 400
+
+
+class ResultsIncrementalTests(BaseTestCase):
+    """Tests for opening, appending to and finalizing test runs."""
+
+    def setUp(self):
+        super(ResultsIncrementalTests, self).setUp()
+        db.Session.add(db.Release(version=30, support="RELEASE"))
+        db.Session.commit()
+        self.run = {
+            "kernel_version": "5.1.2",
+            "build_release": "300.fc30",
+            "arch": "x86_64",
+            "fedora_version": 30,
+        }
+        self.tests = [
+            {"name": "Boot test", "passed": True, "waived": False, "details": ""}
+        ]
+
+    def test_open_append_finalize(self):
+        """Assert a run is only announced once it's finalized."""
+        with mock_sends():
+            result = self.flask_client.post("/api/v1/results/open", json=self.run)
+            run_id = json.loads(result.get_data(as_text=True))["id"]
+            appended = self.flask_client.post(
+                "/api/v1/results/{}/tests".format(run_id), json={"tests": self.tests}
+            )
+        assert result.status_code == 201
+        assert appended.status_code == 200
+        assert json.loads(appended.get_data(as_text=True))["tests"] == 1
+        assert db.TestRun.query.one().state == "open"
+
+        with mock_sends(fm_api.Message):
+            result = self.flask_client.post(
+                "/api/v1/results/{}/finalize".format(run_id),
+                json={"tests_finished": "2019-05-01T10:00:00Z"},
+            )
+
+        assert result.status_code == 200
+        assert json.loads(result.get_data(as_text=True))["tests"] == 1
+        run = db.TestRun.query.one()
+        db.Session.refresh(run)
+        assert run.state == "finalized"
+        assert run.tests_finished == datetime.datetime(2019, 5, 1, 10, 0)
+        assert [t.name for t in run.tests] == ["Boot test"]
+
+    def test_append_counts_all_tests(self):
+        """Assert appending returns the number of tests in the run so far."""
+        self.run["tests"] = self.tests
+        result = self.flask_client.post("/api/v1/results/open", json=self.run)
+        run_id = json.loads(result.get_data(as_text=True))["id"]
+        self.tests[0]["name"] = "Second test"
+
+        appended = self.flask_client.post(
+            "/api/v1/results/{}/tests".format(run_id), json={"tests": self.tests}
+        )
+
+        assert json.loads(appended.get_data(as_text=True))["tests"] == 2
+
+    def test_open_with_tests(self):
+        """Assert tests can be sent when the run is opened."""
+        self.run["tests"] = self.tests
+
+        result = self.flask_client.post("/api/v1/results/open", json=self.run)
+
+        assert result.status_code == 201
+        assert db.Test.query.count() == 1
+
+    def test_append_finalized(self):
+        """Assert HTTP 409 is returned for runs that were already finalized."""
+        self.run["tests"] = self.tests
+        with mock_sends(fm_api.Message):
+            self.flask_client.post("/api/v1/results/", json=self.run)
+
+        result = self.flask_client.post(
+            "/api/v1/results/1/tests", json={"tests": self.tests}
+        )
+
+        assert result.status_code == 409
+        assert db.Test.query.count() == 1
+
+    def test_append_missing(self):
+        """Assert HTTP 404 is returned for runs that don't exist."""
+        result = self.flask_client.post(
+            "/api/v1/results/42/tests", json={"tests": self.tests}
+        )
+
+        assert result.status_code == 404
+
+    def test_append_other_user(self):
+        """Assert only the user who opened a run can append to it."""
+        self.flask_client.post("/api/v1/results/open", json=self.run)
+        db.TestRun.query.update({"user": "jcline"})
+        db.Session.commit()
+
+        result = self.flask_client.post(
+            "/api/v1/results/1/tests", json={"tests": self.tests}
+        )
+
+        assert result.status_code == 403
+
+
+class ResultsDeduplicationTests(BaseTestCase):
+    """Tests for deduplicating retried uploads."""
+
+    def setUp(self):
+        super(ResultsDeduplicationTests, self).setUp()
+        db.Session.add(db.Release(version=30, support="RELEASE"))
+        db.Session.commit()
+        self.run = {
+            "kernel_version": "5.1.2",
+            "build_release": "300.fc30",
+            "arch": "x86_64",
+            "fedora_version": 30,
+            "tests_started": "2019-05-01T09:00:00Z",
+            "tests": [
+                {"name": "Boot test", "passed": True, "waived": False, "details": ""}
+            ],
+        }
+
+    def test_retry(self):
+        """Assert a retried upload returns the original run and isn't announced."""
+        with mock_sends(fm_api.Message):
+            first = self.flask_client.post("/api/v1/results/", json=self.run)
+        with mock_sends():
+            second = self.flask_client.post("/api/v1/results/", json=self.run)
+
+        assert first.status_code == 201
+        assert second.status_code == 200
+        assert second.headers["Idempotent-Replayed"] == "true"
+        assert json.loads(second.get_data(as_text=True)) == json.loads(
+            first.get_data(as_text=True)
+        )
+        assert db.TestRun.query.count() == 1
+        assert db.Test.query.count() == 1
+
+    def test_rerun(self):
+        """Assert a genuine re-run of the same tests is stored."""
+        with mock_sends(fm_api.Message, fm_api.Message):
+            self.flask_client.post("/api/v1/results/", json=self.run)
+            self.run["tests_started"] = "2019-05-01T10:00:00Z"
+            result = self.flask_client.post("/api/v1/results/", json=self.run)
+
+        assert result.status_code == 201
+        assert db.TestRun.query.count() == 2
+
+    def test_idempotency_key(self):
+        """Assert uploads with the same Idempotency-Key are only stored once."""
+        headers = {"Idempotency-Key": "6c3a1e0e-6b5e-4bb7-9d43-8a1d0b0c2f61"}
+        with mock_sends(fm_api.Message):
+            first = self.flask_client.post(
+                "/api/v1/results/", json=self.run, headers=headers
+            )
+            self.run["tests_started"] = "2019-05-01T10:00:00Z"
+            second = self.flask_client.post(
+                "/api/v1/results/", json=self.run, headers=headers
+            )
+
+        assert first.status_code == 201
+        assert second.status_code == 200
+        assert db.TestRun.query.count() == 1
+
+    def test_idempotency_key_too_long(self):
+        """Assert overly long Idempotency-Keys are rejected."""
+        result = self.flask_client.post(
+            "/api/v1/results/", json=self.run, headers={"Idempotency-Key": "a" * 256}
+        )
+
+        assert result.status_code == 400
+        assert db.TestRun.query.count() == 0
+
+    def test_open_idempotency_key(self):
+        """Assert retried requests to open a run return the same run."""
+        headers = {"Idempotency-Key": "open-1"}
+        first = self.flask_client.post(
+            "/api/v1/results/open", json=self.run, headers=headers
+        )
+        second = self.flask_client.post(
+            "/api/v1/results/open", json=self.run, headers=headers
+        )
+
+        assert first.status_code == 201
+        assert second.status_code == 200
+        assert json.loads(second.get_data(as_text=True))["id"] == 1
+        assert db.TestRun.query.count() == 1
+
+    def test_concurrent_retry(self):
+        """Assert a retry that races the original upload returns the original."""
+        with mock_sends(fm_api.Message):
+            self.flask_client.post("/api/v1/results/", json=self.run)
+        original = db.TestRun.query.one()
+
+        with mock.patch(
+            "kerneltest.api.results.find_duplicate", side_effect=[None, original]
+        ):
+            result = self.flask_client.post("/api/v1/results/", json=self.run)
+
+        assert result.status_code == 200
+        assert json.loads(result.get_data(as_text=True)) == {"id": original.id}
+        assert db.TestRun.query.count() == 1
+        assert db.Test.query.count() == 1
+
+
+class TestHistoryTests(BaseTestCase):
+    """Tests for GET /api/v1/tests/<name>/history"""
+
+    def setUp(self):
+        super(TestHistoryTests, self).setUp()
+        release = db.Release(version=30, support="RELEASE")
+        # Each run as (created, kernel, arch, passed, waived)
+        for created, kernel, arch, passed, waived in (
+            (datetime.datetime(2019, 5, 1, 9), "5.1.1", "x86_64", True, False),
+            (datetime.datetime(2019, 5, 1, 17), "5.1.1", "x86_64", False, False),
+            (datetime.datetime(2019, 5, 2, 9), "5.1.2", "x86_64", False, True),
+            (datetime.datetime(2019, 5, 6, 9), "5.1.2", "x86_64", True, False),
+            (datetime.datetime(2019, 5, 6, 9), "5.1.2", "aarch64", True, False),
+        ):
+            run = db.TestRun(
+                created=created,
+                kernel_version=kernel,
+                build_release="300.fc30",
+                arch=arch,
+                release=release,
+            )
+            db.Session.add(
+                db.Test(name="default/boot", passed=passed, waived=waived, run=run)
+            )
+            db.Session.add(db.Test(name="paxtest", passed=True, waived=False, run=run))
+        db.Session.commit()
+
+    def history(self, query=""):
+        result = self.flask_client.get("/api/v1/tests/default/boot/history?" + query)
+        assert result.status_code == 200
+        body = json.loads(result.get_data(as_text=True))
+        return {
+            (series["release"], series["arch"]): [
+                (p["bucket"], p["passed"], p["failed"], p["waived"])
+                for p in series["points"]
+            ]
+            for series in body["series"]
+        }
+
+    def test_by_day(self):
+        """Assert outcomes are counted per day by default."""
+        assert self.history() == {
+            (30, "aarch64"): [("2019-05-06", 1, 0, 0)],
+            (30, "x86_64"): [
+                ("2019-05-01", 1, 1, 0),
+                ("2019-05-02", 0, 0, 1),
+                ("2019-05-06", 1, 0, 0),
+            ],
+        }
+
+    def test_by_week(self):
+        """Assert days are rolled up into weeks starting on Monday."""
+        assert self.history("bucket=week&arch=x86_64") == {
+            (30, "x86_64"): [("2019-04-29", 1, 1, 1), ("2019-05-06", 1, 0, 0)]
+        }
+
+    def test_by_kernel(self):
+        """Assert outcomes can be counted per kernel build."""
+        assert self.history("bucket=kernel&arch=x86_64") == {
+            (30, "x86_64"): [("5.1.1-300.fc30", 1, 1, 0), ("5.1.2-300.fc30", 1, 0, 1)]
+        }
+
+    def test_release_filter(self):
+        """Assert other releases' runs are left out."""
+        assert self.history("release=31") == {}
+
+    def test_bad_bucket(self):
+        """Assert unknown buckets are rejected."""
+        result = self.flask_client.get("/api/v1/tests/paxtest/history?bucket=month")
+
+        assert result.status_code == 400
+
+    def test_ui(self):
+        """Assert the history page shows each release and architecture."""
+        result = self.flask_client.get("/tests/default/boot/history?bucket=kernel")
+        missing = self.flask_client.get("/tests/nonexistent/history")
+
+        assert result.status_code == 200
+        assert "Fedora 30 (aarch64)" in result.get_data(as_text=True)
+        assert "5.1.1-300.fc30" in result.get_data(as_text=True)
+        assert missing.status_code == 404
@@ -0,0 +1,133 @@
+"""Tests for :mod:`kerneltest.archive`"""
+import datetime
+import gzip
+import json
+import os
+import shutil
+import tempfile
+
+from kerneltest import archive, db
+from kerneltest.tests.base import BaseTestCase
+
+
+class ArchiveTests(BaseTestCase):
+    """Tests for archiving the test runs of retired releases."""
+
+    def setUp(self):
+        super(ArchiveTests, self).setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.flask_app.config["ARCHIVE_DIR"] = self.root
+        self.retired = db.Release(version=28, support="RETIRED")
+        self.maintained = db.Release(version=30, support="RELEASE")
+        for release, kernel, passed in (
+            (self.retired, "4.18.1", True),
+            (self.retired, "4.18.2", False),
+            (self.maintained, "5.1.2", True),
+        ):
+            run = db.TestRun(
+                created=datetime.datetime(2019, 5, 1),
+                kernel_version=kernel,
+                build_release="200.fc{}".format(release.version),
+                arch="x86_64",
+                release=release,
+            )
+            db.Session.add(
+                db.Test(name="boot", passed=passed, waived=False, run=run, details="ok")
+            )
+        db.Session.add(db.Job(build="kernel-4.18.1", release="Fedora28", arch="x86_64"))
+        db.Session.commit()
+        self.retired_ids = [
+            run_id
+            for run_id, in db.Session.query(db.TestRun.id)
+            .filter_by(fedora_version=28)
+            .order_by(db.TestRun.id)
+        ]
+        db.Job.query.one().test_run_id = self.retired_ids[0]
+        db.Session.commit()
+
+    def archive(self):
+        result = self.flask_app.test_cli_runner().invoke(
+            args=["archive-retired-releases"]
+        )
+        assert result.exit_code == 0, result.output
+        return result.output
+
+    def records(self):
+        with gzip.open(os.path.join(self.root, "fedora-28.ndjson.gz"), "rt") as fd:
+            return [json.loads(line) for line in fd]
+
+    def test_archive(self):
+        """Assert retired releases' runs are moved out of the database."""
+        output = self.archive()
+
+        assert output == "Archived 2 test runs of Fedora 28\n"
+        assert [r["kernel_version"] for r in self.records()] == ["4.18.1", "4.18.2"]
+        assert self.records()[1]["tests"][0]["passed"] is False
+        assert db.TestRun.query.one().fedora_version == 30
+        assert db.Test.query.count() == 1
+        assert db.Job.query.one().test_run_id is None
+
+    def test_archive_again(self):
+        """Assert runs uploaded after archiving are added to the same file."""
+        self.archive()
+        run = db.TestRun(
+            kernel_version="4.18.3",
+            build_release="200.fc28",
+            arch="x86_64",
+            fedora_version=28,
+        )
+        db.Session.add(run)
+        db.Session.commit()
+
+        output = self.archive()
+
+        assert output == "Archived 1 test runs of Fedora 28\n"
+        assert [r["kernel_version"] for r in self.records()] == [
+            "4.18.1",
+            "4.18.2",
+            "4.18.3",
+        ]
+
+    def test_interrupted(self):
+        """Assert runs already in the file aren't written twice."""
+        archive.Archive(self.root).store(db.Session(), self.retired)
+        db.Session.rollback()
+
+        self.archive()
+
+        assert len(self.records()) == 2
+        assert db.TestRun.query.count() == 1
+
+    def test_api(self):
+        """Assert archived runs are served by the results API."""
+        self.archive()
+
+        result = self.flask_client.get("/api/v1/results/?fedora_version=28&arch=x86_64")
+        failed = self.flask_client.get(
+            "/api/v1/results/?fedora_version=28&test=boot&test_result=failed"
+        )
+
+        body = json.loads(result.get_data(as_text=True))
+        assert body["total_items"] == 2
+        assert body["items"][0]["id"] == self.retired_ids[0]
+        assert body["items"][0]["tests"][0]["details"] == "ok"
+        assert [
+            i["kernel_version"]
+            for i in json.loads(failed.get_data(as_text=True))["items"]
+        ] == ["4.18.2"]
+
+    def test_ui(self):
+        """Assert archived runs are shown on the release, kernel and run pages."""
+        self.archive()
+
+        release = self.flask_client.get("/release/28")
+        kernel = self.flask_client.get("/kernel/4.18.2")
+        run = self.flask_client.get("/results/{}".format(self.retired_ids[1]))
+        missing = self.flask_client.get("/results/1000")
+
+        assert "4.18.1" in release.get_data(as_text=True)
+        assert kernel.status_code == 200
+        assert run.status_code == 200
+        assert "boot" in run.get_data(as_text=True)
+        assert missing.status_code == 404
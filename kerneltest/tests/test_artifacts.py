@@ -0,0 +1,275 @@
+"""Tests for uploading and serving artifacts."""
+import datetime
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from kerneltest import artifacts, db
+from kerneltest.tests.base import BaseTestCase
+from kerneltest.tests.test_api import mock_sends
+
+
+LOG = b"".join(b"[%8d] kernel: line %d\n" % (i, i) for i in range(4000))
+
+
+class ArtifactTests(BaseTestCase):
+    """Tests for the artifacts API and :mod:`kerneltest.artifacts`."""
+
+    def setUp(self):
+        super(ArtifactTests, self).setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.flask_app.config["ARTIFACT_DIR"] = self.root
+        db.Session.add(db.Release(version=30, support="RELEASE"))
+        db.Session.commit()
+        with mock_sends(object):
+            result = self.flask_client.post(
+                "/api/v1/results/",
+                json={
+                    "kernel_version": "5.1.2",
+                    "build_release": "300.fc30",
+                    "arch": "x86_64",
+                    "fedora_version": 30,
+                    "tests": [
+                        {
+                            "name": "Boot test",
+                            "passed": True,
+                            "waived": False,
+                            "details": "",
+                        }
+                    ],
+                },
+            )
+        assert result.status_code == 201
+        self.run = db.TestRun.query.one()
+
+    def create(self, content=LOG, **kwargs):
+        payload = {"test_run_id": self.run.id, "name": "dmesg.log"}
+        payload["length"] = len(content)
+        payload.update(kwargs)
+        result = self.flask_client.post("/api/v1/artifacts/", json=payload)
+        return result, json.loads(result.get_data(as_text=True))
+
+    def patch(self, artifact_id, offset, chunk):
+        return self.flask_client.patch(
+            "/api/v1/artifacts/{}".format(artifact_id),
+            data=chunk,
+            headers={
+                "Upload-Offset": str(offset),
+                "Content-Type": "application/offset+octet-stream",
+            },
+        )
+
+    def upload(self, content=LOG, chunk_size=40 * 1024, **kwargs):
+        result, artifact = self.create(content, **kwargs)
+        assert result.status_code == 201
+        for offset in range(0, len(content), chunk_size):
+            result = self.patch(
+                artifact["id"], offset, content[offset : offset + chunk_size]
+            )
+            assert result.status_code == 204
+        return db.Artifact.query.get(artifact["id"])
+
+    def age_files(self):
+        """Make every stored file older than the pruning grace period."""
+        mtime = time.time() - artifacts.PRUNE_GRACE - 1
+        for path, __, names in os.walk(self.root):
+            for name in names:
+                os.utime(os.path.join(path, name), (mtime, mtime))
+
+    def test_chunked_upload(self):
+        """Assert an artifact larger than MAX_CONTENT_LENGTH uploads in chunks."""
+        assert len(LOG) > self.flask_app.config["MAX_CONTENT_LENGTH"]
+
+        artifact = self.upload()
+
+        assert artifact.state == "complete"
+        assert artifact.received == len(LOG)
+        assert not os.listdir(os.path.join(self.root, "partial"))
+        with gzip.open(
+            os.path.join(
+                self.root, "objects", artifact.sha256[:2], artifact.sha256 + ".gz"
+            )
+        ) as fd:
+            assert fd.read() == LOG
+
+    def test_resume(self):
+        """Assert an interrupted upload resumes from the offset HEAD reports."""
+        __, artifact = self.create()
+        self.patch(artifact["id"], 0, LOG[:1000])
+
+        head = self.flask_client.head("/api/v1/artifacts/{}".format(artifact["id"]))
+        offset = int(head.headers["Upload-Offset"])
+        result = self.patch(artifact["id"], offset, LOG[offset:])
+
+        assert offset == 1000
+        assert head.headers["Upload-Length"] == str(len(LOG))
+        assert result.status_code == 204
+        assert result.headers["Upload-Offset"] == str(len(LOG))
+
+    def test_wrong_offset(self):
+        """Assert a chunk at the wrong offset is rejected with the right one."""
+        __, artifact = self.create()
+        self.patch(artifact["id"], 0, LOG[:1000])
+
+        result = self.patch(artifact["id"], 500, LOG[500:1500])
+
+        assert result.status_code == 409
+        assert result.headers["Upload-Offset"] == "1000"
+        assert db.Artifact.query.one().received == 1000
+
+    def test_chunk_too_large(self):
+        """Assert chunks past the declared length are rejected."""
+        __, artifact = self.create(b"short")
+
+        result = self.patch(artifact["id"], 0, b"much too long")
+
+        assert result.status_code == 413
+
+    def test_wrong_content_type(self):
+        """Assert chunks must be sent as application/offset+octet-stream."""
+        __, artifact = self.create()
+
+        result = self.flask_client.patch(
+            "/api/v1/artifacts/{}".format(artifact["id"]),
+            data=LOG[:10],
+            headers={"Upload-Offset": "0"},
+        )
+
+        assert result.status_code == 415
+
+    def test_other_user(self):
+        """Assert artifacts can't be added to other users' test runs."""
+        self.run.user = "jcline"
+        db.Session.commit()
+
+        result, __ = self.create()
+
+        assert result.status_code == 403
+
+    def test_test_not_in_run(self):
+        """Assert artifacts can only be linked to tests in the run."""
+        result, body = self.create(test_id=42)
+
+        assert result.status_code == 400
+        assert body == {"error": "test_id is not part of the test run"}
+
+    def test_identical_artifacts_stored_once(self):
+        """Assert artifacts with the same contents share one file."""
+        first = self.upload()
+        second = self.upload(test_id=self.run.tests[0].id)
+
+        assert first.sha256 == second.sha256
+        assert second.test_id == self.run.tests[0].id
+        assert os.listdir(os.path.join(self.root, "objects", first.sha256[:2])) == [
+            first.sha256 + ".gz"
+        ]
+
+    def test_download(self):
+        """Assert complete artifacts are served and linked from the results."""
+        artifact = self.upload()
+
+        result = self.flask_client.get("/artifacts/{}".format(artifact.id))
+        page = self.flask_client.get("/results/{}".format(self.run.id))
+
+        assert result.status_code == 200
+        assert result.get_data() == LOG
+        assert result.headers["ETag"] == '"{}"'.format(artifact.sha256)
+        assert "/artifacts/{}".format(artifact.id) in page.get_data(as_text=True)
+
+    def test_download_gzip(self):
+        """Assert clients that accept gzip get the stored file as-is."""
+        artifact = self.upload()
+
+        result = self.flask_client.get(
+            "/artifacts/{}".format(artifact.id), headers={"Accept-Encoding": "gzip"}
+        )
+
+        assert result.headers["Content-Encoding"] == "gzip"
+        assert gzip.decompress(result.get_data()) == LOG
+
+    def test_download_range(self):
+        """Assert a byte range of an artifact can be requested."""
+        artifact = self.upload()
+
+        result = self.flask_client.get(
+            "/artifacts/{}".format(artifact.id), headers={"Range": "bytes=100-199"}
+        )
+
+        assert result.status_code == 206
+        assert result.headers["Content-Range"] == "bytes 100-199/{}".format(len(LOG))
+        assert result.get_data() == LOG[100:200]
+
+    def test_download_range_unsatisfiable(self):
+        """Assert ranges past the end of the artifact are rejected."""
+        artifact = self.upload()
+
+        result = self.flask_client.get(
+            "/artifacts/{}".format(artifact.id),
+            headers={"Range": "bytes={}-".format(len(LOG) + 10)},
+        )
+
+        assert result.status_code == 416
+        assert result.headers["Content-Range"] == "bytes */{}".format(len(LOG))
+
+    def test_download_incomplete(self):
+        """Assert artifacts that are still uploading aren't served."""
+        __, artifact = self.create()
+
+        result = self.flask_client.get("/artifacts/{}".format(artifact["id"]))
+
+        assert result.status_code == 404
+
+    def test_abandoned_run_artifacts_pruned(self):
+        """Assert artifacts of abandoned runs are deleted, files and all."""
+        sha256 = self.upload().sha256
+        __, partial = self.create()
+        self.patch(partial["id"], 0, LOG[:1000])
+        self.run.state = "open"
+        self.run.updated = self.run.created = datetime.datetime(2019, 5, 1)
+        db.Session.commit()
+        self.age_files()
+
+        result = self.flask_app.test_cli_runner().invoke(args=["delete-abandoned-runs"])
+
+        assert result.output == (
+            "Deleted 1 abandoned test runs\nDeleted 2 unreferenced artifact files\n"
+        )
+        assert db.Artifact.query.count() == 0
+        assert not os.path.exists(
+            os.path.join(self.root, "partial", str(partial["id"]))
+        )
+        assert not os.path.exists(
+            os.path.join(self.root, "objects", sha256[:2], sha256 + ".gz")
+        )
+
+    def test_recent_files_not_pruned(self):
+        """Assert recently written files are kept, since the artifacts they
+        belong to may not be committed yet."""
+        sha256 = self.upload().sha256
+        __, partial = self.create()
+        self.patch(partial["id"], 0, LOG[:1000])
+        store = artifacts.ArtifactStore(self.root)
+
+        assert store.prune(set(), set()) == 0
+        assert os.path.exists(os.path.join(self.root, "partial", str(partial["id"])))
+        assert os.path.exists(
+            os.path.join(self.root, "objects", sha256[:2], sha256 + ".gz")
+        )
+
+    def test_reused_object_not_pruned(self):
+        """Assert an old object is kept once a new upload with its content
+        finishes."""
+        sha256 = self.upload().sha256
+        self.age_files()
+
+        self.upload()
+
+        store = artifacts.ArtifactStore(self.root)
+        assert store.prune(set(), set()) == 0
+        assert os.path.exists(
+            os.path.join(self.root, "objects", sha256[:2], sha256 + ".gz")
+        )
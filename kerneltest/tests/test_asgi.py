@@ -0,0 +1,267 @@
+"""Tests for :mod:`kerneltest.asgi`"""
+from unittest import mock
+import asyncio
+import copy
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from sqlalchemy import orm
+import sqlalchemy
+
+try:
+    import aiosqlite
+except ImportError:
+    aiosqlite = None
+
+from kerneltest import asgi, db, default_config
+from kerneltest.tests.base import BaseTestCase, FIXTURES
+
+
+class AsyncUrlTests(unittest.TestCase):
+    """Tests for :func:`kerneltest.asgi.async_url`"""
+
+    def test_postgresql(self):
+        """Assert PostgreSQL URLs use asyncpg, whatever driver they named."""
+        assert (
+            asgi.async_url("postgresql+psycopg2://user@host/kerneltest")
+            == "postgresql+asyncpg://user@host/kerneltest"
+        )
+
+    def test_sqlite(self):
+        """Assert SQLite URLs use aiosqlite."""
+        assert (
+            asgi.async_url("sqlite:////var/tmp/kerneltest.sqlite")
+            == "sqlite+aiosqlite:////var/tmp/kerneltest.sqlite"
+        )
+
+    def test_unknown(self):
+        """Assert URLs of other databases are left alone."""
+        assert asgi.async_url("mysql+aiomysql://host/db") == "mysql+aiomysql://host/db"
+
+
+async def _sync_query(self, function, *args):
+    """Run the queries with the test's session, which can't be used by asyncio."""
+    return function(db.Session(), *args)
+
+
+@mock.patch("kerneltest.asgi.ReadAPI._query", _sync_query)
+class ReadAPITests(BaseTestCase):
+    """Tests for :class:`kerneltest.asgi.ReadAPI`"""
+
+    def setUp(self):
+        super(ReadAPITests, self).setUp()
+        patcher = mock.patch("kerneltest.feed.Feed.start")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.flask_app.config["FEED_MAX_DURATION"] = 0
+        self.app = asgi.ReadAPI(self.flask_app, engine=None)
+        self.release = db.Release(version=30, support="RELEASE")
+        self.run = self.add_run("5.1.2")
+        db.Session.commit()
+
+    def add_run(self, kernel):
+        run = db.TestRun(
+            kernel_version=kernel,
+            build_release="300.fc30",
+            arch="x86_64",
+            release=self.release,
+        )
+        db.Session.add(db.Test(name="boot", passed=True, waived=False, run=run))
+        db.Session.add(run)
+        return run
+
+    def request(self, path, query_string="", method="GET", headers=(), during=None):
+        """
+        Make a request, returning its status, headers and body.
+
+        Args:
+            during (callable): Called once the first chunk of the body is sent.
+        """
+        messages = []
+
+        async def receive():
+            await asyncio.Event().wait()
+
+        async def send(message):
+            messages.append(message)
+            if message["type"] == "http.response.body" and len(messages) == 2:
+                if during:
+                    during()
+
+        scope = {
+            "type": "http",
+            "method": method,
+            "path": path,
+            "root_path": "",
+            "query_string": query_string.encode("latin-1"),
+            "headers": [(k.lower().encode(), v.encode()) for k, v in headers],
+        }
+        asyncio.run(self.app(scope, receive, send))
+        assert messages[0]["type"] == "http.response.start"
+        body = b"".join(m["body"] for m in messages[1:])
+        return messages[0]["status"], dict(messages[0]["headers"]), body
+
+    def test_results(self):
+        """Assert the results are the same as the Flask application's."""
+        status, headers, body = self.request(
+            "/api/v1/results/", "kernel_version=5.1.2&test=boot"
+        )
+        flask_body = self.flask_client.get(
+            "/api/v1/results/?kernel_version=5.1.2&test=boot"
+        ).get_data()
+
+        assert status == 200
+        assert headers[b"content-type"] == b"application/json"
+        assert json.loads(body) == json.loads(flask_body)
+        assert json.loads(body)["items"][0]["id"] == self.run.id
+
+    def test_history(self):
+        """Assert test names with slashes are routed to the history."""
+        status, __, body = self.request("/api/v1/tests/boot/x/history")
+
+        assert status == 200
+        assert json.loads(body) == {"name": "boot/x", "bucket": "day", "series": []}
+
+    def test_latency(self):
+        """Assert the harness's latency is served."""
+        status, __, body = self.request("/api/v1/latency/", "days=7")
+
+        assert status == 200
+        assert json.loads(body)["items"] == []
+
+    def test_invalid_arguments(self):
+        """Assert arguments are validated like the Flask application's."""
+        status, __, body = self.request("/api/v1/results/", "fedora_version=thirty")
+
+        assert status == 400
+        assert "fedora_version" in json.loads(body)["message"]
+
+    def test_not_found(self):
+        """Assert endpoints that aren't read-only aren't served."""
+        status, __, __ = self.request("/api/v1/jobs/lease")
+
+        assert status == 404
+
+    def test_method_not_allowed(self):
+        """Assert uploads aren't accepted."""
+        status, headers, __ = self.request("/api/v1/results/", method="POST")
+
+        assert status == 405
+        assert headers[b"allow"] == b"GET, HEAD"
+
+    def test_head(self):
+        """Assert HEAD requests get the headers without the body."""
+        status, headers, body = self.request("/api/v1/results/", method="HEAD")
+
+        assert status == 200
+        assert int(headers[b"content-length"]) > 0
+        assert body == b""
+
+    def test_feed_resume(self):
+        """Assert reconnecting feed clients are sent the runs they missed."""
+        status, headers, body = self.request(
+            "/api/v1/results/feed", headers=[("Last-Event-ID", str(self.run.id - 1))]
+        )
+
+        assert status == 200
+        assert headers[b"content-type"].startswith(b"text/event-stream")
+        assert "id: {}\n".format(self.run.id) in body.decode("utf-8")
+
+    def test_feed_live(self):
+        """Assert feed clients are woken up once runs are finalized."""
+        self.flask_app.config["FEED_MAX_DURATION"] = 5
+        feed = self.flask_app.extensions["results_feed"]
+        feed.poll(db.Session())
+        run = self.add_run("5.1.3")
+        db.Session.commit()
+
+        def finalize():
+            feed.poll(db.Session())
+
+        __, __, body = self.request("/api/v1/results/feed", during=finalize)
+
+        assert body.decode("utf-8").startswith(": connected\n\nid: {}\n".format(run.id))
+        assert feed._listeners == set()
+
+    def test_feed_disconnect(self):
+        """Assert feed clients stop being sent events once they disconnect."""
+        self.flask_app.config["FEED_MAX_DURATION"] = 300
+        feed = self.flask_app.extensions["results_feed"]
+        messages = []
+
+        async def receive():
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": "/api/v1/results/feed",
+            "query_string": b"",
+            "headers": [],
+        }
+        asyncio.run(asyncio.wait_for(self.app(scope, receive, send), 5))
+
+        assert messages[0]["status"] == 200
+        assert feed._listeners == set()
+
+
+@unittest.skipIf(
+    asgi.create_async_engine is None or aiosqlite is None,
+    "The async extra's dependencies and aiosqlite are not installed",
+)
+class AsyncEngineTests(unittest.TestCase):
+    """Tests for the read API with an asyncio database engine."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.config = copy.deepcopy(default_config.DEFAULTS)
+        self.config["OIDC_CLIENT_SECRETS"] = os.path.join(
+            FIXTURES, "client_secrets.json"
+        )
+        self.config["DB_URL"] = "sqlite:///" + os.path.join(directory, "db.sqlite")
+        # The asyncio engine only sees committed data, in its own database
+        engine = sqlalchemy.create_engine(self.config["DB_URL"])
+        db.models.Base.metadata.create_all(engine)
+        session = orm.Session(bind=engine)
+        release = db.Release(version=30, support="RELEASE")
+        for kernel, passed in (("5.1.2", True), ("5.1.3", False)):
+            run = db.TestRun(
+                kernel_version=kernel,
+                build_release="300.fc30",
+                arch="x86_64",
+                release=release,
+            )
+            session.add(db.Test(name="boot", passed=passed, waived=False, run=run))
+        session.commit()
+        session.close()
+        engine.dispose()
+
+    def test_results(self):
+        """Assert results are queried with the session the engine runs them in."""
+        read_api = asgi.create(self.config)
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": "/api/v1/results/",
+            "query_string": b"test=boot&test_result=failed",
+            "headers": [],
+        }
+        with mock.patch("kerneltest.db.Session", side_effect=AssertionError):
+            asyncio.run(read_api(scope, None, send))
+
+        assert messages[0]["status"] == 200
+        body = json.loads(messages[1]["body"])
+        assert body["total_items"] == 1
+        assert body["items"][0]["kernel_version"] == "5.1.3"
@@ -0,0 +1,149 @@
+"""Tests for :mod:`kerneltest.cache`"""
+from unittest import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+import flask
+
+from kerneltest import cache, db
+from kerneltest.tests.base import BaseTestCase
+
+
+class RenderCacheTests(unittest.TestCase):
+    """Tests for :class:`kerneltest.cache.RenderCache`"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_lru(self):
+        """Assert the least recently used pages are evicted past the size limit."""
+        pages = cache.RenderCache(max_size=10)
+        pages.set(("a",), "aaaa")
+        pages.set(("b",), "bbbb")
+        pages.get(("a",))
+
+        pages.set(("c",), "cccc")
+
+        assert pages.get(("a",)) == "aaaa"
+        assert pages.get(("b",)) is None
+        assert pages.get(("c",)) == "cccc"
+
+    def test_too_large(self):
+        """Assert pages larger than the whole cache aren't cached."""
+        pages = cache.RenderCache(max_size=10)
+
+        pages.set(("a",), "a" * 11)
+
+        assert pages.get(("a",)) is None
+
+    def test_disk(self):
+        """Assert pages on disk are shared between caches."""
+        cache.RenderCache(10, self.directory, 100).set(("a",), "aaaa")
+
+        assert cache.RenderCache(10, self.directory, 100).get(("a",)) == "aaaa"
+
+    def test_disk_pruned(self):
+        """Assert the oldest pages on disk are removed past the size limit."""
+        pages = cache.RenderCache(10, self.directory, 10)
+        pages.set(("a",), "aaaa")
+        os.utime(os.path.join(self.directory, os.listdir(self.directory)[0]), (0, 0))
+        pages.set(("b",), "bbbb")
+
+        pages.set(("c",), "cccc")
+
+        assert len(os.listdir(self.directory)) == 2
+        assert cache.RenderCache(10, self.directory, 10).get(("a",)) is None
+
+
+class CachedPagesTests(BaseTestCase):
+    """Tests for caching the rendered result pages."""
+
+    def setUp(self):
+        super(CachedPagesTests, self).setUp()
+        self.run = db.TestRun(
+            kernel_version="5.1.2",
+            build_release="300.fc30",
+            arch="x86_64",
+            release=db.Release(version=30, support="RELEASE"),
+        )
+        db.Session.add(db.Test(name="boot", passed=True, waived=False, run=self.run))
+        db.Session.commit()
+        patcher = mock.patch(
+            "kerneltest.ui_view.flask.render_template", wraps=flask.render_template
+        )
+        self.render = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_results_cached(self):
+        """Assert a finalized test run's page is only rendered once."""
+        first = self.flask_client.get("/results/{}".format(self.run.id))
+        second = self.flask_client.get("/results/{}".format(self.run.id))
+
+        assert first.get_data() == second.get_data()
+        assert self.render.call_count == 1
+
+    def test_results_artifact(self):
+        """Assert a test run's page is rendered again once it has a new artifact."""
+        self.flask_client.get("/results/{}".format(self.run.id))
+        db.Session.add(
+            db.Artifact(
+                name="dmesg.log", length=0, state="complete", sha256="0", run=self.run
+            )
+        )
+        db.Session.commit()
+
+        result = self.flask_client.get("/results/{}".format(self.run.id))
+
+        assert self.render.call_count == 2
+        assert "dmesg.log" in result.get_data(as_text=True)
+
+    def test_release_edited(self):
+        """Assert pages are rendered again once a release's support changes,
+        whichever process changed it."""
+        self.flask_client.get("/results/{}".format(self.run.id))
+        db.Release.query.filter_by(version=30).update({"support": "RETIRED"})
+        db.Session.commit()
+
+        self.flask_client.get("/results/{}".format(self.run.id))
+
+        assert self.render.call_count == 2
+
+    def test_open_results_not_cached(self):
+        """Assert the pages of open test runs aren't cached."""
+        self.run.state = "open"
+        db.Session.commit()
+
+        self.flask_client.get("/results/{}".format(self.run.id))
+        self.flask_client.get("/results/{}".format(self.run.id))
+
+        assert self.render.call_count == 2
+
+    def test_missing_results_not_cached(self):
+        """Assert 404 responses aren't cached."""
+        self.flask_client.get("/results/1000")
+        result = self.flask_client.get("/results/1000")
+
+        assert result.status_code == 404
+
+    def test_kernel_new_run(self):
+        """Assert a kernel's pages are rendered again once it has a new run."""
+        self.flask_client.get("/kernel/5.1.2")
+        self.flask_client.get("/kernel/5.1.2?page=1")
+        self.flask_client.get("/kernel/5.1.2")
+        db.Session.add(
+            db.TestRun(
+                kernel_version="5.1.2",
+                build_release="300.fc30",
+                arch="aarch64",
+                fedora_version=30,
+            )
+        )
+        db.Session.commit()
+
+        result = self.flask_client.get("/kernel/5.1.2")
+
+        assert self.render.call_count == 3
+        assert result.get_data(as_text=True).count("test results") == 2
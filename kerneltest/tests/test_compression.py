@@ -0,0 +1,145 @@
+"""Tests for :mod:`kerneltest.compression`"""
+from unittest import mock
+import gzip
+import io
+import json
+import tracemalloc
+import zlib
+
+from kerneltest import app, compression, db
+from kerneltest.tests.base import BaseTestCase
+from kerneltest.tests.test_api import mock_sends
+
+
+class CompressionTests(BaseTestCase):
+    """Tests for :class:`kerneltest.compression.CompressionMiddleware`"""
+
+    def setUp(self):
+        super(CompressionTests, self).setUp()
+        db.Session.add(db.Release(version=30, support="RELEASE"))
+        db.Session.commit()
+        self.run = {
+            "kernel_version": "5.1.2",
+            "build_release": "300.fc30",
+            "arch": "x86_64",
+            "fedora_version": 30,
+            "tests": [
+                {
+                    "name": "Test {}".format(i),
+                    "passed": True,
+                    "waived": False,
+                    "details": "All good " * 80,
+                }
+                for i in range(50)
+            ],
+        }
+
+    def post(self, body, encoding="gzip"):
+        return self.flask_client.post(
+            "/api/v1/results/",
+            data=body,
+            headers={"Content-Type": "application/json", "Content-Encoding": encoding},
+        )
+
+    def test_gzip_request(self):
+        """Assert gzipped uploads larger than MAX_CONTENT_LENGTH are accepted."""
+        body = json.dumps(self.run).encode("utf-8")
+        assert len(body) > self.flask_app.config["MAX_CONTENT_LENGTH"]
+
+        with mock_sends(object):
+            result = self.post(gzip.compress(body))
+
+        assert result.status_code == 201
+        assert db.Test.query.count() == 50
+
+    def test_decompression_bomb(self):
+        """Assert bodies that decompress past the limit are rejected."""
+        self.flask_app.config["MAX_DECOMPRESSED_LENGTH"] = 1024 * 1024
+        bomb = gzip.compress(b" " * (2 * 1024 * 1024))
+        assert len(bomb) < 1024 * 1024
+
+        result = self.post(bomb)
+
+        assert result.status_code == 413
+        assert db.TestRun.query.count() == 0
+
+    def test_decompression_bomb_memory(self):
+        """Assert a bomb is rejected without ever being expanded in memory."""
+        limit = 1024 * 1024
+        bomb = zlib.compress(b"\0" * (256 * limit))
+        assert len(bomb) < compression.BLOCK_SIZE * 5
+        tracemalloc.start()
+        self.addCleanup(tracemalloc.stop)
+
+        with self.assertRaises(compression.BodyTooLarge):
+            compression.decompress(io.BytesIO(bomb), compression._gunzip, limit)
+
+        assert tracemalloc.get_traced_memory()[1] < 8 * limit
+
+    def test_corrupt_request(self):
+        """Assert bodies that aren't valid gzip are rejected."""
+        result = self.post(gzip.compress(b'{"arch": "x86_64"}')[:-8] + b"junk")
+
+        assert result.status_code == 400
+        assert json.loads(result.get_data(as_text=True)) == {
+            "error": "the request body could not be decompressed"
+        }
+
+    def test_truncated_request(self):
+        """Assert bodies that stop part-way through are rejected."""
+        result = self.post(gzip.compress(json.dumps(self.run).encode("utf-8"))[:100])
+
+        assert result.status_code == 400
+
+    def test_unsupported_encoding(self):
+        """Assert unknown encodings are rejected with the supported ones."""
+        result = self.post(b"...", encoding="br")
+
+        assert result.status_code == 415
+        assert "gzip" in result.headers["Accept-Encoding"]
+
+    def test_gzip_response(self):
+        """Assert large responses are compressed for clients that accept it."""
+        with mock_sends(object):
+            self.post(gzip.compress(json.dumps(self.run).encode("utf-8")))
+
+        result = self.flask_client.get(
+            "/api/v1/results/", headers={"Accept-Encoding": "gzip, deflate"}
+        )
+
+        assert result.status_code == 200
+        assert result.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in result.headers["Vary"]
+        assert "Content-Length" not in result.headers
+        body = json.loads(zlib.decompress(result.get_data(), 16 + zlib.MAX_WBITS))
+        assert len(body["items"][0]["tests"]) == 50
+
+    def test_identity_response(self):
+        """Assert responses aren't compressed unless the client asks."""
+        result = self.flask_client.get(
+            "/api/v1/results/", headers={"Accept-Encoding": "gzip;q=0"}
+        )
+
+        assert "Content-Encoding" not in result.headers
+        assert json.loads(result.get_data(as_text=True))["items"] == []
+
+    def test_small_response(self):
+        """Assert responses too small to be worth it aren't compressed."""
+        result = self.flask_client.get(
+            "/api/v1/results/", headers={"Accept-Encoding": "gzip"}
+        )
+
+        assert "Content-Encoding" not in result.headers
+
+    def test_event_stream(self):
+        """Assert streamed events aren't compressed, which would delay them."""
+        self.config.update(COMPRESSION_MIN_SIZE=0, FEED_MAX_DURATION=0, FEED_WSGI=True)
+        flask_app = app.create(config=self.config)
+        flask_app.teardown_request_funcs = {}
+
+        with mock.patch("kerneltest.feed.Feed.start"):
+            result = flask_app.test_client().get(
+                "/api/v1/results/feed", headers={"Accept-Encoding": "gzip"}
+            )
+
+        assert "Content-Encoding" not in result.headers
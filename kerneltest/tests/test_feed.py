@@ -0,0 +1,181 @@
+"""Tests for :mod:`kerneltest.feed`"""
+from unittest import mock
+import json
+
+from kerneltest import app, db
+from kerneltest.tests.base import BaseTestCase
+
+
+class ResultsFeedTests(BaseTestCase):
+    """Tests for the server-sent events feed of finalized test runs."""
+
+    def setUp(self):
+        super(ResultsFeedTests, self).setUp()
+        self.config["FEED_WSGI"] = True
+        self.flask_app = app.create(config=self.config)
+        self.flask_app.teardown_request_funcs = {}
+        self.flask_client = self.flask_app.test_client()
+        # The tests poll the feed themselves, with the test's session
+        patcher = mock.patch("kerneltest.feed.Feed.start")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.flask_app.config["FEED_MAX_DURATION"] = 0
+        self.feed = self.flask_app.extensions["results_feed"]
+        self.release = db.Release(version=30, support="RELEASE")
+        self.first = self.add_run("5.1.2")
+        db.Session.commit()
+        self.feed.poll(db.Session())
+
+    def add_run(self, kernel, state="finalized", arch="x86_64"):
+        run = db.TestRun(
+            kernel_version=kernel,
+            build_release="300.fc30",
+            arch=arch,
+            state=state,
+            release=self.release,
+        )
+        db.Session.add(db.Test(name="boot", passed=False, waived=False, run=run))
+        db.Session.add(run)
+        return run
+
+    def events(self, response):
+        """Parse the events out of a stream."""
+        assert response.status_code == 200
+        assert response.mimetype == "text/event-stream"
+        events = []
+        for block in response.get_data(as_text=True).split("\n\n"):
+            fields = dict(
+                line.split(": ", 1) for line in block.splitlines() if line[:1] != ":"
+            )
+            if fields:
+                assert fields["id"] == str(json.loads(fields["data"])["id"])
+                events.append(json.loads(fields["data"]))
+        return events
+
+    def test_live(self):
+        """Assert runs finalized while a client is connected are streamed."""
+        response = self.flask_client.get("/api/v1/results/feed", buffered=False)
+        run = self.add_run("5.1.3")
+        db.Session.commit()
+        self.feed.poll(db.Session())
+
+        events = self.events(response)
+
+        assert events == [
+            {
+                "id": run.id,
+                "created": run.created.isoformat(),
+                "arch": "x86_64",
+                "kernel_version": "5.1.3",
+                "build_release": "300.fc30",
+                "fedora_version": 30,
+                "tests": 1,
+                "failed": ["boot"],
+            }
+        ]
+
+    def test_keepalive(self):
+        """Assert a comment is sent if nothing is finalized."""
+        response = self.flask_client.get("/api/v1/results/feed")
+
+        assert response.get_data(as_text=True) == ": connected\n\n: keepalive\n\n"
+
+    def test_finalized_later(self):
+        """Assert runs are streamed once they're finalized, not once opened."""
+        run = self.add_run("5.1.3", state="open")
+        db.Session.commit()
+        self.feed.poll(db.Session())
+        later = self.add_run("5.1.4")
+        db.Session.commit()
+        self.feed.poll(db.Session())
+        response = self.flask_client.get("/api/v1/results/feed", buffered=False)
+        run.state = "finalized"
+        db.Session.commit()
+        self.feed.poll(db.Session())
+
+        assert [e["id"] for e in self.events(response)] == [run.id]
+        assert later.id > run.id
+
+    def test_committed_out_of_order(self):
+        """Assert a run committed after one with a higher ID is still streamed."""
+        response = self.flask_client.get("/api/v1/results/feed", buffered=False)
+        later = self.add_run("5.1.4")
+        later.id = self.first.id + 2
+        db.Session.commit()
+        self.feed.poll(db.Session())
+        run = self.add_run("5.1.3")
+        run.id = self.first.id + 1
+        db.Session.commit()
+        self.feed.poll(db.Session())
+
+        assert [e["id"] for e in self.events(response)] == [later.id, run.id]
+
+    def test_gap_expires(self):
+        """Assert IDs that never appear stop being watched."""
+        self.add_run("5.1.4").id = self.first.id + 2
+        db.Session.commit()
+        self.feed.poll(db.Session())
+        assert list(self.feed._gaps) == [self.first.id + 1]
+
+        self.feed._gaps[self.first.id + 1] = 0
+        self.feed.poll(db.Session())
+
+        assert self.feed._gaps == {}
+
+    def test_resume(self):
+        """Assert reconnecting clients are sent the runs they missed first."""
+        second = self.add_run("5.1.3")
+        self.add_run("5.1.4", state="open")
+        db.Session.commit()
+
+        response = self.flask_client.get(
+            "/api/v1/results/feed", headers={"Last-Event-ID": str(self.first.id)}
+        )
+        since = self.flask_client.get(
+            "/api/v1/results/feed?since={}".format(self.first.id - 1)
+        )
+
+        assert [e["id"] for e in self.events(response)] == [second.id]
+        assert [e["id"] for e in self.events(since)] == [self.first.id, second.id]
+
+    def test_resume_not_repeated(self):
+        """Assert runs sent while catching up aren't sent again by the feed."""
+        second = self.add_run("5.1.3")
+        db.Session.commit()
+        response = self.flask_client.get(
+            "/api/v1/results/feed",
+            headers={"Last-Event-ID": str(self.first.id)},
+            buffered=False,
+        )
+        self.feed.poll(db.Session())
+
+        assert [e["id"] for e in self.events(response)] == [second.id]
+
+    def test_filters(self):
+        """Assert clients can stream only some releases' or arches' runs."""
+        response = self.flask_client.get(
+            "/api/v1/results/feed?arch=aarch64&fedora_version=30", buffered=False
+        )
+        self.add_run("5.1.3")
+        run = self.add_run("5.1.3", arch="aarch64")
+        db.Session.commit()
+        self.feed.poll(db.Session())
+
+        assert [e["id"] for e in self.events(response)] == [run.id]
+
+    def test_not_routed(self):
+        """Assert the feed isn't served by WSGI servers unless it's enabled."""
+        self.config["FEED_WSGI"] = False
+        flask_app = app.create(config=self.config)
+
+        response = flask_app.test_client().get("/api/v1/results/feed")
+
+        assert response.status_code == 404
+
+    def test_bad_last_event_id(self):
+        """Assert an invalid Last-Event-ID header is rejected."""
+        response = self.flask_client.get(
+            "/api/v1/results/feed", headers={"Last-Event-ID": "x"}
+        )
+
+        assert response.status_code == 400
@@ -0,0 +1,475 @@
+"""Unit tests for :mod:`kerneltest.harness`, run against libvirt's test driver."""
+from concurrent import futures
+from unittest import mock
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+try:
+    import libvirt
+    from kerneltest import harness, placement
+except ImportError:
+    libvirt = None
+
+TEST_URI = "test:///default"
+
+if libvirt is not None:
+    BUILD1 = harness.Build("kernel-5.1.0-300.fc30", "Fedora30")
+    BUILD2 = harness.Build("kernel-5.1.1-300.fc30", "Fedora30")
+    BUILD3 = harness.Build("kernel-5.1.2-300.fc30", "Fedora30")
+
+
+def define_guest(conn, name, memory=1024 * 1024, vcpus=1):
+    """Define a shut off domain on the test driver."""
+    return conn.defineXML(
+        "<domain type='test'><name>{}</name><memory>{}</memory>"
+        "<vcpu>{}</vcpu><os><type>hvm</type></os></domain>".format(name, memory, vcpus)
+    )
+
+
+def wait_for(predicate, timeout=5):
+    """Poll ``predicate`` until it's true or ``timeout`` seconds pass."""
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out waiting for {}".format(predicate))
+        time.sleep(0.01)
+
+
+@unittest.skipIf(libvirt is None, "libvirt-python is not installed")
+class HarnessTestCase(unittest.TestCase):
+    """Base class that resets the test driver's "test" domain to running."""
+
+    def setUp(self):
+        harness.start_event_loop()
+        self.conn = libvirt.open(TEST_URI)
+        self.dom = self.conn.lookupByName("test")
+        if not self.dom.isActive():
+            self.dom.create()
+        self.latest_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.latest_dir)
+        patcher = mock.patch.dict(
+            harness.config, {"HARNESS_LATEST_DIR": self.latest_dir}
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def latest(self, release="Fedora30"):
+        """Return the build recorded for a release's guests."""
+        with open(os.path.join(self.latest_dir, release)) as fd:
+            return fd.read()
+
+    def tearDown(self):
+        self.conn.close()
+
+
+class ConnectionPoolTests(HarnessTestCase):
+    """Tests for :class:`kerneltest.harness.ConnectionPool`."""
+
+    def test_reuses_connections(self):
+        """Assert connections are returned to the pool and reused."""
+        pool = harness.ConnectionPool(TEST_URI, size=1)
+
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            pass
+
+        assert first is second
+        pool.close()
+
+    def test_broken_connection_discarded(self):
+        """Assert a connection that raised a libvirt error is not reused."""
+        pool = harness.ConnectionPool(TEST_URI, size=1)
+
+        with self.assertRaises(libvirt.libvirtError):
+            with pool.connection() as first:
+                first.lookupByName("no-such-domain")
+        with pool.connection() as second:
+            pass
+
+        assert first is not second
+        pool.close()
+
+
+class LifecycleMonitorTests(HarnessTestCase):
+    """Tests for :class:`kerneltest.harness.LifecycleMonitor`."""
+
+    def setUp(self):
+        super(LifecycleMonitorTests, self).setUp()
+        self.monitor = harness.LifecycleMonitor(TEST_URI)
+        self.monitor.start()
+        self.addCleanup(self.monitor.close)
+
+    def test_stopped_event(self):
+        """Assert the callback runs as soon as the domain stops."""
+        callback = mock.Mock()
+        self.monitor.watch("test", callback, 60)
+
+        self.dom.destroy()
+        wait_for(lambda: callback.called)
+
+        callback.assert_called_once_with(False)
+        assert self.monitor.watching() == set()
+
+    def test_timeout(self):
+        """Assert the callback runs when the domain does not stop in time."""
+        callback = mock.Mock()
+        self.monitor.watch("test", callback, 0.05)
+
+        wait_for(lambda: callback.called)
+
+        callback.assert_called_once_with(True)
+        assert self.dom.isActive()
+
+    def test_unwatch(self):
+        """Assert cancelled watches never call back."""
+        callback = mock.Mock()
+        self.monitor.watch("test", callback, 0.05)
+
+        assert self.monitor.unwatch("test") is True
+        assert self.monitor.unwatch("test") is False
+        self.dom.destroy()
+        time.sleep(0.1)
+
+        callback.assert_not_called()
+
+
+class SchedulerTests(HarnessTestCase):
+    """Tests for :class:`kerneltest.harness.Scheduler`."""
+
+    def scheduler(self, placer_kwargs=None, **kwargs):
+        monitor = harness.LifecycleMonitor(TEST_URI)
+        monitor.start()
+        host = placement.Host(harness.ConnectionPool(TEST_URI), monitor)
+        placer = placement.Placer([host], **(placer_kwargs or {}))
+        scheduler = harness.Scheduler(placer, **kwargs)
+        self.addCleanup(scheduler.shutdown)
+        return scheduler
+
+    def test_launch_shutoff_domain(self):
+        """Assert a domain that is already shut off is started immediately."""
+        scheduler = self.scheduler(max_workers=1)
+        self.dom.destroy()
+
+        scheduler.submit("test", BUILD1)
+        wait_for(scheduler.idle)
+
+        assert self.dom.isActive()
+
+    def test_launch_after_shutoff(self):
+        """Assert a launch waits without a worker and starts on shutoff."""
+        scheduler = self.scheduler(max_workers=1)
+
+        scheduler.submit("test", BUILD1)
+        wait_for(lambda: scheduler.waiting() == {"test"})
+        assert self.dom.isActive()
+        self.dom.destroy()
+        wait_for(scheduler.idle)
+
+        assert self.dom.isActive()
+
+    def test_stuck_domain_forced_off(self):
+        """Assert a domain that never shuts off is restarted after the timeout."""
+        scheduler = self.scheduler(max_workers=1, shutoff_timeout=0.05)
+        events = []
+        self.conn.domainEventRegisterAny(
+            self.dom,
+            libvirt.VIR_DOMAIN_EVENT_ID_LIFECYCLE,
+            lambda conn, dom, event, detail, opaque: events.append(event),
+            None,
+        )
+
+        scheduler.submit("test", BUILD1)
+        wait_for(scheduler.idle)
+
+        assert self.dom.isActive()
+        wait_for(lambda: libvirt.VIR_DOMAIN_EVENT_STARTED in events)
+        assert libvirt.VIR_DOMAIN_EVENT_STOPPED in events
+
+    def test_launches_serialized_per_domain(self):
+        """Assert a second launch of a busy domain waits in the queue."""
+        scheduler = self.scheduler(max_workers=2)
+
+        scheduler.submit("test", BUILD1)
+        wait_for(lambda: scheduler.waiting() == {"test"})
+        assert scheduler.queue_depth() == 1
+        assert scheduler.pending_builds() == {"test": BUILD1}
+
+        self.dom.destroy()
+        wait_for(scheduler.idle)
+        assert self.dom.isActive()
+        assert self.latest() == BUILD1.nvr
+
+        scheduler.submit("test", BUILD2)
+        wait_for(lambda: scheduler.waiting() == {"test"})
+        assert scheduler.pending_builds() == {"test": BUILD2}
+        self.dom.destroy()
+        wait_for(scheduler.idle)
+        assert self.latest() == BUILD2.nvr
+
+    def test_superseded_builds_coalesce(self):
+        """Assert only the newest of several pending builds is tested."""
+        scheduler = self.scheduler(max_workers=2)
+
+        scheduler.submit("test", BUILD1)
+        scheduler.submit("test", BUILD2)
+        scheduler.submit("test", BUILD3)
+        wait_for(lambda: scheduler.waiting() == {"test"})
+        assert scheduler.queue_depth() == 1
+        assert scheduler.pending_builds() == {"test": BUILD3}
+
+        self.dom.destroy()
+        wait_for(scheduler.idle)
+
+        assert self.dom.isActive()
+        assert self.latest() == BUILD3.nvr
+        assert scheduler.waiting() == set()
+
+    def test_duplicate_build_ignored(self):
+        """Assert a build the guest is already testing is not launched again."""
+        scheduler = self.scheduler(max_workers=1)
+        self.dom.destroy()
+        scheduler.submit("test", BUILD1)
+        wait_for(scheduler.idle)
+
+        scheduler.submit("test", BUILD1)
+
+        assert scheduler.idle()
+
+    def test_cancel_policy(self):
+        """Assert the cancel policy restarts a guest testing a superseded build."""
+        scheduler = self.scheduler(max_workers=1, policy="cancel")
+        self.dom.destroy()
+        scheduler.submit("test", BUILD1)
+        wait_for(scheduler.idle)
+        assert self.latest() == BUILD1.nvr
+
+        scheduler.submit("test", BUILD2)
+        wait_for(scheduler.idle)
+
+        assert self.dom.isActive()
+        assert self.latest() == BUILD2.nvr
+
+    def test_launch_deferred_until_room(self):
+        """Assert a launch no host has room for waits for a domain to stop."""
+        scheduler = self.scheduler(
+            placer_kwargs={"max_domains": 1}, max_workers=1, retry_interval=60
+        )
+        guest = define_guest(self.conn, "Fedora30_64")
+        self.addCleanup(guest.undefine)
+
+        scheduler.submit("Fedora30_64", BUILD1)
+        wait_for(lambda: scheduler.deferred() == {"Fedora30_64"})
+        assert not guest.isActive()
+
+        self.dom.destroy()
+        wait_for(scheduler.idle)
+        assert guest.isActive()
+        guest.destroy()
+
+    def test_records_jobs(self):
+        """Assert the scheduler records each job's progress in the store."""
+        store = mock.Mock()
+        scheduler = self.scheduler(max_workers=1, store=store)
+        self.dom.destroy()
+
+        scheduler.submit("test", BUILD1)
+        wait_for(scheduler.idle)
+        self.dom.destroy()
+        wait_for(lambda: store.transition.call_count == 2)
+
+        store.queue.assert_called_once_with("test", BUILD1)
+        store.transition.assert_has_calls(
+            [
+                mock.call("test", BUILD1, "started"),
+                mock.call("test", BUILD1, "finished", ("started",)),
+            ]
+        )
+
+    def test_resume(self):
+        """Assert queued jobs are submitted again when the scheduler resumes."""
+        store = mock.Mock()
+        store.unfinished.return_value = [
+            ("test", BUILD1, "started"),
+            ("test", BUILD2, "queued"),
+        ]
+        scheduler = self.scheduler(max_workers=1, store=store)
+
+        scheduler.resume()
+        wait_for(lambda: scheduler.waiting() == {"test"})
+        self.dom.destroy()
+        wait_for(scheduler.idle)
+
+        assert self.latest() == BUILD2.nvr
+        store.transition.assert_any_call("test", BUILD1, "finished", ("started",))
+
+    def test_bad_policy(self):
+        """Assert unknown superseded-build policies are rejected."""
+        with self.assertRaises(ValueError):
+            harness.Scheduler(None, policy="ignore")
+
+
+class WriteLatestTests(HarnessTestCase):
+    """Tests for :func:`kerneltest.harness.write_latest`."""
+
+    def test_correlation_id(self):
+        """Assert the build's correlation ID is written next to it."""
+        harness.write_latest(BUILD1._replace(correlation_id="abc"))
+
+        assert self.latest() == BUILD1.nvr
+        with open(os.path.join(self.latest_dir, "Fedora30.correlation_id")) as fd:
+            assert fd.read() == "abc"
+
+    def test_stale_correlation_id_removed(self):
+        """Assert a build without a correlation ID removes the old one."""
+        harness.write_latest(BUILD1._replace(correlation_id="abc"))
+        harness.write_latest(BUILD2)
+
+        assert self.latest() == BUILD2.nvr
+        assert not os.path.exists(
+            os.path.join(self.latest_dir, "Fedora30.correlation_id")
+        )
+
+
+class InlineExecutor(object):
+    """An executor that runs what it's given straight away."""
+
+    def submit(self, fn, *args):
+        future = futures.Future()
+        future.set_result(fn(*args))
+        return future
+
+
+@unittest.skipIf(libvirt is None, "libvirt-python is not installed")
+class CallbackTests(unittest.TestCase):
+    """Tests for :func:`kerneltest.harness.callback`."""
+
+    def setUp(self):
+        patcher = mock.patch(
+            "kerneltest.harness.get_dispatcher", return_value=InlineExecutor()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @mock.patch("kerneltest.harness.get_scheduler")
+    def test_ignores_started_builds(self, mock_get_scheduler):
+        """Assert messages about builds that just started are ignored."""
+        message = mock.Mock(body={"new": 0, "name": "kernel"})
+
+        harness.callback(message)
+
+        mock_get_scheduler.assert_not_called()
+
+    @mock.patch("kerneltest.harness.get_scheduler")
+    def test_submits_both_guests(self, mock_get_scheduler):
+        """Assert completed kernel builds are queued on the release's guests."""
+        message = mock.Mock(
+            id="8b0e9c63-3a5e-4f4c-9d2b-1e2f3a4b5c6d",
+            body={
+                "new": 1,
+                "name": "kernel",
+                "version": "5.1.0",
+                "release": "300.fc30",
+            },
+        )
+        build = BUILD1._replace(correlation_id=message.id)
+
+        harness.callback(message)
+
+        mock_get_scheduler.return_value.submit.assert_has_calls(
+            [mock.call("Fedora30_32", build), mock.call("Fedora30_64", build)]
+        )
+
+    @mock.patch("kerneltest.harness.get_scheduler")
+    def test_ignores_other_packages(self, mock_get_scheduler):
+        """Assert messages about packages other than the kernel are ignored."""
+        message = mock.Mock(body={"new": 1, "name": "glibc"})
+
+        harness.callback(message)
+
+        mock_get_scheduler.assert_not_called()
+
+    @mock.patch.dict(
+        "kerneltest.harness.config",
+        {"HARNESS_DISPATCH": "pull", "HARNESS_PULL_ARCHES": ["x86_64", "aarch64"]},
+    )
+    @mock.patch("kerneltest.harness.get_store")
+    @mock.patch("kerneltest.harness.get_scheduler")
+    def test_pull_dispatch(self, mock_get_scheduler, mock_get_store):
+        """Assert builds are queued for test workers in pull mode."""
+        message = mock.Mock(
+            id="8b0e9c63-3a5e-4f4c-9d2b-1e2f3a4b5c6d",
+            body={
+                "new": 1,
+                "name": "kernel",
+                "version": "5.1.0",
+                "release": "300.fc30",
+            },
+        )
+        build = BUILD1._replace(correlation_id=message.id)
+
+        harness.callback(message)
+
+        mock_get_scheduler.assert_not_called()
+        mock_get_store.return_value.queue_pull.assert_has_calls(
+            [mock.call(build, "x86_64"), mock.call(build, "aarch64")]
+        )
+
+    @mock.patch("kerneltest.harness.get_rpm_cache")
+    @mock.patch("kerneltest.harness.get_scheduler")
+    def test_caches_build(self, mock_get_scheduler, mock_get_rpm_cache):
+        """Assert builds are cached once for the guests' architectures."""
+        message = mock.Mock(
+            id="8b0e9c63-3a5e-4f4c-9d2b-1e2f3a4b5c6d",
+            body={
+                "new": 1,
+                "name": "kernel",
+                "version": "5.1.0",
+                "release": "300.fc30",
+            },
+        )
+        cache = mock_get_rpm_cache.return_value
+        cache.populate.side_effect = [OSError("disk full"), None]
+
+        harness.callback(message)
+
+        cache.populate.assert_has_calls(
+            [mock.call(BUILD1.nvr, "i686"), mock.call(BUILD1.nvr, "x86_64")]
+        )
+        cache.evict.assert_called_once_with()
+        assert mock_get_scheduler.return_value.submit.call_count == 2
+
+    @mock.patch("kerneltest.harness.get_rpm_cache")
+    @mock.patch("kerneltest.harness.get_dispatcher")
+    def test_dispatch_in_background(self, mock_get_dispatcher, mock_get_rpm_cache):
+        """Assert the callback leaves caching and queueing to the dispatcher."""
+        message = mock.Mock(
+            id="8b0e9c63-3a5e-4f4c-9d2b-1e2f3a4b5c6d",
+            body={
+                "new": 1,
+                "name": "kernel",
+                "version": "5.1.0",
+                "release": "300.fc30",
+            },
+        )
+        build = BUILD1._replace(correlation_id=message.id)
+
+        harness.callback(message)
+
+        mock_get_rpm_cache.assert_not_called()
+        mock_get_dispatcher.return_value.submit.assert_called_once_with(
+            harness.dispatch, build, "Fedora30_"
+        )
+
+    @mock.patch("kerneltest.harness.get_scheduler")
+    def test_dispatch_failure_logged(self, mock_get_scheduler):
+        """Assert a build that can't be queued is logged rather than raised."""
+        mock_get_scheduler.side_effect = libvirt.libvirtError("no hypervisor")
+
+        with mock.patch("kerneltest.harness._log") as log:
+            harness.dispatch(BUILD1, "Fedora30_")
+
+        assert log.exception.call_count == 1
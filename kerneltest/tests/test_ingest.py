@@ -0,0 +1,160 @@
+"""Tests for :mod:`kerneltest.ingest`"""
+from unittest import mock
+import json
+import os
+import shutil
+import tempfile
+
+from fedora_messaging import api as fm_api
+from fedora_messaging.testing import mock_sends
+
+from kerneltest import db, ingest
+from kerneltest.tests.base import BaseTestCase
+from kerneltest.tests.test_prerender import DeferredExecutor
+
+
+class IngestTests(BaseTestCase):
+    """Tests for the asynchronous ingest mode."""
+
+    def setUp(self):
+        super(IngestTests, self).setUp()
+        self.flask_app.config["RESULTS_INGEST"] = "async"
+        db.Session.add(db.Release(version=30, support="RELEASE"))
+        db.Session.commit()
+        self.run = {
+            "kernel_version": "5.1.2",
+            "build_release": "300.fc30",
+            "arch": "x86_64",
+            "fedora_version": 30,
+            "tests_started": "2019-05-01T09:00:00.5Z",
+            "tests": [
+                {"name": "Boot test", "passed": True, "waived": False, "details": ""}
+            ],
+        }
+
+    def write(self):
+        return self.flask_app.test_cli_runner().invoke(args=["ingest-writer", "--once"])
+
+    def test_queued(self):
+        """Assert uploads are queued and accepted without storing a test run."""
+        with mock_sends():
+            result = self.flask_client.post("/api/v1/results/", json=self.run)
+
+        body = json.loads(result.get_data(as_text=True))
+        assert result.status_code == 202
+        assert body == {
+            "id": 1,
+            "state": "queued",
+            "status": "/api/v1/results/queue/1",
+        }
+        assert result.headers["Location"].endswith(body["status"])
+        assert db.TestRun.query.count() == 0
+        assert db.Ingest.query.one().state == "queued"
+
+    def test_write(self):
+        """Assert the writer stores queued uploads and announces them."""
+        result = self.flask_client.post("/api/v1/results/", json=self.run)
+        status_url = result.headers["Location"]
+
+        with mock_sends(fm_api.Message):
+            output = self.write()
+
+        assert output.exit_code == 0
+        assert output.output == "Stored 1 uploads, 0 duplicates, 0 failed\n"
+        run = db.TestRun.query.one()
+        assert [(t.name, t.fedora_version) for t in run.tests] == [("Boot test", 30)]
+        assert str(run.tests_started) == "2019-05-01 09:00:00.500000"
+        status = json.loads(self.flask_client.get(status_url).get_data(as_text=True))
+        assert status["state"] == "stored"
+        assert status["test_run_id"] == run.id
+        assert db.Ingest.query.one().payload is None
+
+    def test_write_prerenders(self):
+        """Assert the writer pre-renders the pages affected by stored uploads."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.flask_app.config["PRERENDER_DIR"] = directory
+        self.flask_client.post("/api/v1/results/", json=self.run)
+
+        executor = DeferredExecutor()
+        with mock.patch("kerneltest.prerender._executor", executor):
+            with mock_sends(fm_api.Message):
+                output = self.write()
+            executor.run()
+
+        assert output.exit_code == 0
+        run = db.TestRun.query.one()
+        assert os.path.exists(os.path.join(directory, "results/{}.html".format(run.id)))
+        assert os.path.exists(os.path.join(directory, "kernel/5.1.2.html"))
+
+    def test_retry_while_queued(self):
+        """Assert a retry of a queued upload isn't queued twice."""
+        first = self.flask_client.post("/api/v1/results/", json=self.run)
+        second = self.flask_client.post("/api/v1/results/", json=self.run)
+
+        assert second.status_code == 202
+        assert second.headers["Location"] == first.headers["Location"]
+        assert db.Ingest.query.count() == 1
+
+    def test_retry_after_stored(self):
+        """Assert a retry of a stored upload returns the test run."""
+        self.flask_client.post("/api/v1/results/", json=self.run)
+        with mock_sends(fm_api.Message):
+            self.write()
+
+        result = self.flask_client.post("/api/v1/results/", json=self.run)
+
+        assert result.status_code == 200
+        assert json.loads(result.get_data(as_text=True)) == {"id": 1}
+
+    def test_duplicate_in_batch(self):
+        """Assert duplicates queued before the writer runs are only stored once."""
+        fields = {
+            "kernel_version": "5.1.2",
+            "build_release": "300.fc30",
+            "arch": "x86_64",
+            "release": db.Release.query.one(),
+            "user": None,
+            "correlation_id": None,
+            "tests_started": None,
+            "tests_finished": None,
+            "idempotency_key": None,
+            "content_hash": "abc",
+        }
+        session = db.Session()
+        ingest.enqueue(session, fields, self.run["tests"])
+        session.add(
+            db.Ingest(payload=db.Ingest.query.one().payload, content_hash="abc")
+        )
+        session.commit()
+
+        with mock_sends(fm_api.Message):
+            counts = ingest.write_batch(session, 10)
+
+        assert counts == {"stored": 1, "duplicate": 1}
+        assert db.TestRun.query.count() == 1
+        assert [i.test_run_id for i in db.Ingest.query.order_by(db.Ingest.id)] == [1, 1]
+
+    def test_failed(self):
+        """Assert uploads for releases that no longer exist fail alone."""
+        self.flask_client.post("/api/v1/results/", json=self.run)
+        item = db.Ingest.query.one()
+        payload = json.loads(item.payload)
+        payload["fedora_version"] = 31
+        item.payload = json.dumps(payload)
+        db.Session.commit()
+
+        output = self.write()
+
+        assert output.output == "Stored 0 uploads, 0 duplicates, 1 failed\n"
+        status = json.loads(
+            self.flask_client.get("/api/v1/results/queue/1").get_data(as_text=True)
+        )
+        assert status["state"] == "failed"
+        assert status["error"] == "fedora_version was not found"
+
+    def test_status_missing(self):
+        """Assert HTTP 404 is returned for uploads that don't exist."""
+        result = self.flask_client.get("/api/v1/results/queue/42")
+
+        assert result.status_code == 404
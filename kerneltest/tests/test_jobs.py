@@ -0,0 +1,313 @@
+"""Unit tests for :mod:`kerneltest.jobs`"""
+import datetime
+
+from fedora_messaging import api as fm_api
+from fedora_messaging.testing import mock_sends
+
+from kerneltest import db, jobs
+from kerneltest.tests.base import BaseTestCase
+
+
+BUILD = jobs.Build("kernel-5.1.0-300.fc30", "Fedora30")
+
+
+class ArchTests(BaseTestCase):
+    """Tests for :func:`kerneltest.jobs.arch`"""
+
+    def test_arch(self):
+        assert jobs.arch("Fedora30_64") == "x86_64"
+        assert jobs.arch("Rawhide32") == "i686"
+        assert jobs.arch("Rawhide") == "unknown"
+
+
+class JobStoreTests(BaseTestCase):
+    """Tests for :class:`kerneltest.jobs.JobStore`"""
+
+    def setUp(self):
+        super(JobStoreTests, self).setUp()
+        self.store = jobs.JobStore()
+
+    def test_queue(self):
+        """Assert queueing a build records a job once."""
+        self.store.queue("Fedora30_64", BUILD)
+        self.store.queue("Fedora30_64", BUILD)
+
+        job = db.Session.query(db.Job).one()
+        assert job.build == BUILD.nvr
+        assert job.release == "Fedora30"
+        assert job.domain == "Fedora30_64"
+        assert job.arch == "x86_64"
+        assert job.state == "queued"
+        assert job.queued is not None
+        assert job.started is None
+
+    def test_transition(self):
+        """Assert transitions move the state along and record when."""
+        self.store.queue("Fedora30_64", BUILD)
+
+        assert self.store.transition("Fedora30_64", BUILD, "started") == 1
+        assert (
+            self.store.transition("Fedora30_64", BUILD, "finished", ("started",)) == 1
+        )
+
+        job = db.Session.query(db.Job).one()
+        db.Session.refresh(job)
+        assert job.state == "finished"
+        assert job.started is not None
+        assert job.finished >= job.started
+
+    def test_transition_wrong_state(self):
+        """Assert jobs not in one of the given states are left alone."""
+        self.store.queue("Fedora30_64", BUILD)
+
+        assert (
+            self.store.transition("Fedora30_64", BUILD, "finished", ("started",)) == 0
+        )
+
+        assert db.Session.query(db.Job).one().state == "queued"
+
+    def test_unfinished(self):
+        """Assert queued and started jobs are returned oldest first."""
+        other = jobs.Build("kernel-5.1.1-300.fc30", "Fedora30")
+        self.store.queue("Fedora30_64", BUILD)
+        self.store.queue("Fedora30_32", BUILD)
+        self.store.queue("Fedora30_64", other)
+        self.store.transition("Fedora30_64", BUILD, "started")
+        self.store.transition("Fedora30_32", BUILD, "superseded")
+
+        assert self.store.unfinished() == [
+            ("Fedora30_64", BUILD, "started"),
+            ("Fedora30_64", other, "queued"),
+        ]
+
+    def test_unfinished_pull_jobs(self):
+        """Assert jobs queued for workers to pull aren't resumed by the harness."""
+        other = jobs.Build("kernel-5.1.1-300.fc30", "Fedora30")
+        self.store.queue_pull(BUILD, "x86_64")
+        self.store.queue("Fedora30_64", other)
+
+        assert self.store.unfinished() == [("Fedora30_64", other, "queued")]
+
+
+class RecordUploadTests(BaseTestCase):
+    """Tests for :func:`kerneltest.jobs.record_upload`"""
+
+    def test_upload_marks_job(self):
+        """Assert uploading results for a started job marks it uploaded."""
+        store = jobs.JobStore()
+        store.queue("Fedora30_64", BUILD)
+        store.queue("Fedora30_32", BUILD)
+        store.transition("Fedora30_64", BUILD, "started")
+        store.transition("Fedora30_32", BUILD, "started")
+        db.Session.add(db.Release(version=30, support="RELEASE"))
+        db.Session.commit()
+        test_run = {
+            "kernel_version": "5.1.0",
+            "build_release": "300.fc30",
+            "arch": "x86_64",
+            "fedora_version": 30,
+            "tests": [],
+        }
+
+        with mock_sends(fm_api.Message):
+            result = self.flask_client.post("/api/v1/results/", json=test_run)
+
+        assert result.status_code == 201
+        job64, job32 = db.Session.query(db.Job).order_by(db.Job.id).all()
+        db.Session.refresh(job64)
+        db.Session.refresh(job32)
+        assert job64.state == "uploaded"
+        assert job64.uploaded is not None
+        assert job64.test_run_id == db.TestRun.query.one().id
+        assert job32.state == "started"
+
+    def test_upload_matches_correlation_id(self):
+        """Assert test runs with a correlation ID only match the same job."""
+        store = jobs.JobStore()
+        store.queue("Fedora30_64", BUILD._replace(correlation_id="old"))
+        store.transition("Fedora30_64", BUILD, "finished")
+        store.queue("Fedora30_64", BUILD._replace(correlation_id="new"))
+        store.transition("Fedora30_64", BUILD, "started")
+        db.Session.add(db.Release(version=30, support="RELEASE"))
+        db.Session.commit()
+        test_run = {
+            "kernel_version": "5.1.0",
+            "build_release": "300.fc30",
+            "arch": "x86_64",
+            "fedora_version": 30,
+            "tests": [],
+            "correlation_id": "new",
+        }
+
+        with mock_sends(fm_api.Message):
+            result = self.flask_client.post("/api/v1/results/", json=test_run)
+
+        assert result.status_code == 201
+        old, new = db.Session.query(db.Job).order_by(db.Job.id).all()
+        db.Session.refresh(old)
+        db.Session.refresh(new)
+        assert old.state == "finished"
+        assert new.state == "uploaded"
+        assert new.correlation_id == "new"
+
+
+class QueuePullTests(BaseTestCase):
+    """Tests for :meth:`kerneltest.jobs.JobStore.queue_pull`"""
+
+    def test_queue_pull(self):
+        """Assert pull jobs have no domain and supersede older queued builds."""
+        store = jobs.JobStore()
+        newer = jobs.Build("kernel-5.1.1-300.fc30", "Fedora30")
+
+        store.queue_pull(BUILD, "x86_64")
+        store.queue_pull(BUILD, "x86_64")
+        store.queue_pull(BUILD, "aarch64")
+        store.queue_pull(newer, "x86_64")
+
+        states = [
+            (j.build, j.arch, j.state, j.domain)
+            for j in db.Session.query(db.Job).order_by(db.Job.id)
+        ]
+        assert states == [
+            (BUILD.nvr, "x86_64", "superseded", None),
+            (BUILD.nvr, "aarch64", "queued", None),
+            (newer.nvr, "x86_64", "queued", None),
+        ]
+
+
+class LeaseTests(BaseTestCase):
+    """Tests for leasing jobs with :func:`kerneltest.jobs.lease`"""
+
+    def setUp(self):
+        super(LeaseTests, self).setUp()
+        store = jobs.JobStore()
+        store.queue_pull(BUILD, "x86_64")
+        store.queue_pull(BUILD, "aarch64")
+        store.queue("Fedora30_64", BUILD)
+
+    def test_lease_oldest(self):
+        """Assert the oldest queued pull job is leased."""
+        job = jobs.lease(db.Session(), "worker1", 60)
+
+        assert job.arch == "x86_64"
+        assert job.state == "started"
+        assert job.worker == "worker1"
+        assert job.lease_expires > job.started
+
+    def test_lease_filters(self):
+        """Assert workers can ask for a specific architecture and release."""
+        assert jobs.lease(db.Session(), "worker1", 60, release="Fedora29") is None
+        job = jobs.lease(db.Session(), "worker1", 60, arch="aarch64")
+
+        assert job.arch == "aarch64"
+
+    def test_lease_skips_harness_jobs(self):
+        """Assert jobs for the harness's own guests are never leased."""
+        session = db.Session()
+        assert jobs.lease(session, "worker1", 60) is not None
+        assert jobs.lease(session, "worker2", 60) is not None
+        assert jobs.lease(session, "worker3", 60) is None
+
+    def test_expired_lease_reclaimed(self):
+        """Assert jobs whose lease ran out are handed to another worker."""
+        session = db.Session()
+        job = jobs.lease(session, "worker1", -1, arch="x86_64")
+
+        assert jobs.heartbeat(session, job.id, "worker1", 60) is False
+        reclaimed = jobs.lease(session, "worker2", 60, arch="x86_64")
+
+        assert reclaimed.id == job.id
+        assert reclaimed.worker == "worker2"
+
+    def test_heartbeat(self):
+        """Assert only the worker holding the lease can extend it."""
+        session = db.Session()
+        job = jobs.lease(session, "worker1", 60)
+        expires = job.lease_expires
+
+        assert jobs.heartbeat(session, job.id, "worker2", 600) is False
+        assert jobs.heartbeat(session, job.id, "worker1", 600) is True
+        session.refresh(job)
+        assert job.lease_expires > expires
+
+
+class PercentileTests(BaseTestCase):
+    """Tests for :func:`kerneltest.jobs.percentile`"""
+
+    def test_percentile(self):
+        values = list(range(1, 11))
+
+        assert jobs.percentile(values, 50) == 5
+        assert jobs.percentile(values, 90) == 9
+        assert jobs.percentile(values, 99) == 10
+        assert jobs.percentile([], 50) is None
+
+
+class LatencyTests(BaseTestCase):
+    """Tests for :func:`kerneltest.jobs.latency`"""
+
+    def setUp(self):
+        super(LatencyTests, self).setUp()
+        release = db.Release(version=30, support="RELEASE")
+        queued = datetime.datetime(2019, 5, 1, 10, 0, 0)
+        for minutes in (1, 2, 3, 4):
+            run = db.TestRun(
+                kernel_version="5.1.0",
+                build_release="300.fc30",
+                arch="x86_64",
+                release=release,
+                tests_started=queued + datetime.timedelta(minutes=minutes + 2),
+                tests_finished=queued + datetime.timedelta(minutes=minutes + 12),
+                created=queued + datetime.timedelta(minutes=minutes + 13),
+            )
+            job = db.Job(
+                build=BUILD.nvr,
+                release="Fedora30",
+                domain="Fedora30_64",
+                arch="x86_64",
+                state="uploaded",
+                queued=queued,
+                started=queued + datetime.timedelta(minutes=minutes),
+                test_run=run,
+            )
+            db.Session.add_all([run, job])
+        db.Session.add(
+            db.Job(
+                build=BUILD.nvr,
+                release="Fedora30",
+                domain="Fedora30_32",
+                arch="i686",
+                state="started",
+                queued=queued,
+                started=queued,
+            )
+        )
+        db.Session.commit()
+
+    def test_latency(self):
+        """Assert percentiles are worked out for each stage of uploaded jobs."""
+        latency = jobs.latency(db.Session())
+
+        assert list(latency) == [("Fedora30", "x86_64")]
+        stages = latency[("Fedora30", "x86_64")]
+        assert stages["queue"] == (4, {50: 120.0, 90: 240.0, 99: 240.0})
+        assert stages["boot"] == (4, {50: 120.0, 90: 120.0, 99: 120.0})
+        assert stages["test"] == (4, {50: 600.0, 90: 600.0, 99: 600.0})
+        assert stages["upload"] == (4, {50: 60.0, 90: 60.0, 99: 60.0})
+
+    def test_latency_filters(self):
+        """Assert jobs can be filtered by when they were queued and their arch."""
+        assert jobs.latency(db.Session(), arch="i686") == {}
+        assert jobs.latency(db.Session(), since=datetime.datetime(2019, 6, 1)) == {}
+
+    def test_missing_timestamps(self):
+        """Assert stages the guest didn't report timestamps for are left out."""
+        db.TestRun.query.update({"tests_started": None})
+        db.Session.commit()
+
+        stages = jobs.latency(db.Session())[("Fedora30", "x86_64")]
+
+        assert stages["queue"][0] == 4
+        assert stages["boot"] == (0, {50: None, 90: None, 99: None})
+        assert stages["test"][0] == 0
+        assert stages["upload"][0] == 4
@@ -0,0 +1,114 @@
+"""Unit tests for :mod:`kerneltest.placement`, run against libvirt's test driver."""
+from unittest import mock
+import unittest
+
+try:
+    import libvirt
+    from kerneltest import harness, placement
+    from kerneltest.tests.test_harness import define_guest
+except ImportError:
+    libvirt = None
+
+TEST_URI = "test:///default"
+
+
+@unittest.skipIf(libvirt is None, "libvirt-python is not installed")
+class PlacementTestCase(unittest.TestCase):
+    """Base class with a test driver host and a shut off 1 GiB, 1 vCPU guest."""
+
+    def setUp(self):
+        self.conn = libvirt.open(TEST_URI)
+        self.dom = self.conn.lookupByName("test")
+        if not self.dom.isActive():
+            self.dom.create()
+        self.guest = define_guest(self.conn, "Fedora30_64")
+        self.addCleanup(self.conn.close)
+        self.addCleanup(self.guest.undefine)
+        self.host = placement.Host(
+            harness.ConnectionPool(TEST_URI), harness.LifecycleMonitor(TEST_URI)
+        )
+        self.addCleanup(self.host.close)
+
+    def tearDown(self):
+        if self.guest.isActive():
+            self.guest.destroy()
+
+
+class HostTests(PlacementTestCase):
+    """Tests for :class:`kerneltest.placement.Host`."""
+
+    def test_free(self):
+        """Assert running domains are subtracted from the node's resources."""
+        node = self.conn.getInfo()
+        __, __, memory, vcpus, __ = self.dom.info()
+
+        with self.host.pool.connection() as conn:
+            free = self.host.free(conn)
+
+        assert free == placement.Capacity(node[2] - vcpus, node[1] * 1024 - memory, 1)
+
+    def test_lookup_missing(self):
+        """Assert looking up a domain the host doesn't define returns None."""
+        with self.host.pool.connection() as conn:
+            assert self.host.lookup(conn, "no-such-domain") is None
+
+    def test_booting(self):
+        """Assert guests only count as booting for the boot time."""
+        self.host.booted()
+
+        assert self.host.booting(60) == 1
+        assert self.host.booting(0) == 0
+
+
+class PlacerTests(PlacementTestCase):
+    """Tests for :class:`kerneltest.placement.Placer`."""
+
+    def start(self, host, dom):
+        dom.create()
+
+    def test_start(self):
+        """Assert a guest that fits is started."""
+        placer = placement.Placer([self.host])
+
+        assert placer.start("Fedora30_64", self.start) is self.host
+        assert self.guest.isActive()
+
+    def test_not_defined(self):
+        """Assert guests no host defines are not started."""
+        placer = placement.Placer([self.host])
+
+        assert placer.start("no-such-domain", self.start) is None
+
+    def test_memory(self):
+        """Assert guests that need more memory than is free are held back."""
+        with self.host.pool.connection() as conn:
+            free = self.host.free(conn)
+        big = define_guest(self.conn, "Fedora30_32", memory=free.memory + 1024)
+        self.addCleanup(big.undefine)
+        placer = placement.Placer([self.host])
+
+        assert placer.start("Fedora30_32", self.start) is None
+        assert not big.isActive()
+
+    def test_max_domains(self):
+        """Assert guests are held back on hosts running the most domains."""
+        placer = placement.Placer([self.host], max_domains=1)
+
+        assert placer.start("Fedora30_64", self.start) is None
+        self.dom.destroy()
+        assert placer.start("Fedora30_64", self.start) is self.host
+
+    def test_max_booting(self):
+        """Assert guests are held back while too many others are booting."""
+        placer = placement.Placer([self.host], max_booting=1, boot_time=60)
+        self.host.booted()
+
+        assert placer.start("Fedora30_64", self.start) is None
+
+    def test_most_free_memory(self):
+        """Assert the host with the most free memory is chosen."""
+        other = mock.Mock(wraps=self.host, pool=self.host.pool)
+        other.free.return_value = placement.Capacity(0, 0, 0)
+        placer = placement.Placer([other, self.host])
+
+        assert placer.start("Fedora30_64", self.start) is self.host
@@ -0,0 +1,210 @@
+"""Tests for :mod:`kerneltest.prerender`"""
+from unittest import mock
+import concurrent.futures
+import datetime
+import os
+import shutil
+import tempfile
+
+from kerneltest import db, prerender, ui_view
+from kerneltest.tests.base import BaseTestCase
+
+
+class DeferredExecutor(object):
+    """
+    An executor that runs the renders it's given only when asked, in the
+    calling thread, since the test database can't be shared between threads.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def submit(self, fn, *args):
+        future = concurrent.futures.Future()
+        self.calls.append((fn, args, future))
+        return future
+
+    def run(self):
+        calls, self.calls = self.calls, []
+        for fn, args, future in calls:
+            future.set_result(fn(*args))
+
+
+class PrerenderTests(BaseTestCase):
+    """Tests for pre-rendering the public pages into static files."""
+
+    def setUp(self):
+        super(PrerenderTests, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.flask_app.config["PRERENDER_DIR"] = self.directory
+        self.executor = DeferredExecutor()
+        patcher = mock.patch("kerneltest.prerender._executor", self.executor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(prerender._queued.clear)
+        self.release = db.Release(version=30, support="RELEASE")
+        self.run = self.add_run("5.1.2")
+        db.Session.commit()
+
+    def add_run(self, kernel, state="finalized"):
+        run = db.TestRun(
+            kernel_version=kernel,
+            build_release="300.fc30",
+            arch="x86_64",
+            state=state,
+            release=self.release,
+        )
+        db.Session.add(db.Test(name="boot", passed=True, waived=False, run=run))
+        return run
+
+    def prerender(self, *args):
+        result = self.flask_app.test_cli_runner().invoke(
+            args=["prerender"] + list(args)
+        )
+        assert result.exit_code == 0, result.output
+        return result.output
+
+    def files(self):
+        return sorted(
+            os.path.relpath(os.path.join(path, name), self.directory)
+            for path, __, names in os.walk(self.directory)
+            for name in names
+            if name != prerender.MARKER
+        )
+
+    def test_all(self):
+        """Assert every public page is rendered the first time."""
+        self.add_run("5.1.3", state="open")
+        db.Session.commit()
+
+        output = self.prerender()
+
+        assert output == "Rendered 5 pages\n"
+        assert self.files() == [
+            "index.html",
+            "kernel/5.1.2.html",
+            "release/30.html",
+            "results/{}.html".format(self.run.id),
+            "stats.html",
+        ]
+        with open(os.path.join(self.directory, "kernel/5.1.2.html")) as fd:
+            assert "5.1.2" in fd.read()
+
+    def test_unchanged(self):
+        """Assert nothing is rendered again if no test runs have changed."""
+        self.prerender()
+        self.run.created = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+        db.Session.commit()
+
+        assert self.prerender() == "Rendered 0 pages\n"
+
+    def test_changed(self):
+        """Assert only the pages affected by new test runs are rendered again."""
+        self.prerender()
+        self.run.created = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+        new = self.add_run("5.1.3")
+        db.Session.commit()
+
+        output = self.prerender()
+
+        assert output == "Rendered 5 pages\n"
+        assert "results/{}.html".format(new.id) in self.files()
+        assert "kernel/5.1.3.html" in self.files()
+
+    def test_removed(self):
+        """Assert the files of pages that no longer exist are removed."""
+        open(os.path.join(self.directory, "stale.html"), "w").close()
+
+        prerender.render(self.flask_app, self.directory, {"/stale", "/"})
+
+        assert self.files() == ["index.html"]
+
+    def test_not_configured(self):
+        """Assert the command fails if there's no directory to render into."""
+        self.flask_app.config["PRERENDER_DIR"] = ""
+
+        result = self.flask_app.test_cli_runner().invoke(args=["prerender"])
+
+        assert result.exit_code == 1
+        assert "PRERENDER_DIR is not set" in result.output
+
+    def test_rerender(self):
+        """Assert the pages showing a stored test run are re-rendered."""
+        with self.flask_app.app_context():
+            prerender.rerender(self.run)
+        self.executor.run()
+
+        assert self.files() == [
+            "index.html",
+            "kernel/5.1.2.html",
+            "release/30.html",
+            "results/{}.html".format(self.run.id),
+            "stats.html",
+        ]
+
+    def test_rerender_not_configured(self):
+        """Assert nothing is scheduled without a directory to render into."""
+        self.flask_app.config["PRERENDER_DIR"] = ""
+
+        with self.flask_app.app_context():
+            prerender.rerender(self.run)
+
+        assert self.executor.calls == []
+
+    def test_schedule_batches(self):
+        """Assert pages scheduled while a render is waiting join that render."""
+        first = prerender.schedule(self.flask_app, {"/results/1"})
+        second = prerender.schedule(self.flask_app, {"/kernel/5.1.2"})
+
+        assert second is first
+        assert len(self.executor.calls) == 1
+        assert prerender._queued[self.flask_app][0] == {"/results/1", "/kernel/5.1.2"}
+
+        prerender.schedule(self.flask_app)
+        prerender.schedule(self.flask_app, {"/stats"})
+
+        assert prerender._queued[self.flask_app][0] is None
+        self.executor.run()
+        assert first.result() == 5
+        assert self.flask_app not in prerender._queued
+
+    def test_schedule_after_render(self):
+        """Assert pages scheduled once a render started get a new render."""
+        first = prerender.schedule(self.flask_app, {"/stats"})
+        self.executor.run()
+
+        second = prerender.schedule(self.flask_app, {"/"})
+
+        assert second is not first
+        self.executor.run()
+        assert second.result() == 1
+
+    def test_render_failure_logged(self):
+        """Assert a failed render is logged rather than raised."""
+        prerender.schedule(self.flask_app, {"/"})
+        self.flask_app.config["PRERENDER_DIR"] = os.path.join(self.directory, "x")
+        open(self.flask_app.config["PRERENDER_DIR"], "w").close()
+
+        with mock.patch("kerneltest.prerender._log") as log:
+            self.executor.run()
+
+        assert log.error.call_count == 1
+
+    @mock.patch("kerneltest.prerender.schedule")
+    def test_release_changed(self, schedule):
+        """Assert every page is re-rendered when a release changes."""
+        with self.flask_app.test_request_context():
+            ui_view._release_changed()
+
+        schedule.assert_called_once_with(self.flask_app)
+
+    @mock.patch("kerneltest.prerender.schedule")
+    def test_release_changed_not_configured(self, schedule):
+        """Assert nothing is scheduled without a directory to render into."""
+        self.flask_app.config["PRERENDER_DIR"] = ""
+
+        with self.flask_app.test_request_context():
+            ui_view._release_changed()
+
+        assert schedule.call_count == 0
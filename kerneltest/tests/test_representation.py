@@ -0,0 +1,44 @@
+"""Tests for :mod:`kerneltest.representation`"""
+from unittest import mock
+import datetime
+import json
+import unittest
+
+from kerneltest import representation
+
+
+class DumpsTests(unittest.TestCase):
+    """Tests for :func:`kerneltest.representation.dumps`"""
+
+    body = {
+        "created": datetime.datetime(2019, 5, 1, 9, 0, 0, 500000),
+        "day": datetime.date(2019, 5, 1),
+        "tests": [{"name": "boot", "passed": True, "details": None}],
+    }
+    expected = {
+        "created": "2019-05-01T09:00:00.500000",
+        "day": "2019-05-01",
+        "tests": [{"name": "boot", "passed": True, "details": None}],
+    }
+
+    @unittest.skipIf(representation.orjson is None, "orjson is not installed")
+    def test_orjson(self):
+        """Assert orjson serializes dates in ISO 8601 format."""
+        data = representation.dumps(self.body)
+
+        assert data.endswith(b"\n")
+        assert json.loads(data) == self.expected
+
+    @mock.patch("kerneltest.representation.orjson", None)
+    def test_json(self):
+        """Assert the standard library serializes dates like orjson does."""
+        data = representation.dumps(self.body)
+
+        assert data.endswith(b"\n")
+        assert json.loads(data) == self.expected
+
+    @mock.patch("kerneltest.representation.orjson", None)
+    def test_json_unserializable(self):
+        """Assert values neither library can serialize are an error."""
+        with self.assertRaises(TypeError):
+            representation.dumps({"value": object()})
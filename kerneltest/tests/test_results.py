@@ -0,0 +1,234 @@
+"""Unit tests for :mod:`kerneltest.results`"""
+import datetime
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import sqlalchemy
+
+from kerneltest import db, results
+from kerneltest.tests.base import BaseTestCase
+
+
+class DeleteAbandonedTests(BaseTestCase):
+    """Tests for :func:`kerneltest.results.delete_abandoned`"""
+
+    def setUp(self):
+        super(DeleteAbandonedTests, self).setUp()
+        release = db.Release(version=30, support="RELEASE")
+        long_ago = datetime.datetime.utcnow() - datetime.timedelta(days=2)
+        for state, updated in (
+            ("open", long_ago),
+            ("open", datetime.datetime.utcnow()),
+            ("finalized", None),
+        ):
+            run = db.TestRun(
+                kernel_version="5.1.2",
+                build_release="300.fc30",
+                arch="x86_64",
+                release=release,
+                created=long_ago,
+                state=state,
+                updated=updated,
+            )
+            db.Session.add(
+                db.Test(name="Boot test", passed=True, waived=False, run=run)
+            )
+        db.Session.commit()
+
+    def test_delete_abandoned(self):
+        """Assert only open runs that weren't appended to recently are deleted."""
+        session = db.Session()
+
+        assert results.delete_abandoned(session, 24 * 60 * 60) == 1
+        session.commit()
+
+        assert db.TestRun.query.count() == 2
+        assert db.Test.query.count() == 2
+        assert db.TestRun.query.filter_by(id=1).count() == 0
+
+    def test_command(self):
+        """Assert the delete-abandoned-runs command deletes abandoned runs."""
+        self.flask_app.config["ARTIFACT_DIR"] = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.flask_app.config["ARTIFACT_DIR"])
+
+        result = self.flask_app.test_cli_runner().invoke(args=["delete-abandoned-runs"])
+
+        assert result.exit_code == 0
+        assert result.output == (
+            "Deleted 1 abandoned test runs\nDeleted 0 unreferenced artifact files\n"
+        )
+        assert db.TestRun.query.count() == 2
+
+
+class HashTests(unittest.TestCase):
+    """Tests for :func:`kerneltest.results.idempotency_key` and
+    :func:`kerneltest.results.content_hash`"""
+
+    def test_idempotency_key_per_user(self):
+        """Assert users can't collide with each other's Idempotency-Keys."""
+        assert results.idempotency_key("jcline", "1") != results.idempotency_key(
+            "jforbes", "1"
+        )
+        assert results.idempotency_key(None, "1") == results.idempotency_key(None, "1")
+
+    def test_content_hash(self):
+        """Assert the hash covers the user, the run and its tests."""
+        upload = {"kernel_version": "5.1.2", "arch": "x86_64", "ignored": 1}
+        tests = [{"name": "Boot test", "passed": True, "waived": False, "details": ""}]
+        digest = results.content_hash("jcline", upload, tests)
+
+        assert digest == results.content_hash("jcline", dict(upload, ignored=2), tests)
+        assert digest != results.content_hash(None, upload, tests)
+        assert digest != results.content_hash(
+            "jcline", dict(upload, arch="aarch64"), tests
+        )
+        assert digest != results.content_hash(
+            "jcline", upload, [dict(tests[0], passed=False)]
+        )
+
+
+class ValidateTests(unittest.TestCase):
+    """Tests for :func:`kerneltest.results.validate_tests` and
+    :func:`kerneltest.results.validate_upload`"""
+
+    def test_valid(self):
+        """Assert valid tests are returned with only the schema's fields."""
+        tests, error = results.validate_tests(
+            [{"name": "Boot test", "passed": True, "waived": False, "extra": 1}]
+        )
+
+        assert error is None
+        assert tests == [
+            {"name": "Boot test", "passed": True, "waived": False, "details": None}
+        ]
+
+    def test_invalid(self):
+        """Assert each invalid test is reported with its index and fields."""
+        tests, error = results.validate_tests(
+            [
+                {"name": "Boot test", "passed": True, "waived": False},
+                {"name": "Boot test", "passed": 1, "details": 2},
+                "Boot test",
+            ]
+        )
+
+        assert tests is None
+        assert error == {
+            "error": "2 of 3 tests are invalid",
+            "invalid_tests": [
+                {
+                    "index": 1,
+                    "errors": {
+                        "passed": "must be a boolean",
+                        "waived": "is required",
+                        "details": "must be a string",
+                    },
+                },
+                {"index": 2, "errors": {"test": "must be an object"}},
+            ],
+        }
+
+    def test_not_a_list(self):
+        """Assert tests must be sent as a list."""
+        tests, error = results.validate_tests({"name": "Boot test"})
+
+        assert tests is None
+        assert error == {"error": "tests must be a list of test objects"}
+
+    def test_upload(self):
+        """Assert a complete upload's fields are checked before its tests."""
+        upload = {
+            "kernel_version": "5.1.2",
+            "build_release": "300.fc30",
+            "arch": "x86_64",
+            "fedora_version": "30",
+            "tests": [{"name": "Boot test"}],
+        }
+
+        fields, error = results.validate_upload(upload)
+
+        assert fields is None
+        assert error == {
+            "error": "the upload is invalid",
+            "invalid_fields": {"fedora_version": "must be an integer"},
+        }
+        assert results.validate_upload(dict(upload, fedora_version=30))[1][
+            "invalid_tests"
+        ] == [
+            {"index": 0, "errors": {"passed": "is required", "waived": "is required"}}
+        ]
+
+
+class StoreTests(BaseTestCase):
+    """Tests for :func:`kerneltest.results.store` and
+    :func:`kerneltest.results.commit`"""
+
+    def setUp(self):
+        super(StoreTests, self).setUp()
+        self.fields = {
+            "kernel_version": "5.1.2",
+            "build_release": "300.fc30",
+            "arch": "x86_64",
+            "release": db.Release(version=30, support="RELEASE"),
+            "content_hash": "0" * 64,
+        }
+        self.tests = [
+            {"name": str(i), "passed": True, "waived": False, "details": None}
+            for i in range(100)
+        ]
+
+    def test_bulk_insert(self):
+        """Assert the tests are inserted in one statement, with their release."""
+        session = db.Session()
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            if statement.startswith("INSERT INTO test "):
+                statements.append(statement)
+
+        sqlalchemy.event.listen(session.get_bind(), "before_cursor_execute", count)
+        self.addCleanup(
+            sqlalchemy.event.remove,
+            session.get_bind(),
+            "before_cursor_execute",
+            count,
+        )
+        run, new = results.store(session, self.fields, self.tests)
+
+        assert new is True
+        assert len(statements) == 1
+        assert len(run.tests) == 100
+        assert {test.fedora_version for test in run.tests} == {30}
+
+    def test_duplicate(self):
+        """Assert an upload that was already stored returns the stored run."""
+        session = db.Session()
+        run, __ = results.store(session, self.fields, self.tests)
+
+        duplicate, new = results.store(session, self.fields, self.tests)
+
+        assert new is False
+        assert duplicate is run
+        assert db.TestRun.query.count() == 1
+
+    def test_not_a_duplicate(self):
+        """Assert constraint failures other than duplicates are raised."""
+        session = db.Session()
+
+        with self.assertRaises(sqlalchemy.exc.IntegrityError):
+            results.store(session, dict(self.fields, kernel_version=None), [])
+
+        assert db.TestRun.query.count() == 0
+
+    def test_commit_hooks(self):
+        """Assert the hooks are called once committed, and may fail."""
+        session = db.Session()
+        run, __ = results.store(session, self.fields, self.tests)
+        hook = mock.Mock(side_effect=ValueError)
+
+        with mock.patch("kerneltest.results.COMMIT_HOOKS", [hook, hook]):
+            results.commit(session, [run])
+
+        assert hook.call_args_list == [mock.call(run), mock.call(run)]
@@ -0,0 +1,112 @@
+"""Unit tests for :mod:`kerneltest.rpmcache`"""
+from unittest import mock
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from kerneltest import rpmcache
+
+
+NVR = "kernel-5.1.0-300.fc30"
+
+
+def fake_download(rpms):
+    """Make a stand-in for ``koji download-build`` that writes ``rpms``."""
+
+    def run(args, cwd, **kwargs):
+        for name, content in rpms.items():
+            with open(os.path.join(cwd, name), "w") as fd:
+                fd.write(content)
+
+    return run
+
+
+class RPMCacheTests(unittest.TestCase):
+    """Tests for :class:`kerneltest.rpmcache.RPMCache`"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.cache = rpmcache.RPMCache(self.root, keep=2)
+
+    @mock.patch("kerneltest.rpmcache.subprocess.run")
+    def test_populate(self, mock_run):
+        """Assert builds are downloaded once, without debuginfo, with a manifest."""
+        mock_run.side_effect = fake_download(
+            {
+                "kernel-core-5.1.0-300.fc30.x86_64.rpm": "core",
+                "kernel-debuginfo-5.1.0-300.fc30.x86_64.rpm": "debug",
+            }
+        )
+
+        path = self.cache.populate(NVR, "x86_64")
+        self.cache.populate(NVR, "x86_64")
+
+        mock_run.assert_called_once()
+        assert mock_run.call_args[0][0] == [
+            "koji",
+            "download-build",
+            "--arch=x86_64",
+            NVR,
+        ]
+        assert path == os.path.join(self.root, "builds", NVR, "x86_64")
+        assert sorted(os.listdir(path)) == [
+            "SHA256SUMS",
+            "kernel-core-5.1.0-300.fc30.x86_64.rpm",
+        ]
+        with open(os.path.join(path, "SHA256SUMS")) as fd:
+            digest, name = fd.read().split()
+        assert name == "kernel-core-5.1.0-300.fc30.x86_64.rpm"
+        assert os.path.exists(
+            os.path.join(self.root, "objects", digest[:2], digest + ".rpm")
+        )
+        assert [n for n in os.listdir(self.root) if n.startswith(".")] == []
+
+    @mock.patch("kerneltest.rpmcache.subprocess.run")
+    def test_identical_rpms_stored_once(self, mock_run):
+        """Assert RPMs with the same contents share one object."""
+        mock_run.side_effect = fake_download({"kernel-doc.noarch.rpm": "doc"})
+
+        self.cache.populate(NVR, "x86_64")
+        self.cache.populate(NVR, "i686")
+
+        objects = []
+        for __, __, files in os.walk(os.path.join(self.root, "objects")):
+            objects.extend(files)
+        assert len(objects) == 1
+
+    @mock.patch("kerneltest.rpmcache.subprocess.run")
+    def test_failed_download(self, mock_run):
+        """Assert nothing is published when Koji fails."""
+        mock_run.side_effect = subprocess.CalledProcessError(1, "koji")
+
+        with self.assertRaises(subprocess.CalledProcessError):
+            self.cache.populate(NVR, "x86_64")
+
+        assert not os.path.exists(self.cache.path(NVR, "x86_64"))
+        assert sorted(os.listdir(self.root)) == ["builds", "objects"]
+
+    @mock.patch("kerneltest.rpmcache.subprocess.run")
+    def test_evict(self, mock_run):
+        """Assert the oldest builds and their objects are evicted."""
+        for i in range(4):
+            nvr = "kernel-5.1.{}-300.fc30".format(i)
+            mock_run.side_effect = fake_download({nvr + ".x86_64.rpm": nvr})
+            self.cache.populate(nvr, "x86_64")
+            os.utime(os.path.join(self.root, "builds", nvr), (i, i))
+        self.cache.protected = lambda: {"kernel-5.1.0-300.fc30"}
+
+        evicted = self.cache.evict()
+
+        assert evicted == ["kernel-5.1.1-300.fc30"]
+        assert sorted(os.listdir(os.path.join(self.root, "builds"))) == [
+            "kernel-5.1.0-300.fc30",
+            "kernel-5.1.2-300.fc30",
+            "kernel-5.1.3-300.fc30",
+        ]
+        objects = []
+        for __, __, files in os.walk(os.path.join(self.root, "objects")):
+            objects.extend(files)
+        assert len(objects) == 3
@@ -0,0 +1,118 @@
+"""Tests for :mod:`kerneltest.search`"""
+import json
+
+from kerneltest import db, search
+from kerneltest.tests.base import BaseTestCase
+
+
+class SearchTests(BaseTestCase):
+    """Tests for searching tests and the search API and page."""
+
+    def setUp(self):
+        super(SearchTests, self).setUp()
+        release = db.Release(version=30, support="RELEASE")
+        for kernel, details in (
+            ("5.1.1", "BUG: unable to handle page fault in do_page_fault+0x10"),
+            ("5.1.2", "All 42 tests passed"),
+            ("5.1.3", "Oops in do_page_fault <ffffffff> & friends"),
+        ):
+            run = db.TestRun(
+                kernel_version=kernel,
+                build_release="300.fc30",
+                arch="x86_64",
+                release=release,
+            )
+            db.Session.add(
+                db.Test(
+                    name="Boot test",
+                    passed=True,
+                    waived=False,
+                    details=details,
+                    run=run,
+                )
+            )
+            db.Session.add(
+                db.Test(name="paxtest", passed=False, waived=True, details="", run=run)
+            )
+        db.Session.commit()
+
+    def test_search(self):
+        """Assert hits are the tests containing every word, newest first."""
+        page = search.search("do_page_fault")
+
+        assert page.total_items == 2
+        assert [hit.test.run.kernel_version for hit in page.items] == [
+            "5.1.3",
+            "5.1.1",
+        ]
+        assert "<b>do_page_fault</b>" in page.items[0].snippet
+        assert "&lt;ffffffff&gt; &amp;" in page.items[0].snippet
+
+    def test_all_words(self):
+        """Assert every word has to match."""
+        assert search.search("page fault unable").total_items == 1
+        assert search.search("page fault nonexistent").total_items == 0
+
+    def test_names(self):
+        """Assert test names are searched too."""
+        page = search.search("paxtest")
+
+        assert page.total_items == 3
+        assert "<b>paxtest</b>" in page.items[0].snippet
+
+    def test_substring_snippets(self):
+        """Assert snippets cover test names on databases without a text index."""
+        ids = [test.id for test in db.Test.query.order_by(db.Test.id)]
+
+        snippets = search._snippets("mysql", ["paxtest"], ids[:2])
+
+        assert snippets[ids[1]] == "<b>paxtest</b> "
+        assert "<b>" not in snippets[ids[0]]
+
+    def test_query_syntax(self):
+        """Assert FTS5 query syntax in searches is treated as text."""
+        assert search.search("BUG: do_page_fault+0x10").total_items == 1
+        assert search.search('"NEAR(').total_items == 0
+        assert search.search("AND OR NOT").total_items == 0
+
+    def test_deleted_tests(self):
+        """Assert the index follows tests as they're deleted."""
+        db.Test.query.filter_by(name="Boot test").delete()
+        db.Session.commit()
+
+        assert search.search("do_page_fault").total_items == 0
+
+    def test_api(self):
+        """Assert the search API returns paginated hits with their runs."""
+        result = self.flask_client.get(
+            "/api/v1/search/?q=do_page_fault&items_per_page=1&page=2"
+        )
+
+        body = json.loads(result.get_data(as_text=True))
+        assert result.status_code == 200
+        assert body["total_items"] == 2
+        assert body["page"] == 2
+        assert len(body["items"]) == 1
+        hit = body["items"][0]
+        assert hit["test"]["name"] == "Boot test"
+        assert hit["test_run"]["kernel_version"] == "5.1.1"
+        assert hit["test_run"]["arch"] == "x86_64"
+        run = db.TestRun.query.filter_by(kernel_version="5.1.1").one()
+        assert hit["test_run"]["created"] == run.created.isoformat()
+        assert "<b>do_page_fault</b>" in hit["snippet"]
+
+    def test_api_empty_query(self):
+        """Assert queries without any words are rejected."""
+        result = self.flask_client.get("/api/v1/search/?q=%20")
+
+        assert result.status_code == 400
+
+    def test_page(self):
+        """Assert the search page shows hits with links to their runs."""
+        result = self.flask_client.get("/search?q=do_page_fault")
+
+        html = result.get_data(as_text=True)
+        assert result.status_code == 200
+        assert "2 matching tests" in html
+        assert "<b>do_page_fault</b>" in html
+        assert "/results/3" in html
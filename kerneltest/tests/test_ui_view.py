@@ -1,5 +1,13 @@
 """Unit tests for :mod:`kerneltest.ui_view`"""
+from unittest import mock
+import io
+import json
 
+from fedora_messaging import api as fm_api
+from fedora_messaging.testing import mock_sends
+import flask
+
+from kerneltest import ui_view
 from kerneltest.db import Session, Release, TestRun, Test
 from kerneltest.tests.base import BaseTestCase
 
@@ -341,3 +349,50 @@ class StatsTest(BaseTestCase):
     def test_get_nothing(self):
         result = self.flask_client.get("/stats")
         assert result.status_code == 200
+
+
+class UploadTests(BaseTestCase):
+    """Tests for :func:`kerneltest.ui_view.upload`"""
+
+    def setUp(self):
+        super(UploadTests, self).setUp()
+        self.flask_app.config["WTF_CSRF_ENABLED"] = False
+        Session.add(Release(version=30, support="RELEASE"))
+        Session.commit()
+        self.upload = {
+            "kernel_version": "5.1.2",
+            "build_release": "300.fc30",
+            "arch": "x86_64",
+            "fedora_version": 30,
+            "tests": [
+                {"name": "Boot test", "passed": True, "waived": False, "details": ""}
+            ],
+        }
+
+    def post(self):
+        data = {"test_result": (io.BytesIO(json.dumps(self.upload).encode()), "r.json")}
+        with self.flask_app.test_request_context("/upload/", method="POST", data=data):
+            flask.g.user = mock.Mock(username="jcline", groups=[])
+            ui_view.upload.__wrapped__()
+            return flask.get_flashed_messages()
+
+    def test_upload_published(self):
+        """Assert runs uploaded in the web UI are announced like API uploads."""
+        with mock_sends(fm_api.Message):
+            messages = self.post()
+
+        assert messages == ["Upload successful!"]
+        run = TestRun.query.one()
+        assert run.user == "jcline"
+        assert [t.name for t in run.tests] == ["Boot test"]
+
+    def test_reupload_not_published(self):
+        """Assert uploading the same file again stores and announces nothing."""
+        with mock_sends(fm_api.Message):
+            self.post()
+
+        with mock_sends():
+            messages = self.post()
+
+        assert messages == ["Already uploaded!"]
+        assert TestRun.query.count() == 1
@@ -1,12 +1,14 @@
+import itertools
 import logging
 import json
 
 from fedora_messaging import api as fm_api
+from sqlalchemy import and_, func
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm.exc import NoResultFound
 import flask
 
-from . import default_config, db, forms
+from . import archive, artifacts, default_config, db, forms, history, prerender, search
+from . import results as uploads
 from .authentication import oidc
 
 #: The Flask Blueprint for the web user interface
@@ -17,6 +19,40 @@ blueprint = flask.Blueprint(
 _log = logging.getLogger(__name__)
 
 
+def _cached(key, render):
+    """
+    Render a page, or get it from the render cache.
+
+    Only anonymous users without flashed messages see the same page for the
+    same URL, so pages are only cached for them.
+
+    Args:
+        key (tuple): What the page is rendered from that can change.
+        render (callable): Renders the page.
+
+    Returns:
+        The page, or the response ``render`` returned if it wasn't a page.
+    """
+    if flask.g.user or flask.session.get("_flashes"):
+        return render()
+    render_cache = flask.current_app.extensions["render_cache"]
+    # Every page shows the releases' support, which admins can change in any
+    # process, so it's part of every key rather than clearing the cache
+    releases = tuple(
+        tuple(release)
+        for release in db.Session.query(
+            db.Release.version, db.Release.support
+        ).order_by(db.Release.version)
+    )
+    key = (flask.request.url, releases) + key
+    page = render_cache.get(key)
+    if page is None:
+        page = render()
+        if isinstance(page, str):
+            render_cache.set(key, page)
+    return page
+
+
 @blueprint.route("/")
 def index():
     """ Display the index page. """
@@ -68,12 +104,24 @@ def release(release):
     """ Display page with information about a specific release. """
     page = int(flask.request.args.get("page", 1))
     release = db.Release.query.filter_by(version=release).one()
-    tests = (
-        db.TestRun.query.distinct(db.TestRun.kernel_version)
-        .filter_by(release=release)
-        .order_by(db.TestRun.kernel_version.desc())
-        .paginate(page=page)
-    )
+    store = archive.Archive(flask.current_app.config["ARCHIVE_DIR"])
+    if release.version in store.versions():
+        kernels = {}
+        for run in itertools.chain(
+            store.runs(release.version), db.TestRun.query.filter_by(release=release)
+        ):
+            kernels.setdefault(run.kernel_version, run)
+        tests = archive.paginate(
+            sorted(kernels.values(), key=lambda run: run.kernel_version, reverse=True),
+            page=page,
+        )
+    else:
+        tests = (
+            db.TestRun.query.distinct(db.TestRun.kernel_version)
+            .filter_by(release=release)
+            .order_by(db.TestRun.kernel_version.desc())
+            .paginate(page=page)
+        )
 
     return flask.render_template("release.html", release=release, page=tests)
 
@@ -81,12 +129,33 @@ def release(release):
 @blueprint.route("/kernel/<kernel>")
 def kernel(kernel):
     """ Display page with information about a specific kernel. """
+    # The page only changes when the kernel's runs are uploaded, appended to,
+    # or archived
+    validator = (
+        db.Session.query(
+            func.count(db.TestRun.id),
+            func.max(db.TestRun.id),
+            func.max(db.TestRun.updated),
+        )
+        .filter(db.TestRun.kernel_version == kernel)
+        .one()
+    )
+    return _cached(("kernel",) + tuple(validator), lambda: _kernel(kernel))
+
+
+def _kernel(kernel):
     page = int(flask.request.args.get("page", 1))
     tests = (
         db.TestRun.query.filter_by(kernel_version=kernel)
         .order_by(db.TestRun.id.desc())
         .paginate(page=page)
     )
+    if tests.total_items == 0:
+        # The kernel may only have been tested on releases that are archived
+        store = archive.Archive(flask.current_app.config["ARCHIVE_DIR"])
+        runs = [run for run in store.runs() if run.kernel_version == kernel]
+        runs.sort(key=lambda run: run.id, reverse=True)
+        tests = archive.paginate(runs, page=page)
     if tests.total_items == 0:
         return "Not found", 404
 
@@ -98,10 +167,66 @@ def results(test_run_id):
     """
     Shows an individual test run.
     """
-    test_run = db.TestRun.query.filter_by(id=test_run_id).one()
+    # Finalized runs only change when artifacts are uploaded for them
+    validator = (
+        db.Session.query(db.TestRun.state, func.count(db.Artifact.id))
+        .outerjoin(
+            db.Artifact,
+            and_(db.Artifact.run_id == db.TestRun.id, db.Artifact.state == "complete"),
+        )
+        .filter(db.TestRun.id == test_run_id)
+        .group_by(db.TestRun.state)
+        .first()
+    )
+    if validator is not None and validator[0] == "open":
+        return _results(test_run_id)
+    return _cached(("results",) + tuple(validator or ()), lambda: _results(test_run_id))
+
+
+def _results(test_run_id):
+    test_run = db.TestRun.query.filter_by(id=test_run_id).first()
+    if test_run is None:
+        store = archive.Archive(flask.current_app.config["ARCHIVE_DIR"])
+        test_run = store.get(test_run_id)
+    if test_run is None:
+        return "Not found", 404
     return flask.render_template("results.html", test_run=test_run)
 
 
+@blueprint.route("/artifacts/<int:artifact_id>")
+def artifact(artifact_id):
+    """
+    Serves an uploaded artifact, such as a kernel log.
+    """
+    artifact = db.Artifact.query.filter_by(id=artifact_id, state="complete").one()
+    store = artifacts.ArtifactStore(flask.current_app.config["ARTIFACT_DIR"])
+    return store.response(artifact, flask.request)
+
+
+@blueprint.route("/search")
+def search_tests():
+    """ Search the names and details of tests. """
+    query = flask.request.args.get("q", "").strip()
+    page = None
+    if query:
+        page = search.search(query, page=int(flask.request.args.get("page", 1)))
+    return flask.render_template("search.html", query=query, page=page)
+
+
+@blueprint.route("/tests/<path:name>/history")
+def test_history(name):
+    """ Display how often a test passed, failed, or was waived over time. """
+    bucket = flask.request.args.get("bucket", "week")
+    if bucket not in history.BUCKETS:
+        flask.abort(400)
+    series = history.series(db.Session(), name, bucket=bucket)
+    if not series:
+        flask.abort(404)
+    return flask.render_template(
+        "test_history.html", name=name, bucket=bucket, series=series
+    )
+
+
 @blueprint.route("/stats")
 def stats():
     """ Display some stats about the data gathered. """
@@ -128,39 +253,36 @@ def upload():
             return flask.redirect(flask.url_for("ui.upload"))
 
         try:
-            session = db.Session()
-            results = json.load(test_result.stream)
-
-            try:
-                fedora_version = db.Release.query.filter_by(
-                    version=results["fedora_version"]
-                ).one()
-            except NoResultFound:
-                return {"error": "fedora_version was not found"}, 400
-
-            run = db.TestRun(
-                kernel_version=results["kernel_version"],
-                build_release=results["build_release"],
-                arch=results["arch"],
-                release=fedora_version,
-                user=username,
-            )
-            for test in results["tests"]:
-                session.add(
-                    db.Test(
-                        name=test["name"],
-                        passed=test["passed"],
-                        waived=test["waived"],
-                        details=test["details"],
-                        run=run,
-                    )
-                )
-            session.add(run)
-            session.commit()
-            flask.flash("Upload successful!")
+            upload = json.load(test_result.stream)
         except ValueError:
             flask.flash("Invalid JSON document!")
             return flask.redirect(flask.url_for("ui.upload"))
+        upload, error = uploads.validate_upload(upload)
+        if error:
+            flask.flash(_upload_error(error), "error")
+            return flask.redirect(flask.url_for("ui.upload"))
+        release = db.Release.query.filter_by(version=upload["fedora_version"]).first()
+        if release is None:
+            flask.flash("Fedora {} was not found".format(upload["fedora_version"]))
+            return flask.redirect(flask.url_for("ui.upload"))
+
+        try:
+            session = db.Session()
+            tests = upload.pop("tests")
+            run, new = uploads.store(
+                session,
+                dict(
+                    kernel_version=upload["kernel_version"],
+                    build_release=upload["build_release"],
+                    arch=upload["arch"],
+                    release=release,
+                    user=username,
+                    content_hash=uploads.content_hash(username, upload, tests),
+                ),
+                tests,
+            )
+            uploads.commit(session, [run] if new else [])
+            flask.flash("Upload successful!" if new else "Already uploaded!")
         except SQLAlchemyError as err:
             _log.exception(err)
             flask.flash("Could not save the data in the database")
@@ -170,6 +292,31 @@ def upload():
     return flask.render_template("upload.html", form=form)
 
 
+def _upload_error(error):
+    """Describe an invalid upload in a flashed message."""
+    problems = [
+        "{}: {}".format(field, message)
+        for field, message in error.get("invalid_fields", {}).items()
+    ]
+    problems += [
+        "test {}: {}".format(
+            test["index"],
+            ", ".join(
+                "{} {}".format(field, message)
+                for field, message in test["errors"].items()
+            ),
+        )
+        for test in error.get("invalid_tests", [])[:5]
+    ]
+    return "; ".join([error["error"]] + problems)
+
+
+def _release_changed():
+    """Re-render every pre-rendered page, since they all list the releases."""
+    if flask.current_app.config["PRERENDER_DIR"]:
+        prerender.schedule(flask.current_app._get_current_object())
+
+
 def is_admin():
     return (
         len(
@@ -193,7 +340,9 @@ def admin_new_release():
         release = db.Release()
         form.populate_obj(obj=release)
         db.Session.add(release)
+        db.models.create_partitions(db.Session(), release.version)
         db.Session.commit()
+        _release_changed()
 
         message = fm_api.Message(
             topic="kerneltest.release.new",
@@ -233,6 +382,7 @@ def admin_edit_release(relnum):
     if form.validate_on_submit():
         form.populate_obj(obj=release)
         db.Session.commit()
+        _release_changed()
 
         message = fm_api.Message(
             topic="kerneltest.release.edit",
@@ -75,6 +75,11 @@ setup(
     include_package_data=True,
     zip_safe=False,
     install_requires=get_requirements(),
+    extras_require={
+        "async": ["SQLAlchemy[asyncio]>=1.4,<2.0", "asyncpg"],
+        "orjson": ["orjson"],
+        "zstd": ["zstandard"],
+    },
     tests_require=get_requirements(requirements_file="dev-requirements.txt"),
     test_suite="kerneltest.tests",
 )